@@ -1,54 +1,101 @@
 import os
-import smtplib
 import requests
 import json
 import time
+import threading
+import uuid
+import argparse
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.image import MIMEImage
 from datetime import datetime
-import re
-from typing import List, Dict
-
-# Load environment variables from .env file
-try:
-    from dotenv import load_dotenv
-    load_dotenv()  # This loads the .env file
-    print("✅ .env file loaded successfully")
-except ImportError:
-    print("⚠️  python-dotenv not installed. Using system environment variables only.")
-except Exception as e:
-    print(f"⚠️  Could not load .env file: {e}")
-    print("Using system environment variables only.")
+from typing import List, Dict, Optional, Tuple, Union
+
+from hf_client import abort_on_cancel, acquire_hf_slot, get_http_session, get_hf_api_base, get_hf_headers, record_hf_response
+from model_router import get_model_router, parse_retry_after
+from image_cache import get_image_cache
+from script_cache import get_script_cache
+from job_queue import get_job_queue
+from batch import BatchRunner, load_topics
+from mailer import get_mailer
+from renditions import plan_email_images
+from image_download import AtomicImageWriter, CHUNK_SIZE
+from content_parser import ScriptDocument, as_document, parse_script
+from metrics import record_hf_call, span, timed
+from retry_policy import Deadline, RetryPolicy
+from cancellation import CancelToken
+
+def load_environment(verbose: bool = True) -> bool:
+    """Load variables from a .env file; called by entry points, never on import"""
+    try:
+        from dotenv import load_dotenv
+        loaded = load_dotenv()  # This loads the .env file
+        if verbose:
+            print("✅ .env file loaded successfully")
+        return loaded
+    except ImportError:
+        if verbose:
+            print("⚠️  python-dotenv not installed. Using system environment variables only.")
+    except Exception as e:
+        if verbose:
+            print(f"⚠️  Could not load .env file: {e}")
+            print("Using system environment variables only.")
+    return False
+
+# Process-wide cap on image requests in flight, shared by every job
+_global_image_slots = None
+_global_image_slots_lock = threading.Lock()
+
+def get_global_image_slots() -> threading.BoundedSemaphore:
+    """Return the process-wide semaphore limiting concurrent image generations"""
+    global _global_image_slots
+    with _global_image_slots_lock:
+        if _global_image_slots is None:
+            limit = max(1, int(os.getenv('IMAGE_WORKERS_GLOBAL', '8')))
+            _global_image_slots = threading.BoundedSemaphore(limit)
+        return _global_image_slots
 
 class AIContentAgent:
     def __init__(self):
         # Hugging Face API settings (free tier)
-        self.hf_api_url_text = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-large"
+        api_base = get_hf_api_base()
+        self.hf_api_url_text = f"{api_base}/models/microsoft/DialoGPT-large"
+        
+        # Using a more suitable text generation model
+        self.text_model_url = f"{api_base}/models/microsoft/DialoGPT-medium"
         
         # Try multiple image generation models for better success rate
         self.image_models = [
             # FLUX models (newer, high quality)
-    "https://api-inference.huggingface.co/models/black-forest-labs/FLUX.1-schnell",
-    "https://api-inference.huggingface.co/models/black-forest-labs/FLUX.1-dev",
+    f"{api_base}/models/black-forest-labs/FLUX.1-schnell",
+    f"{api_base}/models/black-forest-labs/FLUX.1-dev",
     
     # Stable Diffusion variants
-    "https://api-inference.huggingface.co/models/runwayml/stable-diffusion-v1-5",
-    "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-2-1",
-    "https://api-inference.huggingface.co/models/CompVis/stable-diffusion-v1-4",
-    "https://api-inference.huggingface.co/models/stabilityai/stable-diffusion-xl-base-1.0",
+    f"{api_base}/models/runwayml/stable-diffusion-v1-5",
+    f"{api_base}/models/stabilityai/stable-diffusion-2-1",
+    f"{api_base}/models/CompVis/stable-diffusion-v1-4",
+    f"{api_base}/models/stabilityai/stable-diffusion-xl-base-1.0",
     
     # Alternative models
-    "https://api-inference.huggingface.co/models/prompthero/openjourney-v4",
-    "https://api-inference.huggingface.co/models/wavymulder/Analog-Diffusion",
-    "https://api-inference.huggingface.co/models/nitrosocke/Ghibli-Diffusion",
+    f"{api_base}/models/prompthero/openjourney-v4",
+    f"{api_base}/models/wavymulder/Analog-Diffusion",
+    f"{api_base}/models/nitrosocke/Ghibli-Diffusion",
     
     # Anime/Illustration styles
-    "https://api-inference.huggingface.co/models/hakurei/waifu-diffusion",
-    "https://api-inference.huggingface.co/models/andite/anything-v4.0",
+    f"{api_base}/models/hakurei/waifu-diffusion",
+    f"{api_base}/models/andite/anything-v4.0",
         ]
             # "https://api-inference.huggingface.co/models/runwayml/stable-diffusion-v1-5",
-        self.current_model_index = 0
+        
+        # Live per-model stats shared by every job in the process
+        self.router = get_model_router()
+        
+        # Previously generated images, keyed by prompt and model
+        self.image_cache = get_image_cache()
+        
+        # Recently generated scripts and their image prompts, keyed by topic
+        self.script_cache = get_script_cache()
         
         # Get Hugging Face token from environment variable
         self.hf_token = os.getenv('HUGGING_FACE_TOKEN')
@@ -56,8 +103,8 @@ class AIContentAgent:
             print("Please set HUGGING_FACE_TOKEN environment variable")
             
         # Email settings
-        self.smtp_server = "smtp.gmail.com"
-        self.smtp_port = 587
+        self.smtp_server = os.getenv('SMTP_SERVER', "smtp.gmail.com")
+        self.smtp_port = int(os.getenv('SMTP_PORT', '587'))
         self.sender_email = os.getenv('SENDER_EMAIL')
         self.sender_password = os.getenv('SENDER_APP_PASSWORD')  # Gmail app password
         
@@ -72,10 +119,37 @@ class AIContentAgent:
             self.recipient_emails = [single_recipient] if single_recipient else []
         
         # Headers for API requests
-        self.headers = {"Authorization": f"Bearer {self.hf_token}"}
+        self.headers = get_hf_headers(self.hf_token)
         
-    def generate_text_content(self, topic: str) -> str:
-        """Generate text content using Hugging Face free models"""
+        # How many images of a single job may be generated at the same time
+        self.image_workers = max(1, int(os.getenv('IMAGE_WORKERS_PER_JOB', '3')))
+        
+        # Downloads past this size, or with a side shorter than this, are not images we can use
+        self.image_max_bytes = int(os.getenv('IMAGE_MAX_BYTES', str(20 * 1024 * 1024)))
+        self.image_min_dimension = int(os.getenv('IMAGE_MIN_DIMENSION', '64'))
+        
+        # Email images are re-encoded so all of them together fit this many bytes
+        self.email_image_budget = int(os.getenv('EMAIL_IMAGE_BUDGET_BYTES', str(4 * 1024 * 1024)))
+        self.email_image_max_dimension = int(os.getenv('EMAIL_IMAGE_MAX_DIMENSION', '1280'))
+        self.email_image_format = os.getenv('EMAIL_IMAGE_FORMAT', 'jpeg')
+        
+        # Backoff between model attempts and the time budget of a whole job
+        self.retry_policy = RetryPolicy(
+            base_delay=float(os.getenv('RETRY_BASE_DELAY', '0.5')),
+            max_delay=float(os.getenv('RETRY_MAX_DELAY', '8')),
+            job_seconds=float(os.getenv('JOB_DEADLINE_SECONDS', '300')) or None,
+            min_attempt_seconds=float(os.getenv('RETRY_MIN_ATTEMPT_SECONDS', '5')),
+            request_timeout=float(os.getenv('HF_REQUEST_TIMEOUT', '60')),
+        )
+        # Never cancelled for CLI runs; web jobs get theirs from the job store
+        self.cancel_token = CancelToken()
+        
+    def update_progress(self, progress, status):
+        """Report pipeline progress (printed for the CLI, overridden by the web agent)"""
+        print(f"📊 [{progress:.0f}%] {status}")
+        
+    def _text_payload(self, topic: str) -> Dict:
+        """Build the request body for the script generation call"""
         
         # Predefined prompt template
         prompt = f"""
@@ -99,28 +173,44 @@ class AIContentAgent:
         Make the content informative, engaging, and well-structured.
         """
         
-        try:
-            # Using a more suitable text generation model
-            text_model_url = "https://api-inference.huggingface.co/models/microsoft/DialoGPT-medium"
-            
-            payload = {
-                "inputs": prompt,
-                "parameters": {
-                    "max_length": 1000,
-                    "temperature": 0.7,
-                    "do_sample": True
-                }
+        return {
+            "inputs": prompt,
+            "parameters": {
+                "max_length": 1000,
+                "temperature": 0.7,
+                "do_sample": True
             }
-            
-            response = requests.post(text_model_url, headers=self.headers, json=payload)
+        }
+    
+    def _text_from_result(self, topic: str, result) -> str:
+        """Pull the generated script out of a successful text API response"""
+        if isinstance(result, list) and len(result) > 0:
+            generated_text = result[0].get('generated_text', '')
+            return generated_text
+        else:
+            return f"Generated content about {topic} (simplified due to API limitations)"
+    
+    def generate_text_content(self, topic: str) -> str:
+        """Generate text content using Hugging Face free models"""
+        
+        model_name = self.text_model_url.split('/')[-1]
+        if not acquire_hf_slot(self.hf_token, self.text_model_url):
+            print(f"⏳ Request budget for {model_name} is used up, using fallback content")
+            return self.generate_fallback_content(topic)
+        started = time.monotonic()
+        try:
+            payload = self._text_payload(topic)
+            try:
+                response = get_http_session().post(self.text_model_url, headers=self.headers, json=payload, timeout=60)
+            except Exception:
+                record_hf_call('text', model_name, None, time.monotonic() - started)
+                raise
+            record_hf_call('text', model_name, response.status_code, time.monotonic() - started)
+            record_hf_response(self.hf_token, self.text_model_url, response.status_code,
+                               parse_retry_after(response.headers.get('retry-after')))
             
             if response.status_code == 200:
-                result = response.json()
-                if isinstance(result, list) and len(result) > 0:
-                    generated_text = result[0].get('generated_text', '')
-                    return generated_text
-                else:
-                    return f"Generated content about {topic} (simplified due to API limitations)"
+                return self._text_from_result(topic, response.json())
             else:
                 print(f"Text generation failed: {response.status_code}")
                 return self.generate_fallback_content(topic)
@@ -129,6 +219,22 @@ class AIContentAgent:
             print(f"Error generating text: {e}")
             return self.generate_fallback_content(topic)
     
+    @timed('script')
+    def get_script(self, topic: str) -> Tuple[str, ScriptDocument]:
+        """Return the script and its parsed document for a topic, reusing recent results"""
+        if self.script_cache is not None:
+            cached = self.script_cache.get(topic)
+            if cached is not None:
+                print(f"⚡ Script cache hit for: {topic}")
+                return cached
+        
+        content = self.generate_text_content(topic)
+        document = parse_script(content)
+        
+        if self.script_cache is not None:
+            self.script_cache.put(topic, content, document)
+        return content, document
+
     def generate_fallback_content(self, topic: str) -> str:
         """Generate YouTube Shorts fallback content when API fails"""
         return f"""
@@ -185,16 +291,69 @@ class AIContentAgent:
 
     def extract_image_prompts(self, content: str) -> List[str]:
         """Extract image prompts from the generated content"""
-        pattern = r'\[IMAGE_PROMPT:\s*(.*?)\]'
-        prompts = re.findall(pattern, content, re.IGNORECASE)
-        return prompts
+        return list(parse_script(content).image_prompts)
+
+    def _estimated_time(self, response) -> Optional[float]:
+        """Read the model load estimate the API sends with 503 responses"""
+        try:
+            error_data = response.json()
+        except ValueError:
+            return None
+        if isinstance(error_data, dict) and 'estimated_time' in error_data:
+            try:
+                return float(error_data['estimated_time'])
+            except (TypeError, ValueError):
+                return None
+        return None
+
+    def generate_image(self, prompt: str, filename: str, deadline: Optional[Deadline] = None) -> bool:
+        """Generate image using Hugging Face Stable Diffusion, fastest healthy model first.
 
-    def generate_image(self, prompt: str, filename: str) -> bool:
-        """Generate image using Hugging Face Stable Diffusion with fallback models"""
+        Models are tried until one succeeds or ``deadline`` (by default a
+        fresh job budget) leaves no time for another attempt.
+        """
+        if deadline is None:
+            deadline = self.retry_policy.deadline()
+        
+        if self.image_cache is not None:
+            cached_model = self.image_cache.fetch(prompt, self.image_models, filename)
+            if cached_model:
+                print(f"⚡ Cache hit ({cached_model.split('/')[-1]}): {filename}")
+                return True
         
-        for attempt in range(len(self.image_models)):
-            model_url = self.image_models[self.current_model_index]
+        candidates = self.router.candidates(self.image_models)
+        if not candidates:
+            wait_time = self.router.next_available_in(self.image_models)
+            print(f"⏳ All image models are cooling down for another {wait_time:.0f}s")
+            print(f"❌ Skipping: {prompt[:50]}...")
+            return False
+        
+        failures = 0
+        for model_url in candidates:
             model_name = model_url.split('/')[-1]
+            if self.cancel_token.cancelled:
+                print(f"🛑 Job cancelled, skipping: {prompt[:50]}...")
+                return False
+            delay = self.retry_policy.delay(failures)
+            if not self.retry_policy.has_time(deadline, delay):
+                print(f"⌛ Job deadline reached, giving up on: {prompt[:50]}...")
+                return False
+            if delay > 0:
+                print(f"⏳ Backing off {delay:.1f}s before trying {model_name}...")
+                with span('retry_wait'):
+                    if self.cancel_token.wait(delay):
+                        print(f"🛑 Job cancelled, skipping: {prompt[:50]}...")
+                        return False
+            budget = deadline.remaining() - self.retry_policy.min_attempt_seconds
+            if budget <= 0:
+                print(f"⌛ Job deadline reached, giving up on: {prompt[:50]}...")
+                return False
+            if not acquire_hf_slot(self.hf_token, model_url, budget):
+                print(f"⏳ Request budget for {model_name} is used up. Trying next model...")
+                continue
+            started = time.monotonic()
+            status_code = None
+            cooldown = None
             
             try:
                 print(f"🎨 Trying model: {model_name}")
@@ -202,90 +361,135 @@ class AIContentAgent:
                 
                 payload = {"inputs": prompt}
                 
-                response = requests.post(
-                    model_url, 
-                    headers=self.headers, 
-                    json=payload,
-                    timeout=60
-                )
-                
-                print(f"📡 API Response Status: {response.status_code}")
-                
-                if response.status_code == 200:
-                    content_type = response.headers.get('content-type', '')
+                # Cancelling aborts the request, both while waiting for the model and while downloading
+                with abort_on_cancel(self.cancel_token):
+                    # Streamed, so the image goes to disk in chunks instead of sitting in memory
+                    response = get_http_session().post(
+                        model_url,
+                        headers=self.headers, 
+                        json=payload,
+                        timeout=self.retry_policy.request_timeout_for(deadline),
+                        stream=True
+                    )
+                    try:
+                        status_code = response.status_code
                     
-                    if 'image' in content_type or len(response.content) > 1000:
-                        with open(filename, "wb") as f:
-                            f.write(response.content)
+                        print(f"📡 API Response Status: {response.status_code}")
+                    
+                        if response.status_code == 200:
+                            content_type = response.headers.get('content-type', '')
                         
-                        if os.path.exists(filename) and os.path.getsize(filename) > 1000:
-                            print(f"✅ Image saved successfully: {filename}")
-                            return True
-                        else:
-                            print(f"❌ Image file too small: {filename}")
-                    else:
-                        try:
-                            error_data = response.json()
-                            if 'estimated_time' in error_data:
-                                wait_time = error_data.get('estimated_time', 20)
-                                print(f"⏳ Model loading. Wait time: {wait_time}s")
-                                print("💡 Trying next model...")
+                            if 'json' not in content_type:
+                                if self._download_image(response, filename):
+                                    print(f"✅ Image saved successfully: {filename}")
+                                    elapsed = time.monotonic() - started
+                                    record_hf_call('image', model_name, status_code, elapsed)
+                                    record_hf_response(self.hf_token, model_url, status_code)
+                                    self.router.record_success(model_url, elapsed)
+                                    self._cache_image(prompt, model_url, filename)
+                                    return True
+                                print(f"❌ Response was not a valid image: {filename}")
                             else:
-                                print(f"❌ Unexpected response: {error_data}")
-                        except:
-                            print(f"❌ Unexpected response format")
-                            
-                elif response.status_code == 503:
-                    print(f"⏳ Model {model_name} is loading. Trying next model...")
-                elif response.status_code == 429:
-                    print(f"⏰ Rate limit on {model_name}. Trying next model...")
-                else:
-                    try:
-                        error_data = response.json()
-                        print(f"❌ Error {response.status_code}: {error_data}")
-                    except:
-                        print(f"❌ HTTP Error {response.status_code}")
+                                cooldown = self._estimated_time(response)
+                                if cooldown is not None:
+                                    print(f"⏳ Model loading. Wait time: {cooldown}s")
+                                    print("💡 Trying next model...")
+                                else:
+                                    print(f"❌ Unexpected response format")
+                                
+                        elif response.status_code == 503:
+                            cooldown = self._estimated_time(response)
+                            print(f"⏳ Model {model_name} is loading. Trying next model...")
+                        elif response.status_code == 429:
+                            cooldown = parse_retry_after(response.headers.get('retry-after'))
+                            print(f"⏰ Rate limit on {model_name}. Trying next model...")
+                        else:
+                            try:
+                                error_data = response.json()
+                                print(f"❌ Error {response.status_code}: {error_data}")
+                            except:
+                                print(f"❌ HTTP Error {response.status_code}")
+                    finally:
+                        # Hands the connection back to the pool
+                        response.close()
                 
             except requests.exceptions.Timeout:
                 print(f"⏰ Timeout with {model_name}. Trying next model...")
             except Exception as e:
                 print(f"❌ Error with {model_name}: {e}")
             
-            # Try next model
-            self.current_model_index = (self.current_model_index + 1) % len(self.image_models)
-            if attempt < len(self.image_models) - 1:
-                time.sleep(2)  # Wait before trying next model
+            if self.cancel_token.cancelled:
+                # An aborted request says nothing about the model, so it is not held against it
+                print(f"🛑 Job cancelled, skipping: {prompt[:50]}...")
+                return False
+            elapsed = time.monotonic() - started
+            record_hf_call('image', model_name, status_code, elapsed)
+            record_hf_response(self.hf_token, model_url, status_code, cooldown)
+            self.router.record_failure(model_url, elapsed, status_code, cooldown)
+            if self.retry_policy.backs_off(status_code):
+                failures += 1
         
         print(f"❌ All models failed for: {prompt[:50]}...")
         return False
 
-    def create_html_content(self, topic: str, content: str, image_files: List[str]) -> str:
-        """Create HTML formatted content for YouTube Shorts email"""
+    def _download_image(self, response, filename: str) -> bool:
+        """Stream a response body into ``filename``; it only appears once it is a valid image"""
+        with AtomicImageWriter(filename, self.image_max_bytes, self.image_min_dimension) as writer:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                writer.write(chunk)
+            return writer.commit() is not None
+
+    def _cache_image(self, prompt: str, model_url: str, filename: str):
+        """Keep a copy of a generated image for repeat prompts"""
+        if self.image_cache is None:
+            return
+        try:
+            self.image_cache.store(prompt, model_url, filename)
+        except OSError as e:
+            print(f"⚠️  Could not cache image: {e}")
+
+    @timed('images')
+    def generate_images(self, prompts: List[str], filenames: List[str],
+                        progress_start: float = 50, progress_end: float = 80,
+                        deadline: Optional[Deadline] = None) -> List[str]:
+        """Generate images concurrently and return the saved filenames in prompt order"""
+        total = len(prompts)
+        if total == 0:
+            return []
         
-        # Parse different sections from the content
-        sections = {
-            'script': '',
-            'title': '',
-            'description': '',
-            'hashtags': ''
-        }
+        if deadline is None:
+            deadline = self.retry_policy.deadline()
+        slots = get_global_image_slots()
+        results = [False] * total
+        completed = 0
+        progress_lock = threading.Lock()
         
-        # Extract sections based on emojis and markers
-        current_section = 'script'
-        lines = content.split('\n')
+        def generate_one(index: int) -> bool:
+            with slots:
+                return self.generate_image(prompts[index], filenames[index], deadline)
         
-        for line in lines:
-            if '🎬' in line or 'YOUTUBE SHORTS TITLE' in line:
-                current_section = 'title'
-            elif '📄' in line or 'VIDEO DESCRIPTION' in line:
-                current_section = 'description'
-            elif '🏷️' in line or 'META TAGS' in line or 'HASHTAGS' in line:
-                current_section = 'hashtags'
-            elif line.strip():
-                sections[current_section] += line + '\n'
+        with ThreadPoolExecutor(max_workers=min(self.image_workers, total),
+                                thread_name_prefix='image-worker') as executor:
+            futures = {executor.submit(generate_one, i): i for i in range(total)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    print(f"❌ Image {index + 1} failed: {e}")
+                
+                with progress_lock:
+                    completed += 1
+                    progress = progress_start + (progress_end - progress_start) * completed / total
+                    self.update_progress(progress, f"Generated image {completed}/{total}...")
         
-        # Remove image prompts from display content
-        script_content = re.sub(r'\[IMAGE_PROMPT:.*?\]', '', sections['script'], flags=re.IGNORECASE)
+        return [filename for filename, ok in zip(filenames, results) if ok]
+
+    def create_html_content(self, topic: str, content: Union[str, ScriptDocument], image_files: List[str]) -> str:
+        """Create HTML formatted content for YouTube Shorts email"""
+        
+        # Sections come from the parsed document, so a job's script is parsed only once
+        document = as_document(content)
         
         # Add image references
         image_section = ""
@@ -373,22 +577,22 @@ class AIContentAgent:
             
             <div class="section script">
                 <h2><span class="emoji">🧠</span> Video Script & Facts</h2>
-                <pre>{script_content.strip()}</pre>
+                <pre>{document.script}</pre>
             </div>
             
             <div class="section title">
                 <h2><span class="emoji">🎬</span> YouTube Title</h2>
-                <pre>{sections['title'].strip()}</pre>
+                <pre>{document.title}</pre>
             </div>
             
             <div class="section description">
                 <h2><span class="emoji">📄</span> Video Description</h2>
-                <pre>{sections['description'].strip()}</pre>
+                <pre>{document.description}</pre>
             </div>
             
             <div class="section hashtags">
                 <h2><span class="emoji">🏷️</span> Tags & Hashtags</h2>
-                <pre>{sections['hashtags'].strip()}</pre>
+                <pre>{document.hashtags_text}</pre>
             </div>
             
             <div class="section">
@@ -408,12 +612,18 @@ class AIContentAgent:
         
         return html_template
 
-    def send_email(self, topic: str, content: str, image_files: List[str]):
-        """Send email with generated content and images to multiple recipients"""
+    @timed('email')
+    def send_email(self, topic: str, content: Union[str, ScriptDocument], image_files: List[str]) -> Optional[Future]:
+        """Queue an email with generated content and images to multiple recipients.
+
+        The message is built right away, so the images can be cleaned up as
+        soon as this returns; delivery happens on the mailer's background
+        connection. Returns a future for the delivery, or None if nothing was queued.
+        """
         
         if not self.recipient_emails:
             print("No recipient emails configured!")
-            return
+            return None
             
         try:
             # Create email message
@@ -425,35 +635,32 @@ class AIContentAgent:
             msg['To'] = recipient_list
             msg['Subject'] = f"YouTube Shorts Content: {topic}"
 
+            # Downscaled copies keep the message under the size budget
+            renditions = plan_email_images(
+                image_files, self.email_image_budget, self.email_image_max_dimension, self.email_image_format
+            )
+            attached_files = [image_files[index - 1] for index, _, _ in renditions]
+
             # Create HTML content
-            html_content = self.create_html_content(topic, content, image_files)
+            html_content = self.create_html_content(topic, content, attached_files)
             msg.attach(MIMEText(html_content, 'html'))
 
             # Attach images
-            for i, img_file in enumerate(image_files, 1):
-                if os.path.exists(img_file):
-                    with open(img_file, 'rb') as f:
-                        img_data = f.read()
-                        image = MIMEImage(img_data)
-                        image.add_header('Content-ID', f'<image{i}>')
-                        msg.attach(image)
-
-            # Send email to all recipients
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.sender_email, self.sender_password)
-            
-            # Send to all recipients at once
-            server.sendmail(self.sender_email, self.recipient_emails, msg.as_string())
-            server.quit()
-            
-            print(f"Email sent successfully to {len(self.recipient_emails)} recipient(s):")
-            for email in self.recipient_emails:
-                print(f"  - {email}")
+            for i, (_, img_data, subtype) in enumerate(renditions, 1):
+                image = MIMEImage(img_data, _subtype=subtype)
+                image.add_header('Content-ID', f'<image{i}>')
+                msg.attach(image)
+
+            # Send to all recipients at once, over the shared SMTP connection
+            mailer = get_mailer(self.smtp_server, self.smtp_port, self.sender_email, self.sender_password)
+            future = mailer.send(self.sender_email, self.recipient_emails, msg)
+            print(f"📨 Email queued for {len(self.recipient_emails)} recipient(s)")
+            return future
             
         except Exception as e:
             print(f"Error sending email: {e}")
             print("Check your email credentials and recipient addresses.")
+            return None
 
     def cleanup_files(self, image_files: List[str]):
         """Clean up generated image files"""
@@ -464,45 +671,79 @@ class AIContentAgent:
             except:
                 pass
 
+    @timed('job')
     def process_topic(self, topic: str):
         """Main process to generate content and send email"""
         print(f"Starting YouTube Shorts content generation for topic: {topic}")
+        deadline = self.retry_policy.deadline()
         
         # Step 1: Generate YouTube Shorts script and content
         print("Generating YouTube Shorts script with 5 facts...")
-        content = self.generate_text_content(topic)
+        _, document = self.get_script(topic)
+        image_prompts = document.image_prompts
         
-        # Step 2: Extract image prompts
-        print("Extracting image prompts...")
-        image_prompts = self.extract_image_prompts(content)
+        # Step 2: Image prompts are parsed together with the script
         print(f"Found {len(image_prompts)} image prompts")
         
         # Step 3: Generate images
         print("Generating images for YouTube Shorts...")
-        image_files = []
-        for i, prompt in enumerate(image_prompts, 1):
-            print(f"Generating image {i}: {prompt[:50]}...")
-            # Add 9:16 aspect ratio specification for YouTube Shorts
-            enhanced_prompt = f"{prompt}, 9:16 aspect ratio, vertical orientation, cinematic quality, vibrant colors"
-            filename = f"youtube_shorts_image_{i}_{int(time.time())}.png"
-            if self.generate_image(enhanced_prompt, filename):
-                image_files.append(filename)
-                time.sleep(3)  # Slightly longer delay for better quality
+        # Add 9:16 aspect ratio specification for YouTube Shorts
+        enhanced_prompts = [
+            f"{prompt}, 9:16 aspect ratio, vertical orientation, cinematic quality, vibrant colors"
+            for prompt in image_prompts
+        ]
+        # Unique per run so concurrent batch topics never share files
+        run_id = f"{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        filenames = [f"youtube_shorts_image_{i}_{run_id}.png" for i in range(1, len(image_prompts) + 1)]
+        image_files = self.generate_images(enhanced_prompts, filenames, deadline=deadline)
             
         print(f"Generated {len(image_files)} YouTube Shorts images successfully")
         
         # Step 4: Send email
         print("Sending email...")
-        self.send_email(topic, content, image_files)
+        self.send_email(topic, document, image_files)
         
         # Step 5: Cleanup
         print("Cleaning up temporary files...")
         self.cleanup_files(image_files)
         
         print("Process completed successfully!")
+        return {'topic': topic, 'image_files': image_files, 'success': True}
+
+def run_batch(agent: AIContentAgent, path: str, checkpoint: Optional[str] = None,
+              concurrency: Optional[int] = None) -> Dict:
+    """Run every topic of a JSONL file, resuming from its checkpoint"""
+    items = load_topics(path)
+    base = os.path.splitext(path)[0]
+    job_queue = get_job_queue()
+    runner = BatchRunner(
+        os.path.basename(base),
+        items,
+        checkpoint or f"{base}.checkpoint.jsonl",
+        lambda session_id, topic: lambda: job_queue.run_call(agent.process_topic, topic),
+        job_queue,
+        concurrency=concurrency or int(os.getenv('BATCH_CONCURRENCY', str(job_queue.workers))),
+        summary_path=f"{base}.summary.json",
+    )
+    summary = runner.run()
+    
+    print("\n📊 Batch summary:")
+    for key in ('total', 'done', 'failed', 'skipped', 'images', 'elapsed_seconds',
+                'topics_per_minute', 'avg_topic_seconds', 'p95_topic_seconds'):
+        print(f"   {key}: {summary[key]}")
+    return summary
 
 def main():
     """Main function to run the AI agent"""
+    parser = argparse.ArgumentParser(description="Generate YouTube Shorts content and email it")
+    parser.add_argument('--batch', metavar='TOPICS_JSONL',
+                        help="run every topic in a JSONL file instead of asking for one")
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help="checkpoint file used to resume the batch (default: <file>.checkpoint.jsonl)")
+    parser.add_argument('--concurrency', type=int,
+                        help="topics generated at once (default: BATCH_CONCURRENCY or GENERATION_WORKERS)")
+    args = parser.parse_args()
+    load_environment()
     
     print("🚀 Starting AI YouTube Shorts Agent...")
     print("📁 Checking environment variables...")
@@ -545,6 +786,10 @@ def main():
     # Create agent instance
     agent = AIContentAgent()
     
+    if args.batch:
+        run_batch(agent, args.batch, args.checkpoint, args.concurrency)
+        return
+    
     # Get topic from user input
     topic = input("Enter the topic for YouTube Shorts content generation: ").strip()
     
@@ -1,19 +1,122 @@
-from flask import Flask, render_template, request, jsonify, send_file
+from flask import Flask, Response, render_template, request, jsonify
 import os
 import json
+import sqlite3
+import asyncio
+import re
 import threading
 import time
+import uuid
+import unicodedata
 from datetime import datetime
-import zipfile
-import io
-from ai_agent import AIContentAgent
+from typing import Optional
+from urllib.parse import quote
+from ai_agent import AIContentAgent, load_environment
+from async_agent import AsyncAIContentAgent, get_async_runner
+from hf_client import get_connection_stats, rate_limit_stats
+from model_router import get_model_router
+from image_cache import get_image_cache
+from script_cache import get_script_cache
+from job_queue import get_job_queue, QueueFullError
+from job_store import get_job_store
+from zip_stream import ZipStream
+from batch import BatchRunner, load_topics, read_topics
+from mailer import mailer_stats
+from content_parser import ScriptDocument
+from metrics import get_metrics, result_outcome, timed
+from cancellation import JobCancelled
+from result_catalog import content_hash, get_result_catalog
+from storage_gc import get_storage_collector
+from single_flight import get_single_flight
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key-change-this')
 
-# Global variables to track generation status
-generation_status = {}
-generation_results = {}
+# Batches started by this process, by batch ID
+batch_runners = {}
+batch_runners_lock = threading.Lock()
+BATCH_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Open /events streams in this process, created on first use
+_stream_slots = None
+_stream_slots_lock = threading.Lock()
+
+def get_stream_slots() -> threading.BoundedSemaphore:
+    """Return the process-wide limit on open /events streams, sized by SSE_MAX_STREAMS"""
+    global _stream_slots
+    with _stream_slots_lock:
+        if _stream_slots is None:
+            _stream_slots = threading.BoundedSemaphore(max(0, int(os.getenv('SSE_MAX_STREAMS', '4'))))
+        return _stream_slots
+
+def get_content_text(result) -> str:
+    """Return a result's script, read from its content file when not held in memory"""
+    if 'content' in result:
+        return result['content']
+    try:
+        with open(result['content_file'], 'r', encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        pass
+    # The catalog keeps every script, so one whose file is gone can still be shown
+    try:
+        catalog = get_result_catalog()
+        script = catalog.script(result['content_hash']) if catalog and 'content_hash' in result else None
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Result catalog unavailable: {e}")
+        script = None
+    return script or ''
+
+def catalog_result(session_id: str, result: dict, content: str):
+    """Keep a finished job in the result catalog; the job succeeds even if that fails"""
+    try:
+        catalog = get_result_catalog()
+        if catalog is not None:
+            catalog.record(session_id, result, content)
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Could not record result in catalog: {e}")
+
+def find_result(session_id: str) -> Optional[dict]:
+    """Return a job's result from the job store, or from the catalog once the store has forgotten it"""
+    result = get_job_store().get_result(session_id)
+    if result is not None:
+        return result
+    try:
+        catalog = get_result_catalog()
+        return catalog.get(session_id) if catalog is not None else None
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Result catalog unavailable: {e}")
+        return None
+
+def cancelled_result(reason: str) -> dict:
+    """Return the result published for a cancelled job"""
+    return {
+        'success': False,
+        'cancelled': True,
+        'error': reason
+    }
+
+def get_document_data(result) -> Optional[dict]:
+    """Return a result's parsed script document, or None for results saved without one"""
+    if 'document_file' not in result:
+        return None
+    try:
+        with open(result['document_file'], 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def set_attachment_filename(response, filename: str):
+    """Mark a response as a download, the same way send_file encodes non-ASCII names"""
+    try:
+        filename.encode('ascii')
+        options = {'filename': filename}
+    except UnicodeEncodeError:
+        options = {
+            'filename': unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii'),
+            'filename*': f"UTF-8''{quote(filename, safe='!#$&+^`|')}",
+        }
+    response.headers.set('Content-Disposition', 'attachment', **options)
 
 class WebAIAgent(AIContentAgent):
     """Extended AI Agent for web interface"""
@@ -24,74 +127,254 @@ class WebAIAgent(AIContentAgent):
         self.progress = 0
         self.status = "Initializing..."
         self.generated_files = []
+        # Sessions that joined this run, fixed once it has published its result
+        self.followers = []
+        self.cancel_token = get_job_store().cancel_token(session_id)
         
     def update_progress(self, progress, status):
         """Update progress for web interface"""
         self.progress = progress
         self.status = status
-        generation_status[self.session_id] = {
-            'progress': progress,
-            'status': status,
-            'timestamp': datetime.now().isoformat()
-        }
+        job_store = get_job_store()
+        job_store.set_status(self.session_id, progress, status)
+        for follower in self.followers or get_single_flight().followers(self.session_id):
+            job_store.set_status(follower, progress, status)
+    
+    def _publish(self, result: dict):
+        """Record the result for this job and for every job that joined it"""
+        job_store = get_job_store()
+        self.followers, leader_left = get_single_flight().finish(self.session_id)
+        job_store.set_result(self.session_id, result if leader_left is None else cancelled_result(leader_left))
+        for follower in self.followers:
+            # A follower cancelled through another worker or abandoned only has the flag set
+            reason = job_store.cancelled(follower)
+            job_store.set_result(follower, cancelled_result(reason) if reason else result)
     
+    @timed('job', outcome=result_outcome)
     def process_topic_web(self, topic: str):
         """Web-adapted version of process_topic"""
+        filenames = []
         try:
+            self.cancel_token.raise_if_cancelled()
             self.update_progress(10, f"Starting content generation for: {topic}")
+            deadline = self.retry_policy.deadline()
             
             # Step 1: Generate content
             self.update_progress(25, "Generating YouTube Shorts script...")
-            content = self.generate_text_content(topic)
+            content, document = self.get_script(topic)
+            self.cancel_token.raise_if_cancelled()
             
-            # Step 2: Extract image prompts
-            self.update_progress(40, "Extracting image prompts...")
-            image_prompts = self.extract_image_prompts(content)
+            # Step 2: Image prompts are parsed together with the script
+            self.update_progress(40, f"Found {len(document.image_prompts)} image prompts...")
             
             # Step 3: Generate images
             self.update_progress(50, "Generating images...")
-            image_files = []
-            max_images = min(len(image_prompts), 3)
-            
-            for i, prompt in enumerate(image_prompts[:max_images], 1):
-                self.update_progress(50 + (30 * i / max_images), f"Generating image {i}/{max_images}...")
-                
-                enhanced_prompt = f"{prompt}, 9:16 aspect ratio, vertical orientation, YouTube Shorts style"
-                filename = f"static/generated/youtube_shorts_image_{i}_{int(time.time())}.png"
-                
-                # Ensure directory exists
-                os.makedirs(os.path.dirname(filename), exist_ok=True)
-                
-                if self.generate_image(enhanced_prompt, filename):
-                    image_files.append(filename)
-                    self.generated_files.append(filename)
-                time.sleep(2)
+            enhanced_prompts, filenames = self._plan_images(document.image_prompts)
+            image_files = self.generate_images(enhanced_prompts, filenames, 50, 80, deadline)
+            self.generated_files.extend(image_files)
+            self.cancel_token.raise_if_cancelled()
             
             # Step 4: Save content
             self.update_progress(90, "Saving content...")
-            content_filename = f"static/generated/content_{int(time.time())}.txt"
-            with open(content_filename, 'w', encoding='utf-8') as f:
-                f.write(content)
-            self.generated_files.append(content_filename)
+            return self._store_result(topic, content, document, image_files)
             
-            # Store results
-            generation_results[self.session_id] = {
-                'topic': topic,
-                'content': content,
-                'image_files': image_files,
-                'content_file': content_filename,
-                'generated_at': datetime.now().isoformat(),
-                'success': True
-            }
+        except JobCancelled as e:
+            return self._store_cancelled(e.reason, filenames)
+        except Exception as e:
+            return self._store_error(e)
+    
+    def _plan_images(self, image_prompts):
+        """Pick the prompts to render and the files they are saved to"""
+        max_images = min(len(image_prompts), 3)
+        
+        enhanced_prompts = [
+            f"{prompt}, 9:16 aspect ratio, vertical orientation, YouTube Shorts style"
+            for prompt in image_prompts[:max_images]
+        ]
+        filenames = [
+            f"static/generated/youtube_shorts_image_{i}_{self.session_id}.png"
+            for i in range(1, max_images + 1)
+        ]
+        
+        # Ensure directory exists
+        os.makedirs('static/generated', exist_ok=True)
+        return enhanced_prompts, filenames
+    
+    @timed('save')
+    def _store_result(self, topic: str, content: str, document: ScriptDocument, image_files):
+        """Save the script and its parsed document next to the images and publish the result"""
+        content_filename = f"static/generated/content_{self.session_id}.txt"
+        with open(content_filename, 'w', encoding='utf-8') as f:
+            f.write(content)
+        self.generated_files.append(content_filename)
+        
+        document_filename = f"static/generated/document_{self.session_id}.json"
+        with open(document_filename, 'w', encoding='utf-8') as f:
+            json.dump(document.to_dict(), f, ensure_ascii=False, indent=2)
+        self.generated_files.append(document_filename)
+        
+        # Store results; the script itself stays in the content file
+        result = {
+            'topic': topic,
+            'image_files': image_files,
+            'content_file': content_filename,
+            'document_file': document_filename,
+            'content_hash': content_hash(content),
+            'generated_at': datetime.now().isoformat(),
+            'success': True
+        }
+        self._publish(result)
+        catalog_result(self.session_id, result, content)
+        get_metrics().jobs.inc(outcome='success')
+        
+        self.update_progress(100, f"✅ Successfully generated content for '{topic}'!")
+        return result
+    
+    def _store_error(self, error: Exception):
+        """Publish a failed generation"""
+        self.update_progress(0, f"❌ Error: {str(error)}")
+        result = {
+            'success': False,
+            'error': str(error)
+        }
+        self._publish(result)
+        get_metrics().jobs.inc(outcome='error')
+        return result
+    
+    def _store_cancelled(self, reason: str, image_files=()):
+        """Publish a cancelled generation and remove the files it had written"""
+        self.cleanup_files(self.generated_files + list(image_files))
+        self.generated_files = []
+        self.update_progress(0, f"🛑 {reason}")
+        result = cancelled_result(reason)
+        self._publish(result)
+        get_metrics().jobs.inc(outcome='cancelled')
+        return result
+
+class AsyncWebAIAgent(WebAIAgent, AsyncAIContentAgent):
+    """Web agent running on the shared asyncio engine instead of its own thread"""
+    
+    @timed('job', outcome=result_outcome)
+    async def process_topic_web(self, topic: str):
+        """Web-adapted version of process_topic for the async engine"""
+        # Cancelling interrupts the task wherever it awaits, aborting in-flight requests
+        loop, task = asyncio.get_running_loop(), asyncio.current_task()
+        unregister = self.cancel_token.on_cancel(lambda: loop.call_soon_threadsafe(task.cancel))
+        filenames = []
+        try:
+            self.cancel_token.raise_if_cancelled()
+            self.update_progress(10, f"Starting content generation for: {topic}")
+            deadline = self.retry_policy.deadline()
             
-            self.update_progress(100, f"✅ Successfully generated content for '{topic}'!")
+            self.update_progress(25, "Generating YouTube Shorts script...")
+            content, document = await self.get_script(topic)
+            self.cancel_token.raise_if_cancelled()
+            self.update_progress(40, f"Found {len(document.image_prompts)} image prompts...")
+            
+            self.update_progress(50, "Generating images...")
+            enhanced_prompts, filenames = self._plan_images(document.image_prompts)
+            image_files = await self.generate_images(enhanced_prompts, filenames, 50, 80, deadline)
+            self.generated_files.extend(image_files)
+            self.cancel_token.raise_if_cancelled()
             
+            self.update_progress(90, "Saving content...")
+            unregister()
+            return await asyncio.to_thread(self._store_result, topic, content, document, image_files)
+            
+        except JobCancelled as e:
+            return self._store_cancelled(e.reason, filenames)
+        except asyncio.CancelledError:
+            return self._store_cancelled(self.cancel_token.reason or 'Cancelled', filenames)
+        except Exception as e:
+            return self._store_error(e)
+        finally:
+            unregister()
+
+def start_generation(session_id: str, topic: str):
+    """Return a callable that starts one job on the configured engine and returns its future"""
+    if os.getenv('GENERATION_ENGINE', 'threads') == 'async':
+        # Run on the shared event loop; no thread is held while waiting on the API
+        agent = AsyncWebAIAgent(session_id)
+        return lambda: get_async_runner().submit(agent.process_topic_web(topic))
+    
+    # Run on one of the job queue's worker threads
+    agent = WebAIAgent(session_id)
+    process, job_queue = agent.process_topic_web, get_job_queue()
+    return lambda: job_queue.run_call(process, topic)
+
+def fail_run(session_id: str, error: str):
+    """Publish an error for a run that never started, and for every job that joined it"""
+    followers, _ = get_single_flight().finish(session_id)
+    result = {'success': False, 'error': error}
+    for job_id in [session_id] + followers:
+        get_job_store().set_result(job_id, result)
+
+def start_run(session_id: str, topic: str):
+    """Like :func:`start_generation`, but a job that fails to start still gets a result"""
+    try:
+        launch = start_generation(session_id, topic)
+    except Exception as e:
+        fail_run(session_id, f"Could not start generation: {e}")
+        raise
+    
+    def start():
+        try:
+            return launch()
         except Exception as e:
-            self.update_progress(0, f"❌ Error: {str(e)}")
-            generation_results[self.session_id] = {
-                'success': False,
-                'error': str(e)
-            }
+            # A queued job is launched by whichever job frees its slot, so nobody else would report this
+            fail_run(session_id, f"Could not start generation: {e}")
+            get_metrics().jobs.inc(outcome='error')
+            raise
+    return start
+
+def forget_files(session_id: str):
+    """Keep a job whose files the storage collector removed in the catalog, with its script but no images"""
+    try:
+        catalog = get_result_catalog()
+        if catalog is not None:
+            catalog.mark_files_removed(session_id)
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Result catalog unavailable: {e}")
+
+def start_storage_collector():
+    """Start the background cleanup of static/generated; later calls do nothing"""
+    collector = get_storage_collector()
+    if collector is None:
+        return
+    # Files of running jobs and of jobs in other workers' stores are never removed
+    collector.live_jobs = get_job_store().running_ids
+    collector.on_evict = forget_files
+    collector.start(float(os.getenv('STORAGE_GC_INTERVAL', '300')))
+
+def mark_seen(session_id: str):
+    """Note a client poll; polling a job that joined another run keeps that run from being abandoned"""
+    job_store = get_job_store()
+    job_store.seen(session_id)
+    leader = get_single_flight().leader_of(session_id)
+    if leader is not None and leader != session_id:
+        job_store.seen(leader)
+
+def queue_position(session_id: str) -> Optional[int]:
+    """Return the queue position of a job, or of the run it joined"""
+    return get_job_queue().position(get_single_flight().leader_of(session_id) or session_id)
+
+def coalescing_enabled(data: dict) -> bool:
+    """Whether a submission may join a running job for the same topic"""
+    if os.getenv('COALESCE_TOPICS', '1').lower() in ('0', 'false', 'no'):
+        return False
+    return data.get('coalesce', True) is not False
+
+def reusable_result(topic: str):
+    """Return ``(session_id, result)`` of a recent complete result for the topic, if reuse is enabled"""
+    max_age = float(os.getenv('RESULT_REUSE_SECONDS', '0'))
+    if max_age <= 0:
+        return None
+    try:
+        catalog = get_result_catalog()
+        return catalog.find_topic(topic, max_age) if catalog is not None else None
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Result catalog unavailable: {e}")
+        return None
 
 @app.route('/')
 def index():
@@ -107,84 +390,322 @@ def generate_content():
     if not topic:
         return jsonify({'error': 'Topic is required'}), 400
     
-    # Create session ID
-    session_id = f"gen_{int(time.time())}"
+    # Create a unique session ID
+    job_store = get_job_store()
+    session_id = job_store.new_id()
     
-    # Initialize status
-    generation_status[session_id] = {
-        'progress': 0,
-        'status': 'Starting...',
-        'timestamp': datetime.now().isoformat()
-    }
+    previous = reusable_result(topic) if not data.get('fresh') else None
+    if previous is not None:
+        # Served as a finished job, so /status, /events and /download work as usual
+        job_store.create(session_id, topic=topic, reused_from=previous[0])
+        job_store.set_status(session_id, 100, f"✅ Reused content generated earlier for '{topic}'")
+        job_store.set_result(session_id, previous[1])
+        return jsonify({
+            'session_id': session_id,
+            'status': 'Generation reused',
+            'queue_position': 0,
+            'reused_from': previous[0]
+        })
     
-    # Start generation in background thread
-    agent = WebAIAgent(session_id)
-    thread = threading.Thread(target=agent.process_topic_web, args=(topic,))
-    thread.daemon = True
-    thread.start()
+    # Initialize status; the job overwrites it once a worker picks it up
+    job_store.create(session_id, 'Waiting for a free worker...', topic=topic)
+    # From here on the job is cancelled if its page stops polling
+    job_store.seen(session_id)
+    
+    flights = get_single_flight()
+    leader = None
+    if coalescing_enabled(data):
+        # A cancelled or abandoned run is not joined; this job replaces it
+        leader = flights.join(topic, session_id, alive=lambda leader_id: not job_store.cancelled(leader_id))
+    if leader is not None:
+        # Identical work is already running; this job gets its progress and result
+        current = job_store.get_status(leader)
+        if current is not None:
+            job_store.set_status(session_id, current['progress'], current['status'])
+        return jsonify({
+            'session_id': session_id,
+            'status': 'Generation joined',
+            'queue_position': queue_position(session_id) or 0,
+            'coalesced_into': leader
+        })
+    
+    start_storage_collector()
+    job_queue = get_job_queue()
+    try:
+        position = job_queue.submit(session_id, start_run(session_id, topic))
+    except QueueFullError as e:
+        fail_run(session_id, 'Too many generations in progress')
+        job_store.delete(session_id)
+        response = jsonify({
+            'error': 'Too many generations in progress, please retry later',
+            'retry_after': e.retry_after
+        })
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
     
     return jsonify({
         'session_id': session_id,
-        'status': 'Generation started'
+        'status': 'Generation started' if position == 0 else 'Generation queued',
+        'queue_position': position
     })
 
+def batch_paths(batch_id: str):
+    """Return the topics, checkpoint and summary files of a batch"""
+    directory = os.path.join(os.getenv('BATCH_DIR', 'batches'), batch_id)
+    return (os.path.join(directory, 'topics.jsonl'),
+            os.path.join(directory, 'checkpoint.jsonl'),
+            os.path.join(directory, 'summary.json'))
+
+def read_batch_topics():
+    """Return the JSONL lines of a batch request, or None if it has none"""
+    upload = request.files.get('file')
+    if upload is not None:
+        return upload.read().decode('utf-8').splitlines()
+    if request.is_json:
+        topics = (request.get_json(silent=True) or {}).get('topics')
+        if topics is None:
+            return None
+        return [json.dumps(topic) for topic in topics]
+    body = request.get_data(as_text=True)
+    return body.splitlines() if body.strip() else None
+
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """Start (or resume) generation for a JSONL list of topics"""
+    data = request.get_json(silent=True) if request.is_json else None
+    batch_id = (data or {}).get('batch_id') or request.args.get('batch_id') or f"batch_{uuid.uuid4().hex[:12]}"
+    if not BATCH_ID_PATTERN.match(batch_id):
+        return jsonify({'error': 'Invalid batch_id'}), 400
+    
+    topics_path, checkpoint_path, summary_path = batch_paths(batch_id)
+    try:
+        lines = read_batch_topics()
+        if lines is not None:
+            items = read_topics(lines)
+            os.makedirs(os.path.dirname(topics_path), exist_ok=True)
+            with open(topics_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(item, ensure_ascii=False) + '\n' for item in items)
+        elif os.path.exists(topics_path):
+            # Resuming: reuse the topics saved when the batch was first submitted
+            items = load_topics(topics_path)
+        else:
+            return jsonify({'error': 'Topics are required'}), 400
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    if not items:
+        return jsonify({'error': 'Topics are required'}), 400
+    
+    def start_item(session_id: str, topic: str):
+        get_job_store().create(session_id, 'Waiting for a free worker...', topic=topic, batch_id=batch_id)
+        return start_generation(session_id, topic)
+    
+    start_storage_collector()
+    job_queue = get_job_queue()
+    with batch_runners_lock:
+        current = batch_runners.get(batch_id)
+        if current is not None and current.summary()['state'] == 'running':
+            return jsonify({'error': 'Batch is already running', 'batch_id': batch_id}), 409
+        runner = BatchRunner(
+            batch_id, items, checkpoint_path, start_item, job_queue,
+            # Leave a worker free for interactive requests by default
+            concurrency=int(os.getenv('BATCH_CONCURRENCY', str(max(1, job_queue.workers - 1)))),
+            summary_path=summary_path,
+        )
+        batch_runners[batch_id] = runner
+    threading.Thread(target=runner.run, name=f'batch-{batch_id}', daemon=True).start()
+    
+    return jsonify({
+        'batch_id': batch_id,
+        'status': 'Batch started',
+        'total': len(items)
+    }), 202
+
+@app.route('/batch/<batch_id>')
+def get_batch(batch_id):
+    """Get a batch's progress and throughput summary"""
+    with batch_runners_lock:
+        runner = batch_runners.get(batch_id)
+    if runner is not None:
+        return jsonify(runner.summary())
+    
+    # Batches from before a restart only have their last saved summary
+    if BATCH_ID_PATTERN.match(batch_id):
+        try:
+            with open(batch_paths(batch_id)[2], 'r', encoding='utf-8') as f:
+                summary = json.load(f)
+            if summary.get('state') == 'running':
+                summary['state'] = 'interrupted'
+            return jsonify(summary)
+        except (OSError, ValueError):
+            pass
+    return jsonify({'error': 'Batch not found'}), 404
+
 @app.route('/status/<session_id>')
 def get_status(session_id):
     """Get generation status"""
-    status = generation_status.get(session_id, {
-        'progress': 0,
-        'status': 'Session not found',
-        'timestamp': datetime.now().isoformat()
-    })
+    mark_seen(session_id)
+    status = get_job_store().get_status(session_id)
+    if status is None:
+        finished = find_result(session_id)
+        status = {
+            'progress': 100 if finished else 0,
+            'status': '✅ Completed' if finished else 'Session not found',
+            'timestamp': datetime.now().isoformat()
+        }
+    position = queue_position(session_id)
+    if position is not None:
+        status = dict(status, queue_position=position)
     return jsonify(status)
 
+def result_payload(result):
+    """Build the client-facing result and its HTTP status code"""
+    if result.get('cancelled'):
+        return {'error': result.get('error', 'Cancelled'), 'cancelled': True}, 409
+    if not result.get('success', False):
+        return {'error': result.get('error', 'Generation failed')}, 500
+    
+    result = dict(result, content=get_content_text(result), document=get_document_data(result))
+    
+    # Make file paths relative to static folder
+    result['image_files'] = [f.replace('static/', '') for f in result['image_files']]
+    result['content_file'] = result['content_file'].replace('static/', '')
+    if 'document_file' in result:
+        result['document_file'] = result['document_file'].replace('static/', '')
+    return result, 200
+
 @app.route('/result/<session_id>')
 def get_result(session_id):
     """Get generation result"""
-    result = generation_results.get(session_id)
+    mark_seen(session_id)
+    result = find_result(session_id)
     if not result:
         return jsonify({'error': 'Result not found'}), 404
     
-    if not result.get('success', False):
-        return jsonify({'error': result.get('error', 'Generation failed')}), 500
+    payload, status_code = result_payload(result)
+    return jsonify(payload), status_code
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/events/<session_id>')
+def stream_events(session_id):
+    """Push progress updates and the final result as Server-Sent Events"""
+    job_store = get_job_store()
+    if session_id not in job_store:
+        finished = find_result(session_id)
+        if finished is None:
+            return jsonify({'error': 'Session not found'}), 404
+        payload, _ = result_payload(finished)
+        return Response(sse_event('result', payload), mimetype='text/event-stream')
     
-    # Make file paths relative to static folder
-    result['image_files'] = [f.replace('static/', '') for f in result['image_files']]
-    result['content_file'] = result['content_file'].replace('static/', '')
+    keepalive = float(os.getenv('SSE_KEEPALIVE_SECONDS', '15'))
+    # Streams end well before the worker timeout; the page reconnects from the version it has seen
+    max_seconds = float(os.getenv('SSE_MAX_SECONDS', '120'))
+    try:
+        since = int(request.args.get('since', -1))
+    except ValueError:
+        since = -1
+    
+    def events():
+        version = since
+        last_status = None
+        started = last_sent = time.monotonic()
+        while True:
+            remaining = max_seconds - (time.monotonic() - started)
+            if remaining <= 0:
+                yield sse_event('reconnect', {'since': version})
+                return
+            # Queue positions change without a store update, so recheck them every second
+            position = queue_position(session_id)
+            timeout = min(1.0 if position else keepalive, remaining)
+            mark_seen(session_id)
+            snapshot = job_store.wait_for_change(session_id, version, timeout)
+            if snapshot is None:
+                yield sse_event('gone', {'error': 'Session not found'})
+                return
+            
+            status = snapshot['status']
+            position = queue_position(session_id)
+            if position is not None:
+                status['queue_position'] = position
+            if last_status is None and snapshot['version'] <= since:
+                # A resumed stream; the page already shows this status
+                last_status = status
+            version = snapshot['version']
+            
+            if status != last_status:
+                yield sse_event('progress', status)
+                last_status = status
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= keepalive:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            
+            if snapshot['result'] is not None:
+                payload, _ = result_payload(snapshot['result'])
+                yield sse_event('result', payload)
+                return
+    
+    # Each stream holds a worker thread; past the limit the page polls /status instead
+    slots = get_stream_slots()
+    if not slots.acquire(blocking=False):
+        return jsonify({'error': 'Too many open streams'}), 503
+    response = Response(events(), mimetype='text/event-stream')
+    response.call_on_close(slots.release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/cancel/<session_id>', methods=['POST'])
+def cancel_generation(session_id):
+    """Stop a queued or running generation so its worker and API quota go to other jobs"""
+    job_store = get_job_store()
+    if session_id not in job_store:
+        return jsonify({'error': 'Session not found'}), 404
+    
+    leader = get_single_flight().leader_of(session_id)
+    if leader is not None:
+        if job_store.get_result(session_id) is not None:
+            return jsonify({'error': 'Generation already finished'}), 409
+        others_waiting = get_single_flight().leave(session_id)
+        if leader != session_id:
+            job_store.set_result(session_id, cancelled_result('Cancelled by user'))
+        if others_waiting:
+            # The shared run keeps going for the jobs that still wait for it
+            return jsonify({'session_id': session_id, 'status': 'Cancelled'}), 202
+        session_id = leader
+    if not job_store.cancel(session_id):
+        return jsonify({'error': 'Generation already finished'}), 409
     
-    return jsonify(result)
+    # A queued job stops as soon as a worker picks it up
+    return jsonify({'session_id': session_id, 'status': 'Cancelling'}), 202
 
 @app.route('/download/<session_id>')
 def download_results(session_id):
     """Download all results as ZIP"""
-    result = generation_results.get(session_id)
+    result = find_result(session_id)
     if not result or not result.get('success'):
         return jsonify({'error': 'No results to download'}), 404
     
-    # Create ZIP file in memory
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        
-        # Add content file
-        content_file = result['content_file'].replace('generated/', 'static/generated/')
-        if os.path.exists(content_file):
-            zip_file.write(content_file, f"{result['topic']}_content.txt")
-        
-        # Add images
-        for i, img_file in enumerate(result['image_files'], 1):
-            full_path = f"static/{img_file}"
-            if os.path.exists(full_path):
-                ext = os.path.splitext(img_file)[1]
-                zip_file.write(full_path, f"{result['topic']}_image_{i}{ext}")
-    
-    zip_buffer.seek(0)
-    
-    return send_file(
-        io.BytesIO(zip_buffer.getvalue()),
-        mimetype='application/zip',
-        as_attachment=True,
-        download_name=f"{result['topic']}_youtube_shorts_{session_id}.zip"
-    )
+    files = [(result['content_file'], f"{result['topic']}_content.txt")]
+    if 'document_file' in result:
+        files.append((result['document_file'], f"{result['topic']}_metadata.json"))
+    for i, img_file in enumerate(result['image_files'], 1):
+        ext = os.path.splitext(img_file)[1]
+        files.append((img_file, f"{result['topic']}_image_{i}{ext}"))
+    # The storage collector removes a job's files together
+    if not any(os.path.exists(path) for path, _ in files):
+        return jsonify({'error': 'These results have been removed to free up space'}), 410
+
+    # Entries are written while the files are read, so only one chunk is held at a time
+    archive = ZipStream(files)
+    response = Response(archive, mimetype='application/zip', direct_passthrough=True)
+    content_length = archive.content_length()
+    if content_length is not None:
+        response.content_length = content_length
+    set_attachment_filename(response, f"{result['topic']}_youtube_shorts_{session_id}.zip")
+    return response
 
 @app.route('/health')
 def health_check():
@@ -195,10 +716,55 @@ def health_check():
         'environment_check': {
             'hugging_face_token': '✅' if os.getenv('HUGGING_FACE_TOKEN') else '❌',
             'email_config': '✅' if os.getenv('SENDER_EMAIL') else '❌'
-        }
+        },
+        'connection_pool': get_connection_stats(),
+        'rate_limits': rate_limit_stats(),
+        'image_models': get_model_router().snapshot(),
+        'image_cache': cache_stats(get_image_cache()),
+        'script_cache': cache_stats(get_script_cache()),
+        'job_queue': get_job_queue().stats(),
+        'job_store': get_job_store().stats(),
+        'result_catalog': catalog_stats(),
+        'storage': cache_stats(get_storage_collector()),
+        'coalescing': get_single_flight().stats(),
+        'mail': mailer_stats()
     })
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: stage and inference call timings plus the /health counters"""
+    return Response(get_metrics().render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def cache_stats(cache):
+    """Return a cache's stats, or None when it is disabled"""
+    return cache.stats() if cache else None
+
+def catalog_stats():
+    """Return the result catalog's stats, or None when it is disabled or unreadable"""
+    try:
+        return cache_stats(get_result_catalog())
+    except (sqlite3.Error, OSError):
+        return None
+
+def register_metric_gauges():
+    """Expose the stats behind /health as gauges on /metrics"""
+    metrics = get_metrics()
+    metrics.register_gauges('job_queue', 'Job queue', lambda: get_job_queue().stats())
+    metrics.register_gauges('job_store', 'Job store', lambda: get_job_store().stats())
+    metrics.register_gauges('image_cache', 'Image cache', lambda: cache_stats(get_image_cache()))
+    metrics.register_gauges('script_cache', 'Script cache', lambda: cache_stats(get_script_cache()))
+    metrics.register_gauges('result_catalog', 'Result catalog', catalog_stats)
+    metrics.register_gauges('storage', 'Generated files', lambda: cache_stats(get_storage_collector()))
+    metrics.register_gauges('coalescing', 'Coalesced submissions', lambda: get_single_flight().stats())
+    metrics.register_gauges('connection_pool', 'Inference connection pool', get_connection_stats)
+    metrics.register_gauges('mail', 'Email delivery', mailer_stats)
+
+register_metric_gauges()
+
 if __name__ == '__main__':
+    load_environment()
+    app.secret_key = os.getenv('FLASK_SECRET_KEY', app.secret_key)
+    
     # Create necessary directories
     os.makedirs('static/generated', exist_ok=True)
     os.makedirs('templates', exist_ok=True)
@@ -0,0 +1,353 @@
+"""Asyncio variant of the content pipeline"""
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+import weakref
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Coroutine, List, Optional, Tuple
+
+from ai_agent import AIContentAgent
+from content_parser import ScriptDocument, parse_script
+from hf_client import acquire_hf_slot_async, record_hf_response
+from metrics import record_hf_call, span, timed
+from retry_policy import Deadline
+from image_download import AtomicImageWriter, CHUNK_SIZE
+from model_router import parse_retry_after
+
+if TYPE_CHECKING:
+    import aiohttp
+
+# One aiohttp session and one global image semaphore per event loop
+_loop_sessions = weakref.WeakKeyDictionary()
+_loop_image_slots = weakref.WeakKeyDictionary()
+
+
+def get_async_session() -> 'aiohttp.ClientSession':
+    """Return the pooled aiohttp session of the running event loop"""
+    # Imported here so the threads engine never pays for loading aiohttp
+    import aiohttp
+    loop = asyncio.get_running_loop()
+    session = _loop_sessions.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=max(1, int(os.getenv('HF_POOL_SIZE', '16'))),
+            keepalive_timeout=60,
+        )
+        session = aiohttp.ClientSession(connector=connector)
+        _loop_sessions[loop] = session
+    return session
+
+
+async def close_async_session():
+    """Close the aiohttp session of the running event loop"""
+    session = _loop_sessions.pop(asyncio.get_running_loop(), None)
+    if session is not None and not session.closed:
+        await session.close()
+
+
+def get_async_image_slots() -> asyncio.Semaphore:
+    """Return the event loop's semaphore limiting concurrent image generations"""
+    loop = asyncio.get_running_loop()
+    slots = _loop_image_slots.get(loop)
+    if slots is None:
+        slots = asyncio.Semaphore(max(1, int(os.getenv('IMAGE_WORKERS_GLOBAL', '8'))))
+        _loop_image_slots[loop] = slots
+    return slots
+
+
+class AsyncAIContentAgent(AIContentAgent):
+    """Non-blocking pipeline: aiohttp for inference calls and asyncio for every wait.
+
+    The pipeline methods are coroutines with the same names as their blocking
+    counterparts, so one event loop can hold many in-flight jobs without a
+    thread per job. File work and building the email still block, so they
+    run in the default executor.
+    """
+
+    async def generate_text_content(self, topic: str) -> str:
+        """Generate text content using Hugging Face free models"""
+        import aiohttp
+        model_name = self.text_model_url.split('/')[-1]
+        if not await acquire_hf_slot_async(self.hf_token, self.text_model_url):
+            print(f"⏳ Request budget for {model_name} is used up, using fallback content")
+            return self.generate_fallback_content(topic)
+        started = time.monotonic()
+        status = None
+        retry_after = None
+        try:
+            async with get_async_session().post(
+                self.text_model_url,
+                headers=self.headers,
+                json=self._text_payload(topic),
+                timeout=aiohttp.ClientTimeout(total=60),
+            ) as response:
+                status = response.status
+                retry_after = parse_retry_after(response.headers.get('retry-after'))
+                if response.status == 200:
+                    return self._text_from_result(topic, await response.json(content_type=None))
+                print(f"Text generation failed: {response.status}")
+                return self.generate_fallback_content(topic)
+
+        except Exception as e:
+            print(f"Error generating text: {e}")
+            return self.generate_fallback_content(topic)
+        finally:
+            record_hf_call('text', model_name, status, time.monotonic() - started)
+            record_hf_response(self.hf_token, self.text_model_url, status, retry_after)
+
+    @timed('script')
+    async def get_script(self, topic: str) -> Tuple[str, ScriptDocument]:
+        """Return the script and its parsed document for a topic, reusing recent results"""
+        if self.script_cache is not None:
+            cached = self.script_cache.get(topic)
+            if cached is not None:
+                print(f"⚡ Script cache hit for: {topic}")
+                return cached
+
+        content = await self.generate_text_content(topic)
+        document = parse_script(content)
+
+        if self.script_cache is not None:
+            self.script_cache.put(topic, content, document)
+        return content, document
+
+    @staticmethod
+    def _estimated_time_from_body(body: bytes) -> Optional[float]:
+        try:
+            error_data = json.loads(body)
+        except ValueError:
+            return None
+        if isinstance(error_data, dict) and 'estimated_time' in error_data:
+            try:
+                return float(error_data['estimated_time'])
+            except (TypeError, ValueError):
+                return None
+        return None
+
+    async def _download_image_async(self, response: 'aiohttp.ClientResponse', filename: str) -> bool:
+        """Stream a response body into ``filename``; it only appears once it is a valid image"""
+        writer = await asyncio.to_thread(
+            AtomicImageWriter, filename, self.image_max_bytes, self.image_min_dimension
+        )
+        with writer:
+            # Chunk writes go to the local page cache and are cheap enough to do on the loop
+            async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                writer.write(chunk)
+            return await asyncio.to_thread(writer.commit) is not None
+
+    async def generate_image(self, prompt: str, filename: str, deadline: Optional[Deadline] = None) -> bool:
+        """Generate image using Hugging Face Stable Diffusion, fastest healthy model first"""
+        import aiohttp
+        if deadline is None:
+            deadline = self.retry_policy.deadline()
+
+        if self.image_cache is not None:
+            cached_model = await asyncio.to_thread(self.image_cache.fetch, prompt, self.image_models, filename)
+            if cached_model:
+                print(f"⚡ Cache hit ({cached_model.split('/')[-1]}): {filename}")
+                return True
+
+        candidates = self.router.candidates(self.image_models)
+        if not candidates:
+            wait_time = self.router.next_available_in(self.image_models)
+            print(f"⏳ All image models are cooling down for another {wait_time:.0f}s")
+            print(f"❌ Skipping: {prompt[:50]}...")
+            return False
+
+        failures = 0
+        for model_url in candidates:
+            model_name = model_url.split('/')[-1]
+            if self.cancel_token.cancelled:
+                print(f"🛑 Job cancelled, skipping: {prompt[:50]}...")
+                return False
+            delay = self.retry_policy.delay(failures)
+            if not self.retry_policy.has_time(deadline, delay):
+                print(f"⌛ Job deadline reached, giving up on: {prompt[:50]}...")
+                return False
+            if delay > 0:
+                print(f"⏳ Backing off {delay:.1f}s before trying {model_name}...")
+                with span('retry_wait'):
+                    if await self.cancel_token.wait_async(delay):
+                        print(f"🛑 Job cancelled, skipping: {prompt[:50]}...")
+                        return False
+            budget = deadline.remaining() - self.retry_policy.min_attempt_seconds
+            if budget <= 0:
+                print(f"⌛ Job deadline reached, giving up on: {prompt[:50]}...")
+                return False
+            if not await acquire_hf_slot_async(self.hf_token, model_url, budget):
+                print(f"⏳ Request budget for {model_name} is used up. Trying next model...")
+                continue
+            started = time.monotonic()
+            status_code = None
+            cooldown = None
+
+            try:
+                print(f"🎨 Trying model: {model_name}")
+                async with get_async_session().post(
+                    model_url,
+                    headers=self.headers,
+                    json={"inputs": prompt},
+                    timeout=aiohttp.ClientTimeout(total=self.retry_policy.request_timeout_for(deadline)),
+                ) as response:
+                    status_code = response.status
+                    content_type = response.headers.get('content-type', '')
+                    retry_after = response.headers.get('retry-after')
+                    print(f"📡 API Response Status: {status_code}")
+
+                    streamed = status_code == 200 and 'json' not in content_type
+                    if streamed:
+                        saved = await self._download_image_async(response, filename)
+                    else:
+                        body = await response.read()
+
+                if streamed:
+                    if saved:
+                        print(f"✅ Image saved successfully: {filename}")
+                        elapsed = time.monotonic() - started
+                        record_hf_call('image', model_name, status_code, elapsed)
+                        record_hf_response(self.hf_token, model_url, status_code)
+                        self.router.record_success(model_url, elapsed)
+                        await asyncio.to_thread(self._cache_image, prompt, model_url, filename)
+                        return True
+                    print(f"❌ Response was not a valid image: {filename}")
+                elif status_code in (200, 503):
+                    cooldown = self._estimated_time_from_body(body)
+                    print(f"⏳ Model {model_name} is loading. Trying next model...")
+                elif status_code == 429:
+                    cooldown = parse_retry_after(retry_after)
+                    print(f"⏰ Rate limit on {model_name}. Trying next model...")
+                else:
+                    print(f"❌ HTTP Error {status_code}")
+
+            except asyncio.TimeoutError:
+                print(f"⏰ Timeout with {model_name}. Trying next model...")
+            except Exception as e:
+                # Includes downloads that were too large or could not be written
+                print(f"❌ Error with {model_name}: {e}")
+
+            elapsed = time.monotonic() - started
+            record_hf_call('image', model_name, status_code, elapsed)
+            record_hf_response(self.hf_token, model_url, status_code, cooldown)
+            self.router.record_failure(model_url, elapsed, status_code, cooldown)
+            if self.retry_policy.backs_off(status_code):
+                failures += 1
+
+        print(f"❌ All models failed for: {prompt[:50]}...")
+        return False
+
+    @timed('images')
+    async def generate_images(self, prompts: List[str], filenames: List[str],
+                              progress_start: float = 50, progress_end: float = 80,
+                              deadline: Optional[Deadline] = None) -> List[str]:
+        """Generate images concurrently and return the saved filenames in prompt order"""
+        total = len(prompts)
+        if total == 0:
+            return []
+
+        if deadline is None:
+            deadline = self.retry_policy.deadline()
+        global_slots = get_async_image_slots()
+        job_slots = asyncio.Semaphore(self.image_workers)
+        completed = 0
+
+        async def generate_one(index: int) -> bool:
+            nonlocal completed
+            try:
+                async with job_slots, global_slots:
+                    return await self.generate_image(prompts[index], filenames[index], deadline)
+            except Exception as e:
+                print(f"❌ Image {index + 1} failed: {e}")
+                return False
+            finally:
+                completed += 1
+                progress = progress_start + (progress_end - progress_start) * completed / total
+                self.update_progress(progress, f"Generated image {completed}/{total}...")
+
+        results = await asyncio.gather(*(generate_one(i) for i in range(total)))
+        return [filename for filename, ok in zip(filenames, results) if ok]
+
+    @timed('job')
+    async def process_topic(self, topic: str):
+        """Main process to generate content and send email"""
+        print(f"Starting YouTube Shorts content generation for topic: {topic}")
+        deadline = self.retry_policy.deadline()
+
+        print("Generating YouTube Shorts script with 5 facts...")
+        _, document = await self.get_script(topic)
+        image_prompts = document.image_prompts
+        print(f"Found {len(image_prompts)} image prompts")
+
+        print("Generating images for YouTube Shorts...")
+        enhanced_prompts = [
+            f"{prompt}, 9:16 aspect ratio, vertical orientation, cinematic quality, vibrant colors"
+            for prompt in image_prompts
+        ]
+        run_id = f"{int(time.time())}_{uuid.uuid4().hex[:8]}"
+        filenames = [f"youtube_shorts_image_{i}_{run_id}.png" for i in range(1, len(image_prompts) + 1)]
+        image_files = await self.generate_images(enhanced_prompts, filenames, deadline=deadline)
+        print(f"Generated {len(image_files)} YouTube Shorts images successfully")
+
+        print("Sending email...")
+        await asyncio.to_thread(self.send_email, topic, document, image_files)
+
+        print("Cleaning up temporary files...")
+        await asyncio.to_thread(self.cleanup_files, image_files)
+
+        print("Process completed successfully!")
+        return {'topic': topic, 'image_files': image_files, 'success': True}
+
+
+class AsyncRunner:
+    """Runs coroutines on one long-lived event loop in a background thread"""
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                ready = threading.Event()
+
+                def run():
+                    asyncio.set_event_loop(loop)
+                    loop.call_soon(ready.set)
+                    loop.run_forever()
+
+                self._thread = threading.Thread(target=run, name='async-engine', daemon=True)
+                self._thread.start()
+                ready.wait()
+                self._loop = loop
+            return self._loop
+
+    def submit(self, coro: Coroutine) -> Future:
+        """Schedule a coroutine on the engine loop and return a concurrent future"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_started())
+
+    def stop(self):
+        """Close the loop's HTTP session and stop the loop"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(close_async_session(), loop).result(timeout=5)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(timeout=5)
+
+
+_async_runner = None
+_async_runner_lock = threading.Lock()
+
+
+def get_async_runner() -> AsyncRunner:
+    """Return the process-wide async engine runner"""
+    global _async_runner
+    with _async_runner_lock:
+        if _async_runner is None:
+            _async_runner = AsyncRunner()
+        return _async_runner
@@ -0,0 +1,263 @@
+"""Batch generation of many topics with checkpointing and resume"""
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional
+
+from job_queue import JobQueue
+from script_cache import normalize_topic
+
+
+def read_topics(lines: Iterable[str]) -> List[Dict[str, str]]:
+    """Parse JSONL topics: each line is {"topic": ..., "id": ...} or a JSON string.
+
+    Items without an ``id`` are keyed by their normalized topic, so a
+    resumed batch recognizes them and duplicate topics run only once.
+    """
+    items = []
+    seen = set()
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            raise ValueError(f"Line {number} is not valid JSON")
+        if isinstance(data, str):
+            data = {'topic': data}
+        if not isinstance(data, dict) or not str(data.get('topic', '')).strip():
+            raise ValueError(f"Line {number} has no topic")
+
+        topic = str(data['topic']).strip()
+        item_id = str(data.get('id') or normalize_topic(topic))
+        if item_id in seen:
+            continue
+        seen.add(item_id)
+        items.append({'id': item_id, 'topic': topic})
+    return items
+
+
+def load_topics(path: str) -> List[Dict[str, str]]:
+    """Read a JSONL file of topics"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return read_topics(f)
+
+
+def _percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))], 2)
+
+
+class BatchCheckpoint:
+    """Append-only JSONL record of finished batch items.
+
+    Each finished item is one line, flushed to disk before the next one is
+    recorded, so a crash loses at most the items that were still running.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Dict[str, Dict]:
+        """Return the latest record of every item, keyed by item ID"""
+        records = {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # A line cut short by a crash
+                    if isinstance(record, dict) and 'id' in record:
+                        records[record['id']] = record
+        except FileNotFoundError:
+            pass
+        return records
+
+    def record(self, entry: Dict):
+        """Append one finished item"""
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class BatchRunner:
+    """Runs a list of topics through the shared job queue.
+
+    At most ``concurrency`` items are submitted at once, so a large batch
+    never fills the queue ahead of interactive jobs; further items wait
+    until one finishes. Items already marked done in the checkpoint are
+    skipped, which is how an interrupted batch resumes.
+
+    ``start_item(session_id, topic)`` returns a callable that starts the job
+    and returns a future resolving to the job's result dict.
+    """
+
+    def __init__(self, batch_id: str, items: List[Dict[str, str]], checkpoint_path: str,
+                 start_item: Callable[[str, str], Callable[[], Future]], job_queue: JobQueue,
+                 concurrency: int = 1, summary_path: Optional[str] = None):
+        self.batch_id = batch_id
+        self.items = items
+        self.checkpoint = BatchCheckpoint(checkpoint_path)
+        self.summary_path = summary_path
+        self.start_item = start_item
+        self.job_queue = job_queue
+        self.concurrency = max(1, concurrency)
+
+        self._lock = threading.Lock()
+        self._summary_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._records = {}
+        self._running = set()
+        self._durations = []
+        self._skipped = 0
+        self._started = None
+        self._finished = None
+        self._started_at = None
+
+    def run(self) -> Dict:
+        """Process every pending item and return the batch summary"""
+        self._records = self.checkpoint.load()
+        pending = {item['id'] for item in self.items
+                   if self._records.get(item['id'], {}).get('status') != 'done'}
+        with self._lock:
+            self._skipped = len(self.items) - len(pending)
+            self._started = time.monotonic()
+            self._started_at = datetime.now().isoformat()
+
+        print(f"📦 Batch {self.batch_id}: {len(pending)} topics to run, {self._skipped} already done")
+        for index, item in enumerate(self.items):
+            if item['id'] not in pending:
+                continue
+            self._slots.acquire()
+            session_id = f"{self.batch_id}_{index}"
+            with self._lock:
+                self._running.add(item['id'])
+            try:
+                start_job = self.start_item(session_id, item['topic'])
+            except Exception as e:
+                self._complete(item, session_id, time.monotonic(), None, e)
+                continue
+            self.job_queue.submit(session_id, self._tracked(item, session_id, start_job), block=True)
+
+        # Wait for the last items to finish
+        for _ in range(self.concurrency):
+            self._slots.acquire()
+        for _ in range(self.concurrency):
+            self._slots.release()
+
+        with self._lock:
+            self._finished = time.monotonic()
+        summary = self._write_summary()
+        print(f"📦 Batch {self.batch_id} finished: {summary['done']} done, {summary['failed']} failed, "
+              f"{summary['topics_per_minute']} topics/min")
+        return summary
+
+    def _tracked(self, item: Dict[str, str], session_id: str,
+                 start_job: Callable[[], Future]) -> Callable[[], Future]:
+        def start() -> Future:
+            started = time.monotonic()
+            try:
+                future = start_job()
+            except Exception as e:
+                self._complete(item, session_id, started, None, e)
+                raise
+            future.add_done_callback(lambda f: self._complete(item, session_id, started, f, None))
+            return future
+        return start
+
+    def _complete(self, item: Dict[str, str], session_id: str, started: float,
+                  future: Optional[Future], error: Optional[Exception]):
+        seconds = time.monotonic() - started
+        result = None
+        if future is not None:
+            try:
+                result = future.result()
+            except Exception as e:
+                error = e
+        if error is None and isinstance(result, dict) and not result.get('success', True):
+            error = result.get('error', 'Generation failed')
+
+        record = {
+            'id': item['id'],
+            'topic': item['topic'],
+            'session_id': session_id,
+            'status': 'failed' if error is not None else 'done',
+            'seconds': round(seconds, 3),
+            'images': len(result.get('image_files') or []) if isinstance(result, dict) else 0,
+            'finished_at': datetime.now().isoformat(),
+        }
+        if error is not None:
+            record['error'] = str(error)
+
+        try:
+            self.checkpoint.record(record)
+        except OSError as e:
+            print(f"❌ Could not checkpoint {item['id']}: {e}")
+        with self._lock:
+            self._records[item['id']] = record
+            self._running.discard(item['id'])
+            self._durations.append(seconds)
+        self._write_summary()
+        self._slots.release()
+
+    def summary(self) -> Dict:
+        """Return progress counts and throughput for the batch"""
+        with self._lock:
+            done = sum(1 for item in self.items if self._records.get(item['id'], {}).get('status') == 'done')
+            failed = sum(1 for item in self.items if self._records.get(item['id'], {}).get('status') == 'failed')
+            images = sum(record.get('images', 0) for record in self._records.values()
+                         if record.get('status') == 'done')
+            end = self._finished if self._finished is not None else time.monotonic()
+            elapsed = end - self._started if self._started is not None else 0.0
+            finished_this_run = len(self._durations)
+            return {
+                'batch_id': self.batch_id,
+                'state': 'finished' if self._finished is not None else 'running',
+                'total': len(self.items),
+                'done': done,
+                'failed': failed,
+                'running': len(self._running),
+                'pending': len(self.items) - done - failed - len(self._running),
+                'skipped': self._skipped,
+                'images': images,
+                'concurrency': self.concurrency,
+                'started_at': self._started_at,
+                'elapsed_seconds': round(elapsed, 2),
+                'topics_per_minute': round(finished_this_run * 60 / elapsed, 2) if elapsed > 0 else 0.0,
+                'avg_topic_seconds': round(sum(self._durations) / finished_this_run, 2) if finished_this_run else None,
+                'p95_topic_seconds': _percentile(self._durations, 0.95),
+            }
+
+    def _write_summary(self) -> Dict:
+        # Serialized so an older snapshot never replaces a newer one
+        with self._summary_lock:
+            summary = self.summary()
+            if self.summary_path:
+                self._save_summary(summary)
+        return summary
+
+    def _save_summary(self, summary: Dict):
+        directory = os.path.dirname(self.summary_path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(summary, f, indent=2)
+            os.replace(tmp_path, self.summary_path)
+        except OSError as e:
+            print(f"❌ Could not write batch summary: {e}")
@@ -0,0 +1,75 @@
+"""Time script parsing on large generated scripts.
+
+Compares the single-pass parser against the previous approach, where every
+output scanned the script again (prompt extraction, section splitting and
+prompt stripping), once per output.
+
+    python benchmarks/bench_parser.py [--facts N] [--repeat N]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from content_parser import parse_script  # noqa: E402
+
+OUTPUTS = 3  # email, web result and ZIP
+
+
+def make_script(facts: int) -> str:
+    """Build a script shaped like the model's output with ``facts`` facts"""
+    lines = ['🧠 **VIDEO SCRIPT: Facts About Space**', '', '**HOOK (0-10 seconds):**', '"Look up!"', '']
+    for i in range(1, facts + 1):
+        lines += [f'**FACT {i}:**', f'Fact number {i} is about the stars and how they burn. ' * 4, '']
+    lines += ['**OUTRO:**', '"Follow for more!"', '', '🖼️ **AI IMAGE GENERATION PROMPTS:**', '']
+    lines += [f'[IMAGE_PROMPT: vertical shot {i} of a glowing nebula, cinematic lighting]' for i in range(facts + 2)]
+    lines += ['', '🎬 **YOUTUBE SHORTS TITLE:**', '"Space Facts"', '', '📄 **VIDEO DESCRIPTION:**',
+              'Facts about space. ' * 20, '', '🏷️ **META TAGS / HASHTAGS:**', '#shorts #space #facts']
+    return '\n'.join(lines)
+
+
+def legacy_parse(content: str):
+    """The per-output parsing the pipeline did before the shared document"""
+    prompts = re.findall(r'\[IMAGE_PROMPT:\s*(.*?)\]', content, re.IGNORECASE)
+    sections = {'script': '', 'title': '', 'description': '', 'hashtags': ''}
+    current = 'script'
+    for line in content.split('\n'):
+        if '🎬' in line or 'YOUTUBE SHORTS TITLE' in line:
+            current = 'title'
+        elif '📄' in line or 'VIDEO DESCRIPTION' in line:
+            current = 'description'
+        elif '🏷️' in line or 'META TAGS' in line or 'HASHTAGS' in line:
+            current = 'hashtags'
+        elif line.strip():
+            sections[current] += line + '\n'
+    script = re.sub(r'\[IMAGE_PROMPT:.*?\]', '', sections['script'], flags=re.IGNORECASE)
+    return prompts, script, sections
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--facts', type=int, nargs='+', default=[5, 100, 2000])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'facts':>6} {'KiB':>8} {'legacy x%d ms' % OUTPUTS:>14} {'single ms':>10} {'speedup':>8}")
+    for facts in args.facts:
+        content = make_script(facts)
+        legacy = timed(lambda: [legacy_parse(content) for _ in range(OUTPUTS)], args.repeat)
+        single = timed(lambda: parse_script(content), args.repeat)
+        print(f"{facts:>6} {len(content.encode()) / 1024:>8.1f} {legacy * 1000:>14.3f} "
+              f"{single * 1000:>10.3f} {legacy / single:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
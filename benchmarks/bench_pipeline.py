@@ -0,0 +1,382 @@
+"""End-to-end pipeline benchmark against local inference and SMTP stand-ins.
+
+Starts a fake inference server and an SMTP sink, points the agent at them and
+runs jobs through ``process_topic`` (cli), ``process_topic_web`` (web) or the
+Flask endpoints over HTTP (http) at each concurrency level. Reports jobs/min,
+p50/p95/p99 per stage and peak RSS; ``--json`` saves the numbers and
+``--compare`` fails the run when they regress against a saved baseline.
+
+    python benchmarks/bench_pipeline.py --modes cli web http --concurrency 1 4 8 \
+        --jobs 16 --latency 0.2 --loading-rate 0.05 --rate-limit-rate 0.05
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from fakes import FakeInferenceServer, SMTPSink  # noqa: E402
+
+MODES = ('cli', 'web', 'http')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of unsorted samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+def rss_bytes() -> int:
+    """Current resident set size, or the peak where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class PeakRSS:
+    """Samples RSS in the background while the block runs"""
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _sample(self):
+        while True:
+            self.peak = max(self.peak, rss_bytes())
+            if self._stop.wait(self.interval):
+                return
+
+    def __enter__(self) -> 'PeakRSS':
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class StageTimer:
+    """Times pipeline stages by wrapping the agent methods that run them"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self._lock = threading.Lock()
+        self._patched = []
+        self._pending = []
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self.samples[stage].append(seconds)
+
+    def wrap(self, owner, name: str, stage: str):
+        original = owner.__dict__[name]
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = original(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+            # Email delivery finishes later, on the mailer thread
+            if isinstance(result, Future):
+                with self._lock:
+                    self._pending.append(result)
+                result.add_done_callback(
+                    lambda _: self.record(f'{stage}_delivery', time.perf_counter() - started))
+            return result
+
+        setattr(owner, name, timed)
+        self._patched.append((owner, name, original))
+
+    def wait_pending(self, timeout: float = 60.0):
+        """Wait for work the stages handed off, such as queued emails"""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        wait(pending, timeout=timeout)
+
+    def restore(self):
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+        self._patched.clear()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                stage: dict({'count': len(samples)},
+                            **{f'p{pct}_ms': round(percentile(samples, pct) * 1000, 1) for pct in PERCENTILES})
+                for stage, samples in sorted(self.samples.items())
+            }
+
+
+def configure_environment(inference: FakeInferenceServer, sink: SMTPSink, workers: int) -> Dict[str, str]:
+    """Return the variables that point the agent at the stand-ins"""
+    return {
+        'HF_API_BASE': inference.base_url,
+        'HUGGING_FACE_TOKEN': 'bench-token',
+        'SMTP_SERVER': sink.host,
+        'SMTP_PORT': str(sink.port),
+        'SMTP_STARTTLS': 'false',
+        'SENDER_EMAIL': 'bench@example.com',
+        'SENDER_APP_PASSWORD': 'bench',
+        'RECIPIENT_EMAILS': 'inbox@example.com',
+        # Every job should do the full work
+        'IMAGE_CACHE_ENABLED': '0',
+        'SCRIPT_CACHE_ENABLED': '0',
+        'GENERATION_WORKERS': os.getenv('GENERATION_WORKERS', str(workers)),
+        'GENERATION_QUEUE_SIZE': os.getenv('GENERATION_QUEUE_SIZE', str(4 * workers)),
+    }
+
+
+def cli_job(topic: str, timer: StageTimer) -> bool:
+    from ai_agent import AIContentAgent
+    return AIContentAgent().process_topic(topic)['success']
+
+
+def web_job(topic: str, timer: StageTimer) -> bool:
+    from app import WebAIAgent
+    from job_store import get_job_store
+    store = get_job_store()
+    session_id = store.new_id()
+    store.create(session_id, topic=topic)
+    try:
+        return WebAIAgent(session_id).process_topic_web(topic)['success']
+    finally:
+        store.delete(session_id)
+
+
+def make_http_job(base_url: str, poll_interval: float = 0.05) -> Callable[[str, StageTimer], bool]:
+    """Return a job that goes through /generate, /result and /download like a browser would"""
+    import requests
+    local = threading.local()
+
+    def http_job(topic: str, timer: StageTimer) -> bool:
+        session = getattr(local, 'session', None)
+        if session is None:
+            session = local.session = requests.Session()
+
+        started = time.perf_counter()
+        while True:
+            response = session.post(f'{base_url}/generate', json={'topic': topic})
+            if response.status_code != 429:
+                break
+            time.sleep(float(response.headers.get('Retry-After', '1')))
+        response.raise_for_status()
+        session_id = response.json()['session_id']
+        timer.record('submit', time.perf_counter() - started)
+
+        waited = time.perf_counter()
+        while True:
+            response = session.get(f'{base_url}/result/{session_id}')
+            if response.status_code != 404:
+                break
+            time.sleep(poll_interval)
+        timer.record('result_wait', time.perf_counter() - waited)
+        if not response.ok:
+            return False
+
+        downloaded = time.perf_counter()
+        with session.get(f'{base_url}/download/{session_id}', stream=True) as archive:
+            size = sum(len(chunk) for chunk in archive.iter_content(64 * 1024))
+        timer.record('download', time.perf_counter() - downloaded)
+        return archive.ok and size > 0
+
+    return http_job
+
+
+@contextlib.contextmanager
+def http_server():
+    """Serve the Flask app on a free local port"""
+    from werkzeug.serving import make_server
+    from app import app
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_port}'
+    finally:
+        server.shutdown()
+
+
+def run_level(job: Callable[[str, StageTimer], bool], mode: str, concurrency: int, jobs: int,
+              verbose: bool = False) -> Dict:
+    """Run ``jobs`` jobs, ``concurrency`` at a time, and return throughput and stage latencies"""
+    from ai_agent import AIContentAgent
+    from app import WebAIAgent
+    from model_router import get_model_router
+
+    # Cooldowns from the previous level would skew this one
+    get_model_router().reset()
+    timer = StageTimer()
+    timer.wrap(AIContentAgent, 'get_script', 'script')
+    timer.wrap(AIContentAgent, 'generate_images', 'images')
+    timer.wrap(AIContentAgent, 'generate_image', 'image_call')
+    timer.wrap(AIContentAgent, 'send_email', 'email')
+    timer.wrap(WebAIAgent, '_store_result', 'save')
+
+    def one(index: int) -> bool:
+        started = time.perf_counter()
+        try:
+            return job(f'{mode} topic {concurrency}-{index}', timer)
+        except Exception as e:
+            print(f"❌ Job {index} failed: {e}")
+            return False
+        finally:
+            timer.record('job', time.perf_counter() - started)
+
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    try:
+        with PeakRSS() as rss, output:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                outcomes = list(executor.map(one, range(jobs)))
+            elapsed = time.perf_counter() - started
+            timer.wait_pending()
+    finally:
+        timer.restore()
+
+    succeeded = sum(outcomes)
+    return {
+        'mode': mode,
+        'concurrency': concurrency,
+        'jobs': jobs,
+        'succeeded': succeeded,
+        'elapsed_seconds': round(elapsed, 3),
+        'jobs_per_minute': round(succeeded / elapsed * 60, 2) if elapsed else 0.0,
+        'peak_rss_mb': round(rss.peak / (1024 * 1024), 1),
+        'stages': timer.summary(),
+    }
+
+
+def run_benchmark(modes: List[str], levels: List[int], jobs: int, inference: FakeInferenceServer,
+                  verbose: bool = False) -> List[Dict]:
+    """Run every mode at every concurrency level against running stand-ins"""
+    from mailer import get_mailer
+    results = []
+    with SMTPSink() as sink:
+        env = configure_environment(inference, sink, max(levels))
+        saved = {key: os.environ.get(key) for key in env}
+        os.environ.update(env)
+        work_dir = tempfile.mkdtemp(prefix='bench-')
+        cwd = os.getcwd()
+        os.chdir(work_dir)
+        try:
+            for mode in modes:
+                with (http_server() if mode == 'http' else contextlib.nullcontext()) as base_url:
+                    job = make_http_job(base_url) if mode == 'http' else {'cli': cli_job, 'web': web_job}[mode]
+                    for concurrency in levels:
+                        results.append(run_level(job, mode, concurrency, jobs, verbose))
+            mailer = get_mailer(sink.host, sink.port, env['SENDER_EMAIL'], env['SENDER_APP_PASSWORD'])
+            mailer.flush(timeout=30)
+            mailer.close()
+        finally:
+            os.chdir(cwd)
+            shutil.rmtree(work_dir, ignore_errors=True)
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+    return results
+
+
+def print_report(results: List[Dict]):
+    for result in results:
+        print(f"\n▶ {result['mode']} x{result['concurrency']}: {result['succeeded']}/{result['jobs']} ok "
+              f"in {result['elapsed_seconds']:.2f}s, {result['jobs_per_minute']:.1f} jobs/min, "
+              f"peak RSS {result['peak_rss_mb']:.1f} MB")
+        print(f"   {'stage':<16} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for stage, stats in result['stages'].items():
+            print(f"   {stage:<16} {stats['count']:>6} {stats['p50_ms']:>9.1f} "
+                  f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f}")
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float) -> List[str]:
+    """Return a line for every throughput drop or p95 rise beyond ``tolerance``"""
+    previous = {(entry['mode'], entry['concurrency']): entry for entry in baseline}
+    regressions = []
+    for result in results:
+        base = previous.get((result['mode'], result['concurrency']))
+        if base is None:
+            continue
+        label = f"{result['mode']} x{result['concurrency']}"
+        if result['jobs_per_minute'] < base['jobs_per_minute'] * (1 - tolerance):
+            regressions.append(f"{label}: {result['jobs_per_minute']} jobs/min, was {base['jobs_per_minute']}")
+        for stage, stats in result['stages'].items():
+            before = base['stages'].get(stage)
+            if before and stats['p95_ms'] > before['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{label} {stage}: p95 {stats['p95_ms']} ms, was {before['p95_ms']} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--jobs', type=int, default=8, help="jobs per concurrency level")
+    parser.add_argument('--latency', type=float, default=0.1, help="seconds every fake API call takes")
+    parser.add_argument('--jitter', type=float, default=0.05, help="extra random latency, up to this many seconds")
+    parser.add_argument('--loading-rate', type=float, default=0.0, help="share of calls answered 503 + estimated_time")
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help="share of calls answered 429")
+    parser.add_argument('--small-rate', type=float, default=0.0, help="share of image calls answered with a tiny image")
+    parser.add_argument('--estimated-time', type=float, default=1.0)
+    parser.add_argument('--prompts', type=int, default=3, help="image prompts per generated script")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', metavar='PATH', help="save the results here")
+    parser.add_argument('--compare', metavar='PATH', help="baseline results to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument('--verbose', action='store_true', help="show the pipeline's own output")
+    args = parser.parse_args()
+
+    inference = FakeInferenceServer(
+        latency=args.latency, jitter=args.jitter, loading_rate=args.loading_rate,
+        rate_limit_rate=args.rate_limit_rate, small_rate=args.small_rate,
+        estimated_time=args.estimated_time, prompts_per_script=args.prompts, seed=args.seed,
+    )
+    with inference:
+        results = run_benchmark(args.modes, args.concurrency, args.jobs, inference, args.verbose)
+    print_report(results)
+    print(f"\nFake API responses: {inference.responses}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\n❌ Regressions:")
+            for line in regressions:
+                print(f"   {line}")
+            sys.exit(1)
+        print("\n✅ No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
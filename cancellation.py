@@ -0,0 +1,93 @@
+"""Cooperative cancellation of running jobs"""
+import asyncio
+import threading
+import time
+from typing import Callable, List, Optional
+
+
+class JobCancelled(Exception):
+    """Raised at a job's next checkpoint once it has been cancelled"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class CancelToken:
+    """Tells a running job to stop; the job checks it between steps.
+
+    ``check`` is consulted too, so a flag kept elsewhere (the job store,
+    which also notices jobs nobody polls any more) can cancel the job.
+    Callbacks registered with :meth:`on_cancel` run once when the token is
+    cancelled and abort work that cannot check the token itself, such as a
+    download in progress.
+    """
+
+    def __init__(self, check: Optional[Callable[[], Optional[str]]] = None, poll_interval: float = 0.5):
+        self.poll_interval = poll_interval
+        self.reason: Optional[str] = None
+        self._check = check
+        self._event = threading.Event()
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def cancel(self, reason: str = 'Cancelled') -> bool:
+        """Cancel the job; False if it was already cancelled"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"⚠️  Cancel callback failed: {e}")
+        return True
+
+    @property
+    def cancelled(self) -> bool:
+        if not self._event.is_set() and self._check is not None:
+            reason = self._check()
+            if reason:
+                self.cancel(reason)
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self.cancelled:
+            raise JobCancelled(self.reason)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run ``callback`` on cancellation (at once if already cancelled); returns an unregister function"""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return lambda: self._remove(callback)
+        callback()
+        return lambda: None
+
+    def _remove(self, callback: Callable[[], None]):
+        with self._lock:
+            if callback in self._callbacks:
+                self._callbacks.remove(callback)
+
+    def wait(self, timeout: float) -> bool:
+        """Sleep up to ``timeout`` seconds, waking early on cancellation; True if cancelled"""
+        end = time.monotonic() + timeout
+        while not self.cancelled:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._event.wait(min(remaining, self.poll_interval))
+        return True
+
+    async def wait_async(self, timeout: float) -> bool:
+        """Coroutine version of :meth:`wait`"""
+        end = time.monotonic() + timeout
+        while not self.cancelled:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(remaining, self.poll_interval))
+        return True
@@ -0,0 +1,122 @@
+"""Single-pass parser turning a generated script into a structured document"""
+import re
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple, Union
+
+# Everything the parser looks for, compiled once
+_PROMPT_RE = re.compile(r'\[IMAGE_PROMPT:\s*(.*?)\]', re.IGNORECASE)
+# Plain substring checks; a regex alternation is far slower on every line
+_SECTION_MARKERS = (
+    ('title', ('🎬', 'YOUTUBE SHORTS TITLE')),
+    ('description', ('📄', 'VIDEO DESCRIPTION')),
+    ('hashtags', ('🏷️', 'META TAGS', 'HASHTAGS')),
+)
+_PART_RE = re.compile(
+    r'^\W*(?:(?P<hook>HOOK)|(?P<fact>FACT\s*\d+)|(?P<outro>OUTRO)|(?P<prompts>AI IMAGE GENERATION PROMPTS))\b'
+    r'(?:\s*\([^)]*\))?[\s*:]*',
+    re.IGNORECASE,
+)
+_HASHTAG_RE = re.compile(r'#\w+')
+
+
+@dataclass(frozen=True)
+class ScriptDocument:
+    """A generated script split into the parts every output needs"""
+    script: str = ''
+    hook: str = ''
+    facts: Tuple[str, ...] = ()
+    outro: str = ''
+    image_prompts: Tuple[str, ...] = ()
+    title: str = ''
+    description: str = ''
+    hashtags_text: str = ''
+    hashtags: Tuple[str, ...] = ()
+
+    def to_dict(self) -> Dict:
+        """Return a JSON-serializable copy"""
+        data = asdict(self)
+        for key in ('facts', 'image_prompts', 'hashtags'):
+            data[key] = list(data[key])
+        return data
+
+
+def _section_marker(line: str) -> Optional[str]:
+    for section, markers in _SECTION_MARKERS:
+        for marker in markers:
+            if marker in line:
+                return section
+    return None
+
+
+def _joined(lines: List[str]) -> str:
+    return '\n'.join(lines).strip()
+
+
+def parse_script(content: str) -> ScriptDocument:
+    """Parse a script in one pass over its lines.
+
+    ``script`` keeps the layout of everything before the title section,
+    minus blank lines and image prompts, for display. Hook, facts and outro
+    come from the ``**HOOK**``/``**FACT n**``/``**OUTRO**`` headings inside
+    it; title, description and hashtags from the emoji-marked sections
+    after it. Image prompts are collected wherever they appear.
+    """
+    sections = {'script': [], 'title': [], 'description': [], 'hashtags': []}
+    parts = {'hook': [], 'outro': []}
+    facts: List[List[str]] = []
+    prompts: List[str] = []
+    section = 'script'
+    part = None
+
+    for line in content.split('\n'):
+        marker = _section_marker(line)
+        if marker:
+            section = marker
+            continue
+        if not line.strip():
+            continue
+        if '[' in line:
+            found = _PROMPT_RE.findall(line)
+            if found:
+                prompts.extend(found)
+                if section == 'script':
+                    line = _PROMPT_RE.sub('', line)
+        text = line.strip()
+        if section != 'script':
+            sections[section].append(text)
+            continue
+        sections['script'].append(line)
+
+        heading = _PART_RE.match(text)
+        if heading:
+            part = heading.lastgroup
+            if part == 'fact':
+                facts.append([])
+            # A heading may carry text after its colon
+            text = text[heading.end():]
+        if not text:
+            continue
+        if part == 'fact':
+            facts[-1].append(text)
+        elif part in parts:
+            parts[part].append(text)
+
+    hashtags_text = _joined(sections['hashtags'])
+    return ScriptDocument(
+        script=_joined(sections['script']),
+        hook=_joined(parts['hook']).strip('"'),
+        facts=tuple(_joined(fact) for fact in facts),
+        outro=_joined(parts['outro']).strip('"'),
+        image_prompts=tuple(prompts),
+        title=_joined(sections['title']).strip('"'),
+        description=_joined(sections['description']),
+        hashtags_text=hashtags_text,
+        hashtags=tuple(_HASHTAG_RE.findall(hashtags_text)),
+    )
+
+
+def as_document(content: Union[str, ScriptDocument]) -> ScriptDocument:
+    """Return ``content`` itself if it is already parsed, else parse it"""
+    if isinstance(content, ScriptDocument):
+        return content
+    return parse_script(content)
@@ -0,0 +1,7 @@
+"""Gunicorn hooks, picked up automatically from the working directory"""
+
+
+def on_starting(server):
+    """Load .env once in the master, before any worker imports the app"""
+    from ai_agent import load_environment
+    load_environment(verbose=False)
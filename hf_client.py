@@ -0,0 +1,321 @@
+"""Shared HTTP plumbing for Hugging Face inference calls"""
+import asyncio
+import hashlib
+import os
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from metrics import span
+
+# One pooled session per process, created on first use
+_session = None
+_adapter = None
+_session_lock = threading.Lock()
+
+
+# Where each thread notes the connection its current request runs on, see abort_on_cancel()
+_in_flight = threading.local()
+
+
+def _tracking_pool(pool_class):
+    class TrackingPool(pool_class):
+        def _get_conn(self, timeout=None):
+            conn = super()._get_conn(timeout)
+            holder = getattr(_in_flight, 'holder', None)
+            if holder is not None:
+                with holder['lock']:
+                    holder['conn'] = conn
+            return conn
+
+        def _put_conn(self, conn):
+            # Once back in the pool the connection may serve another thread's request
+            holder = getattr(_in_flight, 'holder', None)
+            if holder is not None:
+                with holder['lock']:
+                    if holder['conn'] is conn:
+                        holder['conn'] = None
+            super()._put_conn(conn)
+    TrackingPool.__name__ = f"Tracking{pool_class.__name__}"
+    return TrackingPool
+
+
+_TRACKING_POOLS = {'http': _tracking_pool(HTTPConnectionPool), 'https': _tracking_pool(HTTPSConnectionPool)}
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTP adapter with TCP keep-alive enabled and connection reuse counters"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs['socket_options'] = HTTPConnection.default_socket_options + [
+            (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1),
+        ]
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = dict(_TRACKING_POOLS)
+
+    def connection_stats(self) -> Dict[str, int]:
+        """Sum request and new-connection counters over every host pool"""
+        requests_sent = 0
+        connections_opened = 0
+        pools = self.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            requests_sent += pool.num_requests
+            connections_opened += pool.num_connections
+        return {
+            'requests': requests_sent,
+            'new_connections': connections_opened,
+            'reused_connections': max(0, requests_sent - connections_opened),
+        }
+
+
+def get_http_session() -> requests.Session:
+    """Return the process-wide pooled session used for every inference call"""
+    global _session, _adapter
+    if _session is not None:
+        return _session
+    with _session_lock:
+        if _session is None:
+            pool_size = max(1, int(os.getenv('HF_POOL_SIZE', '16')))
+            adapter = PooledHTTPAdapter(
+                pool_connections=max(1, int(os.getenv('HF_POOL_HOSTS', '4'))),
+                pool_maxsize=pool_size,
+                max_retries=0,
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            session.headers['Connection'] = 'keep-alive'
+            _adapter = adapter
+            _session = session
+    return _session
+
+
+@contextmanager
+def abort_on_cancel(cancel_token) -> Iterator[None]:
+    """Let ``cancel_token`` abort this thread's requests on the shared session.
+
+    Cancelling shuts down the socket of the request in progress, so a
+    thread waiting for the response or reading the body fails at once
+    instead of after the request timeout.
+    """
+    holder = {'conn': None, 'lock': threading.Lock()}
+
+    def abort():
+        with holder['lock']:
+            sock = getattr(holder['conn'], 'sock', None)
+            if sock is not None:
+                try:
+                    sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    _in_flight.holder = holder
+    unregister = cancel_token.on_cancel(abort)
+    try:
+        yield
+    finally:
+        unregister()
+        _in_flight.holder = None
+
+
+def get_connection_stats() -> Dict[str, float]:
+    """Return connection reuse counters for the shared session"""
+    if _adapter is None:
+        stats = {'requests': 0, 'new_connections': 0, 'reused_connections': 0}
+    else:
+        stats = _adapter.connection_stats()
+    total = stats['requests']
+    stats['reuse_ratio'] = round(stats['reused_connections'] / total, 3) if total else 0.0
+    return stats
+
+
+def reset_http_session():
+    """Close the shared session so the next call builds a fresh pool"""
+    global _session, _adapter
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+        _session = None
+        _adapter = None
+
+
+def get_hf_api_base() -> str:
+    """Return the inference API root, overridable with HF_API_BASE (e.g. a local fake)"""
+    return os.getenv('HF_API_BASE', 'https://api-inference.huggingface.co').rstrip('/')
+
+
+@lru_cache(maxsize=32)
+def get_hf_headers(token: str) -> Dict[str, str]:
+    """Return the authorization headers for a token (shared, treat as read-only)"""
+    return {"Authorization": f"Bearer {token}"}
+
+
+class TokenBucket:
+    """Adaptive token bucket pacing the calls one token makes to one model.
+
+    Tokens refill at ``rate`` per second up to ``burst``. A 429 halves the
+    rate (down to ``min_rate``) and, with a Retry-After, holds every call
+    until it has passed; each success then wins back a slice of the
+    configured rate. Callers reserve a token and sleep for the returned
+    wait, so concurrent jobs are spread out instead of bursting together.
+    """
+
+    def __init__(self, rate: float, burst: float, min_rate: float = 0.05,
+                 backoff: float = 0.5, recovery: float = 0.1):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.min_rate = min(min_rate, rate)
+        self.backoff = backoff
+        self.recovery = recovery
+        self.tokens = self.burst
+        self.blocked_until = 0.0
+        self.rate_limited = 0
+        self.waits = 0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """Take a token and return how long to wait before using it; None if that is over ``max_wait``.
+
+        A ``max_wait`` of zero or less leaves no time to use a token, so it
+        is refused without taking one.
+        """
+        if max_wait is not None and max_wait <= 0:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            # Tokens may go negative: each waiting caller holds a place in line
+            wait = max(self.blocked_until - now, (1 - self.tokens) / self.rate, 0.0)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= 1
+            if wait > 0:
+                self.waits += 1
+            return wait
+
+    def record_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.recovery * self.max_rate)
+
+    def record_rate_limited(self, retry_after: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate_limited += 1
+            self.rate = max(self.min_rate, self.rate * self.backoff)
+            self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self.blocked_until = max(self.blocked_until, now + retry_after)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'rate': round(self.rate, 3),
+                'max_rate': self.max_rate,
+                'tokens': round(self.tokens, 2),
+                'waits': self.waits,
+                'rate_limited': self.rate_limited,
+            }
+
+
+# One bucket per token and model, created on first use
+_buckets: Dict[Tuple[str, str], TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_token_bucket(token: Optional[str], model: str) -> Optional[TokenBucket]:
+    """Return the process-wide bucket for a token and model, or None when HF_RATE_LIMIT is 0"""
+    rate = float(os.getenv('HF_RATE_LIMIT', '5'))
+    if rate <= 0:
+        return None
+    key = (token or '', model)
+    with _buckets_lock:
+        bucket = _buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(
+                rate,
+                burst=float(os.getenv('HF_RATE_BURST', '10')),
+                min_rate=float(os.getenv('HF_RATE_MIN', '0.05')),
+            )
+            _buckets[key] = bucket
+        return bucket
+
+
+def _max_wait() -> float:
+    return float(os.getenv('HF_RATE_MAX_WAIT', '30'))
+
+
+def acquire_hf_slot(token: Optional[str], model: str, max_wait: Optional[float] = None) -> bool:
+    """Wait for the token's turn to call a model; False if that would take over ``max_wait`` seconds.
+
+    The wait is never longer than HF_RATE_MAX_WAIT, whatever ``max_wait`` says.
+    """
+    bucket = get_token_bucket(token, model)
+    if bucket is None:
+        return True
+    wait = bucket.reserve(_max_wait() if max_wait is None else min(max_wait, _max_wait()))
+    if wait is None:
+        return False
+    if wait > 0:
+        with span('rate_limit_wait'):
+            time.sleep(wait)
+    return True
+
+
+async def acquire_hf_slot_async(token: Optional[str], model: str, max_wait: Optional[float] = None) -> bool:
+    """Asyncio variant of :func:`acquire_hf_slot`"""
+    bucket = get_token_bucket(token, model)
+    if bucket is None:
+        return True
+    wait = bucket.reserve(_max_wait() if max_wait is None else min(max_wait, _max_wait()))
+    if wait is None:
+        return False
+    if wait > 0:
+        with span('rate_limit_wait'):
+            await asyncio.sleep(wait)
+    return True
+
+
+def record_hf_response(token: Optional[str], model: str, status_code: Optional[int],
+                       retry_after: Optional[float] = None):
+    """Feed a call's outcome back into its bucket: 429s slow it down, successes speed it up"""
+    bucket = get_token_bucket(token, model)
+    if bucket is None:
+        return
+    if status_code == 429:
+        bucket.record_rate_limited(retry_after)
+    elif status_code == 200:
+        bucket.record_success()
+
+
+def rate_limit_stats() -> Dict[str, Dict[str, float]]:
+    """Return every bucket's state, keyed by model and a short token fingerprint"""
+    with _buckets_lock:
+        buckets = list(_buckets.items())
+    return {
+        f"{model.split('/')[-1]}@{hashlib.sha256(token.encode()).hexdigest()[:8]}": bucket.stats()
+        for (token, model), bucket in buckets
+    }
+
+
+def reset_rate_limits():
+    """Forget every bucket"""
+    with _buckets_lock:
+        _buckets.clear()
@@ -0,0 +1,185 @@
+"""Content-addressed on-disk cache for generated images"""
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+import threading
+from typing import Dict, List, Optional
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Normalize a prompt so case and whitespace variants share a cache entry"""
+    return re.sub(r'\s+', ' ', prompt).strip().casefold()
+
+
+def atomic_copy(source: str, destination: str):
+    """Copy a file so readers of the destination never see a partial write"""
+    with open(source, 'rb') as src:
+        directory = os.path.dirname(os.path.abspath(destination))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                shutil.copyfileobj(src, tmp_file, 1024 * 1024)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class ImageCache:
+    """Image store addressed by a hash of the normalized prompt and the model.
+
+    Entries live under ``<root>/<hh>/<hash>.img``. The file mtime is the LRU
+    clock: hits touch it, and when the byte quota is exceeded the oldest entries
+    are removed until usage drops below the low-water mark. The directory is
+    the only index, so several worker processes can share one cache.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 256 * 1024 * 1024, low_water: float = 0.9):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._usage = None
+        self._entries = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt: str, model: str) -> str:
+        digest = hashlib.sha256(f"{model}\n{normalize_prompt(prompt)}".encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.img")
+
+    def _iter_entries(self):
+        if not os.path.isdir(self.root):
+            return
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith('.img'):
+                    yield entry
+
+    def _ensure_usage(self):
+        if self._usage is None:
+            usage = 0
+            entries = 0
+            for entry in self._iter_entries():
+                try:
+                    usage += entry.stat().st_size
+                    entries += 1
+                except FileNotFoundError:
+                    pass
+            self._usage = usage
+            self._entries = entries
+
+    def fetch(self, prompt: str, models: List[str], destination: str) -> Optional[str]:
+        """Copy a cached image for any of the models to destination; return that model"""
+        for model in models:
+            path = self._path(self.make_key(prompt, model))
+            try:
+                atomic_copy(path, destination)
+            except FileNotFoundError:
+                continue
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            with self._lock:
+                self.hits += 1
+            return model
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, prompt: str, model: str, source: str):
+        """Add a freshly generated image to the cache"""
+        path = self._path(self.make_key(prompt, model))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(source)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            # Scan before writing so the new entry is not counted twice
+            self._ensure_usage()
+        existed = os.path.exists(path)
+        atomic_copy(source, path)
+
+        with self._lock:
+            self.stores += 1
+            if not existed:
+                self._usage += size
+                self._entries += 1
+            if self._usage > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until under the low-water mark"""
+        entries = []
+        usage = 0
+        for entry in self._iter_entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            usage += stat.st_size
+
+        target = self.max_bytes * self.low_water
+        entries.sort()
+        remaining = len(entries)
+        for _, size, path in entries:
+            if usage <= target:
+                break
+            try:
+                os.remove(path)
+                self.evictions += 1
+            except FileNotFoundError:
+                pass
+            usage -= size
+            remaining -= 1
+        self._usage = usage
+        self._entries = remaining
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and disk usage"""
+        with self._lock:
+            self._ensure_usage()
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'stores': self.stores,
+                'evictions': self.evictions,
+                'entries': self._entries,
+                'bytes': self._usage,
+                'max_bytes': self.max_bytes,
+            }
+
+
+# Shared by every agent in the process, created on first use
+_image_cache = None
+_image_cache_lock = threading.Lock()
+
+
+def get_image_cache() -> Optional[ImageCache]:
+    """Return the process-wide image cache, or None when caching is disabled"""
+    global _image_cache
+    if os.getenv('IMAGE_CACHE_ENABLED', '1').lower() in ('0', 'false', 'no'):
+        return None
+    with _image_cache_lock:
+        if _image_cache is None:
+            _image_cache = ImageCache(
+                os.getenv('IMAGE_CACHE_DIR', os.path.join('static', 'generated', 'cache')),
+                max_bytes=int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(256 * 1024 * 1024))),
+            )
+        return _image_cache
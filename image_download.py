@@ -0,0 +1,100 @@
+"""Streamed, validated image downloads published with an atomic rename"""
+import os
+import tempfile
+from typing import Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+# Signature bytes of the formats the inference API returns
+_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'\xff\xd8\xff', 'JPEG'),
+)
+
+
+class ImageTooLargeError(Exception):
+    """Raised when a download grows past the configured size limit"""
+
+
+def sniff_image_format(header: bytes) -> Optional[str]:
+    """Return 'PNG', 'JPEG' or 'WEBP' from a file's first bytes, or None"""
+    for signature, image_format in _SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    if len(header) >= 12 and header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def validate_image(path: str, min_dimension: int = 64) -> Optional[Tuple[str, int, int]]:
+    """Return ``(format, width, height)`` if the file is a complete image, else None"""
+    # Pillow is only loaded once the first image arrives
+    from PIL import Image
+    try:
+        with open(path, 'rb') as f:
+            image_format = sniff_image_format(f.read(16))
+        if image_format is None:
+            return None
+        with Image.open(path) as image:
+            if image.format != image_format:
+                return None
+            width, height = image.size
+            # Walks the file's structure, so truncated downloads are caught
+            image.verify()
+    except Exception:
+        return None
+    if min(width, height) < min_dimension:
+        return None
+    return image_format, width, height
+
+
+class AtomicImageWriter:
+    """Collects a download in a temp file beside its destination.
+
+    The destination only appears, through ``os.replace``, once the whole
+    file has been written and validated, so readers never see a partial or
+    corrupt image. Use it as a context manager: anything not committed is
+    discarded on exit.
+    """
+
+    def __init__(self, dest: str, max_bytes: int = 20 * 1024 * 1024, min_dimension: int = 64):
+        self.dest = dest
+        self.max_bytes = max_bytes
+        self.min_dimension = min_dimension
+        self.size = 0
+        directory = os.path.dirname(os.path.abspath(dest))
+        fd, self._tmp_path = tempfile.mkstemp(dir=directory, prefix='.download-', suffix='.tmp')
+        self._file = os.fdopen(fd, 'wb')
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise ImageTooLargeError(f"Image exceeds {self.max_bytes} bytes")
+        self._file.write(chunk)
+
+    def commit(self) -> Optional[Tuple[str, int, int]]:
+        """Validate the download and move it into place; None if it is not a valid image"""
+        self._file.close()
+        info = validate_image(self._tmp_path, self.min_dimension)
+        if info is None:
+            self.discard()
+            return None
+        os.replace(self._tmp_path, self.dest)
+        self._tmp_path = None
+        return info
+
+    def discard(self):
+        """Drop the temp file"""
+        self._file.close()
+        if self._tmp_path is not None:
+            try:
+                os.remove(self._tmp_path)
+            except OSError:
+                pass
+            self._tmp_path = None
+
+    def __enter__(self) -> 'AtomicImageWriter':
+        return self
+
+    def __exit__(self, *exc):
+        self.discard()
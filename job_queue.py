@@ -0,0 +1,148 @@
+"""Bounded job queue with a fixed number of concurrently running jobs"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the waiting queue is full"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobQueue:
+    """Runs at most ``workers`` jobs at once and keeps up to ``max_queued`` waiting.
+
+    A job is a callable that starts the work and returns a
+    ``concurrent.futures.Future``; the queue starts the next waiting job when
+    that future completes. Blocking jobs can use :meth:`submit_call`, which
+    runs them on the queue's own thread pool, while coroutine jobs can be
+    started on an event loop and still share the same slots.
+    """
+
+    def __init__(self, workers: int = 4, max_queued: int = 32):
+        self.workers = max(1, workers)
+        self.max_queued = max(0, max_queued)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='job-worker')
+        self._pending: "OrderedDict[str, Callable[[], Future]]" = OrderedDict()
+        self._active: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._avg_duration = None
+        self.completed = 0
+        self.rejected = 0
+
+    def submit(self, job_id: str, start: Callable[[], Future], block: bool = False,
+               timeout: Optional[float] = None) -> int:
+        """Queue a job; return 0 if it started right away, else its queue position.
+
+        When the queue is full this raises :class:`QueueFullError`, or with
+        ``block=True`` waits up to ``timeout`` seconds for room instead.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._lock:
+            while True:
+                if len(self._active) < self.workers:
+                    self._active[job_id] = time.monotonic()
+                    position = 0
+                    break
+                if len(self._pending) < self.max_queued:
+                    self._pending[job_id] = start
+                    return len(self._pending)
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if not block or (remaining is not None and remaining <= 0):
+                    self.rejected += 1
+                    raise QueueFullError(self._retry_after_locked())
+                self._slot_freed.wait(remaining)
+        self._launch(job_id, start)
+        return position
+
+    def submit_call(self, job_id: str, fn: Callable, *args, **kwargs) -> int:
+        """Queue a blocking callable to run on the queue's worker threads"""
+        return self.submit(job_id, lambda: self.run_call(fn, *args, **kwargs))
+
+    def run_call(self, fn: Callable, *args, **kwargs) -> Future:
+        """Run a blocking callable on the queue's worker threads"""
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def _launch(self, job_id: str, start: Callable[[], Future]):
+        try:
+            future = start()
+        except Exception as e:
+            print(f"❌ Could not start job {job_id}: {e}")
+            self._finish(job_id)
+            return
+        future.add_done_callback(lambda _: self._finish(job_id))
+
+    def _finish(self, job_id: str):
+        with self._lock:
+            started = self._active.pop(job_id, None)
+            if started is not None:
+                duration = time.monotonic() - started
+                self._avg_duration = duration if self._avg_duration is None else (
+                    0.8 * self._avg_duration + 0.2 * duration)
+                self.completed += 1
+            next_job = None
+            if self._pending and len(self._active) < self.workers:
+                next_id, next_start = self._pending.popitem(last=False)
+                self._active[next_id] = time.monotonic()
+                next_job = (next_id, next_start)
+            self._slot_freed.notify_all()
+        if next_job is not None:
+            self._launch(*next_job)
+
+    def position(self, job_id: str) -> Optional[int]:
+        """Return 0 for a running job, 1.. for a waiting job, None if unknown"""
+        with self._lock:
+            if job_id in self._active:
+                return 0
+            for index, pending_id in enumerate(self._pending, 1):
+                if pending_id == job_id:
+                    return index
+        return None
+
+    def _retry_after_locked(self) -> int:
+        average = self._avg_duration if self._avg_duration is not None else 30.0
+        estimate = average * (len(self._pending) + 1) / self.workers
+        return int(min(300, max(1, math.ceil(estimate))))
+
+    def retry_after(self) -> int:
+        """Estimate in seconds until a queue slot frees up"""
+        with self._lock:
+            return self._retry_after_locked()
+
+    def stats(self) -> Dict[str, float]:
+        """Return queue depth and worker usage"""
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'active': len(self._active),
+                'queued': len(self._pending),
+                'max_queued': self.max_queued,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'avg_job_seconds': round(self._avg_duration, 2) if self._avg_duration is not None else None,
+            }
+
+
+# Shared by every request handled by this process, created on first use
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """Return the process-wide job queue"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(
+                workers=int(os.getenv('GENERATION_WORKERS', '4')),
+                max_queued=int(os.getenv('GENERATION_QUEUE_SIZE', '32')),
+            )
+        return _job_queue
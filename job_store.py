@@ -0,0 +1,579 @@
+"""Bounded, thread-safe store for job progress and results"""
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Union
+
+from cancellation import CancelToken
+
+
+def _deep_sizeof(obj, seen=None) -> int:
+    """Approximate the memory held by nested dicts, lists and strings"""
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_deep_sizeof(k, seen) + _deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        size += sum(_deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+class JobStore:
+    """Keeps each job's latest status and final result.
+
+    Entries expire ``ttl`` seconds after their last update and the store never
+    holds more than ``max_entries`` jobs; when full, finished jobs are evicted
+    before running ones, oldest first. Results hold file paths and metadata,
+    not the script text, which already lives in the job's content file.
+
+    Every change bumps a store-wide version number, so readers can block in
+    :meth:`wait_for_change` instead of polling.
+
+    Running jobs can be cancelled, explicitly or, once a client has been
+    seen polling a job, automatically when it stops polling for
+    ``abandon_after`` seconds; jobs learn about it through their
+    :meth:`cancel_token`.
+    """
+
+    def __init__(self, ttl: float = 6 * 3600, max_entries: int = 1000, abandon_after: Optional[float] = 120):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.abandon_after = abandon_after or None
+        self.evictions = 0
+        self.cancellations = 0
+        self._jobs: "OrderedDict[str, Dict]" = OrderedDict()
+        self._tokens: Dict[str, CancelToken] = {}
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._version = 0
+
+    @staticmethod
+    def new_id() -> str:
+        """Return a session ID that cannot collide with another submission"""
+        return f"gen_{uuid.uuid4().hex}"
+
+    @staticmethod
+    def _new_entry(status: str = 'Starting...', metadata: Optional[Dict] = None) -> Dict:
+        return {
+            'status': {
+                'progress': 0,
+                'status': status,
+                'timestamp': datetime.now().isoformat()
+            },
+            'result': None,
+            'metadata': metadata or {},
+            'updated': time.monotonic(),
+            'version': 0,
+            'seen': None,
+            'cancelled': None,
+        }
+
+    def _touch(self, session_id: str, entry: Dict):
+        entry['updated'] = time.monotonic()
+        self._jobs.move_to_end(session_id)
+        self._notify_locked(entry)
+
+    def _notify_locked(self, entry: Optional[Dict] = None):
+        self._version += 1
+        if entry is not None:
+            entry['version'] = self._version
+        self._changed.notify_all()
+
+    def _purge_locked(self):
+        now = time.monotonic()
+        # Entries are ordered by last update, so expired ones sit at the front
+        while self._jobs:
+            session_id, entry = next(iter(self._jobs.items()))
+            if now - entry['updated'] < self.ttl:
+                break
+            del self._jobs[session_id]
+            self.evictions += 1
+
+        if len(self._jobs) > self.max_entries:
+            finished = [sid for sid, entry in self._jobs.items() if entry['result'] is not None]
+            for session_id in finished[:len(self._jobs) - self.max_entries]:
+                del self._jobs[session_id]
+                self.evictions += 1
+        while len(self._jobs) > self.max_entries:
+            self._jobs.popitem(last=False)
+            self.evictions += 1
+        for session_id in [sid for sid in self._tokens if sid not in self._jobs]:
+            del self._tokens[session_id]
+
+    def create(self, session_id: str, status: str = 'Starting...', **metadata):
+        """Register a new job"""
+        with self._lock:
+            entry = self._jobs[session_id] = self._new_entry(status, metadata)
+            self._touch(session_id, entry)
+            self._purge_locked()
+
+    def set_status(self, session_id: str, progress: float, status: str):
+        """Record a progress update; dropped if the job was deleted or expired"""
+        with self._lock:
+            entry = self._jobs.get(session_id)
+            if entry is None:
+                return
+            entry['status'] = {
+                'progress': progress,
+                'status': status,
+                'timestamp': datetime.now().isoformat()
+            }
+            self._touch(session_id, entry)
+
+    def get_status(self, session_id: str) -> Optional[Dict]:
+        """Return a copy of the job's latest status"""
+        with self._lock:
+            entry = self._jobs.get(session_id)
+            return dict(entry['status']) if entry is not None else None
+
+    def set_result(self, session_id: str, result: Dict):
+        """Record the job's final result; dropped if the job was deleted or expired"""
+        with self._lock:
+            entry = self._jobs.get(session_id)
+            if entry is None:
+                return
+            entry['result'] = dict(result)
+            self._tokens.pop(session_id, None)
+            self._touch(session_id, entry)
+
+    def get_result(self, session_id: str) -> Optional[Dict]:
+        """Return a copy of the job's final result"""
+        with self._lock:
+            entry = self._jobs.get(session_id)
+            if entry is None or entry['result'] is None:
+                return None
+            return dict(entry['result'])
+
+    def delete(self, session_id: str):
+        """Forget a job"""
+        with self._lock:
+            self._tokens.pop(session_id, None)
+            if self._jobs.pop(session_id, None) is not None:
+                self._notify_locked()
+
+    def running_ids(self) -> List[str]:
+        """Return the IDs of jobs that have no result yet"""
+        with self._lock:
+            return [session_id for session_id, entry in self._jobs.items() if entry['result'] is None]
+
+    def seen(self, session_id: str):
+        """Note that a client polled the job, which keeps it from being cancelled as abandoned"""
+        with self._lock:
+            entry = self._jobs.get(session_id)
+            if entry is not None:
+                entry['seen'] = time.monotonic()
+
+    def cancel(self, session_id: str, reason: str = 'Cancelled by user') -> bool:
+        """Ask a running job to stop; False if it is unknown, finished or already cancelled"""
+        with self._lock:
+            entry = self._jobs.get(session_id)
+            if entry is None or entry['result'] is not None or entry['cancelled']:
+                return False
+            entry['cancelled'] = reason
+            self.cancellations += 1
+            token = self._tokens.get(session_id)
+        if token is not None:
+            token.cancel(reason)
+        return True
+
+    def cancelled(self, session_id: str) -> Optional[str]:
+        """Return why a running job was cancelled, or None if it should keep going"""
+        with self._lock:
+            entry = self._jobs.get(session_id)
+            if entry is None or entry['result'] is not None:
+                return None
+            if (not entry['cancelled'] and self.abandon_after is not None and entry['seen'] is not None
+                    and time.monotonic() - entry['seen'] > self.abandon_after):
+                entry['cancelled'] = f"Abandoned: not polled for {self.abandon_after:.0f}s"
+                self.cancellations += 1
+            return entry['cancelled']
+
+    def cancel_token(self, session_id: str) -> CancelToken:
+        """Return the token a job checks to learn that it was cancelled"""
+        with self._lock:
+            token = self._tokens.get(session_id)
+            if token is None:
+                token = self._tokens[session_id] = CancelToken(lambda: self.cancelled(session_id))
+            return token
+
+    def wait_for_change(self, session_id: str, since: int, timeout: float) -> Optional[Dict]:
+        """Block until the job changes after version ``since`` or ``timeout`` passes.
+
+        Returns a snapshot with ``version``, ``status`` and ``result`` (the
+        version is unchanged on timeout), or None once the job is gone.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while True:
+                entry = self._jobs.get(session_id)
+                if entry is None:
+                    return None
+                remaining = deadline - time.monotonic()
+                if entry['version'] > since or remaining <= 0:
+                    return {
+                        'version': entry['version'],
+                        'status': dict(entry['status']),
+                        'result': dict(entry['result']) if entry['result'] is not None else None,
+                    }
+                self._changed.wait(remaining)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._jobs
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the stored jobs"""
+        with self._lock:
+            return _deep_sizeof(self._jobs)
+
+    def stats(self) -> Dict[str, float]:
+        """Return entry counts, evictions and memory footprint"""
+        with self._lock:
+            self._purge_locked()
+            running = sum(1 for entry in self._jobs.values() if entry['result'] is None)
+            return {
+                'entries': len(self._jobs),
+                'running': running,
+                'finished': len(self._jobs) - running,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'evictions': self.evictions,
+                'cancellations': self.cancellations,
+                'memory_bytes': _deep_sizeof(self._jobs),
+            }
+
+
+class SQLiteJobStore:
+    """Job store shared by every process on the host through one SQLite database.
+
+    Under gunicorn a job runs in one worker but its polls may reach any
+    other, so status and results live in a WAL-mode database that workers
+    read while another writes, keyed by session ID. Progress updates and
+    poll times are buffered and written together every ``flush_interval``
+    seconds; creation, results and cancellations are written at once. The
+    background flusher also checks the flags of this process's running
+    jobs, so a job cancelled through another worker stops promptly.
+    Has the same interface as :class:`JobStore`.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            session_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            result TEXT,
+            metadata TEXT NOT NULL DEFAULT '{}',
+            updated REAL NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            seen REAL,
+            cancelled TEXT
+        );
+        CREATE INDEX IF NOT EXISTS jobs_updated ON jobs (updated);
+    """
+
+    def __init__(self, path: str, ttl: float = 6 * 3600, max_entries: int = 1000,
+                 abandon_after: Optional[float] = 120, flush_interval: float = 0.5):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.abandon_after = abandon_after or None
+        self.flush_interval = flush_interval
+        self.evictions = 0
+        self.cancellations = 0
+        self.flushes = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._pending_status: Dict[str, str] = {}
+        self._pending_seen: Dict[str, float] = {}
+        self._tokens: Dict[str, CancelToken] = {}
+        self._flusher = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn().executescript(self._SCHEMA)
+
+    new_id = staticmethod(JobStore.new_id)
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's connection to the database"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # WAL keeps the database consistent on a crash; only the last commits may be lost
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _status_json(progress: float, status: str) -> str:
+        return json.dumps({'progress': progress, 'status': status, 'timestamp': datetime.now().isoformat()})
+
+    def _notify(self):
+        with self._changed:
+            self._changed.notify_all()
+
+    def _ensure_flusher_locked(self):
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=self._flush_loop, name='job-store-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+                # Picks up cancellations and abandonment recorded by other workers
+                for token in self._running_tokens():
+                    token.cancelled
+            except sqlite3.Error as e:
+                print(f"⚠️  Could not write job progress: {e}")
+            with self._lock:
+                if not self._pending_status and not self._pending_seen and not self._tokens:
+                    self._flusher = None
+                    return
+
+    def _running_tokens(self) -> List[CancelToken]:
+        with self._lock:
+            return list(self._tokens.values())
+
+    def flush(self):
+        """Write the buffered progress updates and poll times in one transaction"""
+        with self._lock:
+            statuses, self._pending_status = self._pending_status, {}
+            seen, self._pending_seen = self._pending_seen, {}
+        if not statuses and not seen:
+            return
+        now = time.time()
+        conn = self._conn()
+        with conn:
+            # Only updates, so a job deleted or purged since the update was buffered stays gone
+            conn.executemany(
+                "UPDATE jobs SET status = ?, updated = ?, version = version + 1 WHERE session_id = ?",
+                [(status, now, session_id) for session_id, status in statuses.items()])
+            conn.executemany("UPDATE jobs SET seen = MAX(COALESCE(seen, 0), ?) WHERE session_id = ?",
+                             [(when, session_id) for session_id, when in seen.items()])
+        with self._lock:
+            self.flushes += 1
+        self._notify()
+
+    def _purge(self, conn: sqlite3.Connection):
+        evicted = conn.execute("DELETE FROM jobs WHERE updated < ?", (time.time() - self.ttl,)).rowcount
+        overflow = conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0] - self.max_entries
+        if overflow > 0:
+            # Finished jobs go first, oldest first
+            evicted += conn.execute(
+                "DELETE FROM jobs WHERE session_id IN (SELECT session_id FROM jobs "
+                "ORDER BY result IS NULL, updated LIMIT ?)", (overflow,)).rowcount
+        if evicted:
+            with self._lock:
+                self.evictions += evicted
+                for session_id in list(self._tokens):
+                    if conn.execute("SELECT 1 FROM jobs WHERE session_id = ?", (session_id,)).fetchone() is None:
+                        del self._tokens[session_id]
+
+    def create(self, session_id: str, status: str = 'Starting...', **metadata):
+        """Register a new job"""
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (session_id, status, metadata, updated) VALUES (?, ?, ?, ?)",
+                (session_id, self._status_json(0, status), json.dumps(metadata), time.time()))
+            self._purge(conn)
+        self._notify()
+
+    def set_status(self, session_id: str, progress: float, status: str):
+        """Record a progress update; other workers see it after the next flush"""
+        with self._lock:
+            self._pending_status[session_id] = self._status_json(progress, status)
+            self._ensure_flusher_locked()
+
+    def get_status(self, session_id: str) -> Optional[Dict]:
+        """Return the job's latest status"""
+        with self._lock:
+            pending = self._pending_status.get(session_id)
+        if pending is None:
+            row = self._conn().execute("SELECT status FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            pending = row[0]
+        return json.loads(pending)
+
+    def set_result(self, session_id: str, result: Dict):
+        """Record the job's final result, together with any progress update still buffered.
+
+        Does nothing for a job that was deleted or purged in the meantime.
+        """
+        with self._lock:
+            status = self._pending_status.pop(session_id, None)
+            self._tokens.pop(session_id, None)
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE jobs SET result = ?, status = COALESCE(?, status), updated = ?, version = version + 1 "
+                "WHERE session_id = ?",
+                (json.dumps(result), status, time.time(), session_id))
+        self._notify()
+
+    def get_result(self, session_id: str) -> Optional[Dict]:
+        """Return the job's final result"""
+        row = self._conn().execute("SELECT result FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        return json.loads(row[0])
+
+    def delete(self, session_id: str):
+        """Forget a job"""
+        with self._lock:
+            self._pending_status.pop(session_id, None)
+            self._pending_seen.pop(session_id, None)
+            self._tokens.pop(session_id, None)
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM jobs WHERE session_id = ?", (session_id,))
+        self._notify()
+
+    def running_ids(self) -> List[str]:
+        """Return the IDs of jobs that have no result yet, in any worker"""
+        return [row[0] for row in self._conn().execute("SELECT session_id FROM jobs WHERE result IS NULL")]
+
+    def seen(self, session_id: str):
+        """Note that a client polled the job, which keeps it from being cancelled as abandoned"""
+        with self._lock:
+            self._pending_seen[session_id] = time.time()
+            self._ensure_flusher_locked()
+
+    def cancel(self, session_id: str, reason: str = 'Cancelled by user') -> bool:
+        """Ask a running job to stop, in whichever worker it runs"""
+        conn = self._conn()
+        with conn:
+            cancelled = conn.execute(
+                "UPDATE jobs SET cancelled = ?, version = version + 1 "
+                "WHERE session_id = ? AND result IS NULL AND cancelled IS NULL",
+                (reason, session_id)).rowcount == 1
+        if not cancelled:
+            return False
+        with self._lock:
+            self.cancellations += 1
+            token = self._tokens.get(session_id)
+        if token is not None:
+            token.cancel(reason)
+        self._notify()
+        return True
+
+    def cancelled(self, session_id: str) -> Optional[str]:
+        """Return why a running job was cancelled, or None if it should keep going"""
+        row = self._conn().execute(
+            "SELECT result IS NOT NULL, cancelled, seen FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None or row[0]:
+            return None
+        _, reason, seen = row
+        with self._lock:
+            seen = max(filter(None, (seen, self._pending_seen.get(session_id))), default=None)
+        if not reason and self.abandon_after is not None and seen is not None \
+                and time.time() - seen > self.abandon_after:
+            reason = f"Abandoned: not polled for {self.abandon_after:.0f}s"
+            conn = self._conn()
+            with conn:
+                conn.execute("UPDATE jobs SET cancelled = ? WHERE session_id = ? AND cancelled IS NULL",
+                             (reason, session_id))
+            with self._lock:
+                self.cancellations += 1
+        return reason
+
+    def cancel_token(self, session_id: str) -> CancelToken:
+        """Return the token a job checks to learn that it was cancelled"""
+        with self._lock:
+            token = self._tokens.get(session_id)
+            if token is None:
+                token = self._tokens[session_id] = CancelToken(lambda: self.cancelled(session_id))
+                self._ensure_flusher_locked()
+            return token
+
+    def wait_for_change(self, session_id: str, since: int, timeout: float) -> Optional[Dict]:
+        """Block until the job changes after version ``since`` or ``timeout`` passes.
+
+        Changes made by other workers are noticed by polling the database
+        every ``flush_interval`` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            row = self._conn().execute(
+                "SELECT version, status, result FROM jobs WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            version, status, result = row
+            remaining = deadline - time.monotonic()
+            if version > since or remaining <= 0:
+                return {
+                    'version': version,
+                    'status': json.loads(status),
+                    'result': json.loads(result) if result is not None else None,
+                }
+            with self._changed:
+                self._changed.wait(min(remaining, self.flush_interval))
+
+    def __contains__(self, session_id: str) -> bool:
+        return self._conn().execute("SELECT 1 FROM jobs WHERE session_id = ?", (session_id,)).fetchone() is not None
+
+    def memory_usage(self) -> int:
+        """Approximate bytes held by the write buffers"""
+        with self._lock:
+            return _deep_sizeof(self._pending_status) + _deep_sizeof(self._pending_seen)
+
+    def stats(self) -> Dict[str, float]:
+        """Return entry counts, evictions, write batching and database size"""
+        conn = self._conn()
+        with conn:
+            self._purge(conn)
+        entries, running = conn.execute("SELECT COUNT(*), COALESCE(SUM(result IS NULL), 0) FROM jobs").fetchone()
+        db_bytes = sum(os.path.getsize(self.path + suffix) for suffix in ('', '-wal')
+                       if os.path.exists(self.path + suffix))
+        with self._lock:
+            return {
+                'backend': 'sqlite',
+                'entries': entries,
+                'running': running,
+                'finished': entries - running,
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'evictions': self.evictions,
+                'cancellations': self.cancellations,
+                'pending_writes': len(self._pending_status) + len(self._pending_seen),
+                'flushes': self.flushes,
+                'db_bytes': db_bytes,
+            }
+
+
+# Shared by every request handled by this process, created on first use
+_job_store = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store() -> Union[JobStore, SQLiteJobStore]:
+    """Return the process-wide job store; JOB_STORE=sqlite shares it between processes"""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            options = dict(
+                ttl=float(os.getenv('JOB_STORE_TTL', str(6 * 3600))),
+                max_entries=int(os.getenv('JOB_STORE_MAX_ENTRIES', '1000')),
+                abandon_after=float(os.getenv('JOB_ABANDON_SECONDS', '120')),
+            )
+            if os.getenv('JOB_STORE', 'memory').lower() == 'sqlite':
+                _job_store = SQLiteJobStore(
+                    os.getenv('JOB_STORE_PATH', os.path.join('data', 'jobs.sqlite3')),
+                    flush_interval=float(os.getenv('JOB_STORE_FLUSH_SECONDS', '0.5')),
+                    **options,
+                )
+            else:
+                _job_store = JobStore(**options)
+        return _job_store
@@ -0,0 +1,297 @@
+"""Background SMTP delivery over a reused, authenticated connection"""
+import atexit
+import os
+import queue
+import smtplib
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from email.generator import BytesGenerator
+from email.message import Message
+from typing import BinaryIO, Dict, List, Optional, Tuple
+
+from metrics import get_metrics
+
+# Errors that a fresh connection or a later attempt can get past
+TRANSIENT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, OSError)
+
+
+class MailQueueFullError(Exception):
+    """Raised when a message is sent while the delivery queue is full"""
+
+
+def serialize_message(message: Message, spool_size: int = 1024 * 1024) -> BinaryIO:
+    """Write a message with CRLF line endings to a file that spills to disk past ``spool_size``"""
+    payload = tempfile.SpooledTemporaryFile(max_size=spool_size)
+    BytesGenerator(payload, policy=message.policy.clone(linesep='\r\n')).flatten(message)
+    payload.seek(0)
+    return payload
+
+
+def send_spooled(connection: smtplib.SMTP, sender: str, recipients: List[str], payload: BinaryIO,
+                 chunk_size: int = 64 * 1024) -> Dict[str, Tuple[int, bytes]]:
+    """Like ``SMTP.sendmail``, but streams the message from ``payload`` instead of holding it in memory.
+
+    Returns the recipients the server refused, as ``sendmail`` does.
+    """
+    connection.ehlo_or_helo_if_needed()
+    code, reply = connection.mail(sender)
+    if code != 250:
+        raise smtplib.SMTPSenderRefused(code, reply, sender)
+    refused = {}
+    for recipient in recipients:
+        code, reply = connection.rcpt(recipient)
+        if code not in (250, 251):
+            refused[recipient] = (code, reply)
+    if len(refused) == len(recipients):
+        raise smtplib.SMTPRecipientsRefused(refused)
+
+    connection.putcmd('data')
+    code, reply = connection.getreply()
+    if code != 354:
+        raise smtplib.SMTPDataError(code, reply)
+    payload.seek(0)
+    chunk, size = [], 0
+    for line in payload:
+        if line.startswith(b'.'):
+            line = b'.' + line
+        if not line.endswith(b'\r\n'):
+            line = line.rstrip(b'\r\n') + b'\r\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            connection.send(b''.join(chunk))
+            chunk, size = [], 0
+    chunk.append(b'.\r\n')
+    connection.send(b''.join(chunk))
+    code, reply = connection.getreply()
+    if code != 250:
+        raise smtplib.SMTPDataError(code, reply)
+    return refused
+
+
+def _is_transient(error: Exception) -> bool:
+    if isinstance(error, (smtplib.SMTPAuthenticationError, smtplib.SMTPRecipientsRefused,
+                          smtplib.SMTPSenderRefused, smtplib.SMTPNotSupportedError)):
+        return False
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+class Mailer:
+    """Sends queued messages from one background thread.
+
+    The connection is opened, upgraded with STARTTLS and authenticated once,
+    then reused for every message until it fails or sits idle for
+    ``idle_timeout`` seconds. Disconnects and 4xx replies are retried on a
+    fresh connection with exponential backoff; permanent errors fail the
+    message right away. :meth:`send` returns a future so callers can wait
+    for delivery, but nobody has to.
+
+    Messages are serialized when they are queued, so the MIME tree can be
+    freed at once and waiting mail is held in spooled files rather than as
+    message objects. Delivery streams those files to the server in chunks.
+    """
+
+    def __init__(self, host: str, port: int, username: Optional[str], password: Optional[str],
+                 starttls: bool = True, max_queued: int = 100, retries: int = 3,
+                 retry_backoff: float = 2.0, idle_timeout: float = 60.0, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.retries = max(0, retries)
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+
+        self._queue: "queue.Queue[Optional[Tuple[str, List[str], BinaryIO, Future]]]" = queue.Queue(max_queued)
+        self._connection: Optional[smtplib.SMTP] = None
+        self._last_used = 0.0
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self.counters = {
+            'sent': 0,
+            'failed': 0,
+            'retries': 0,
+            'connections': 0,
+        }
+
+    def send(self, sender: str, recipients: List[str], message: Message) -> Future:
+        """Queue a message for delivery and return a future for its outcome"""
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Mailer is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='mailer', daemon=True)
+                self._thread.start()
+        payload = serialize_message(message)
+        try:
+            self._queue.put_nowait((sender, list(recipients), payload, future))
+        except queue.Full:
+            payload.close()
+            raise MailQueueFullError(f"Mail queue is full ({self._queue.maxsize} messages)")
+        return future
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                self._disconnect()
+                continue
+            try:
+                if item is None:
+                    self._disconnect()
+                    return
+                self._deliver(*item)
+            finally:
+                self._queue.task_done()
+
+    def _connect(self) -> smtplib.SMTP:
+        if self._connection is not None and time.monotonic() - self._last_used > self.idle_timeout:
+            # Servers drop idle sessions; start over instead of failing the first command
+            self._disconnect()
+        if self._connection is None:
+            connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            try:
+                if self.starttls:
+                    connection.starttls()
+                if self.username:
+                    connection.login(self.username, self.password)
+            except Exception:
+                connection.close()
+                raise
+            self._connection = connection
+            self.counters['connections'] += 1
+        return self._connection
+
+    def _disconnect(self):
+        connection, self._connection = self._connection, None
+        if connection is None:
+            return
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def _deliver(self, sender: str, recipients: List[str], payload: BinaryIO, future: Future):
+        with payload:
+            if future.set_running_or_notify_cancel():
+                started = time.perf_counter()
+                self._deliver_payload(sender, recipients, payload, future)
+                get_metrics().stage_seconds.observe(
+                    time.perf_counter() - started, stage='email_delivery',
+                    outcome='error' if future.exception() else 'ok')
+
+    def _deliver_payload(self, sender: str, recipients: List[str], payload: BinaryIO, future: Future):
+        for attempt in range(self.retries + 1):
+            try:
+                connection = self._connect()
+                send_spooled(connection, sender, recipients, payload)
+                self._last_used = time.monotonic()
+                self.counters['sent'] += 1
+                print(f"Email sent successfully to {len(recipients)} recipient(s):")
+                for email in recipients:
+                    print(f"  - {email}")
+                future.set_result(True)
+                return
+            except Exception as e:
+                # The connection may be half-way through a transaction; never reuse it
+                self._drop_connection()
+                if attempt >= self.retries or not _is_transient(e):
+                    self.counters['failed'] += 1
+                    print(f"Error sending email: {e}")
+                    print("Check your email credentials and recipient addresses.")
+                    future.set_exception(e)
+                    return
+                self.counters['retries'] += 1
+                delay = 0 if attempt == 0 and isinstance(e, smtplib.SMTPServerDisconnected) else (
+                    self.retry_backoff * 2 ** attempt)
+                print(f"⏳ Email delivery failed ({e}), retrying in {delay:.0f}s...")
+                time.sleep(delay)
+
+    def _drop_connection(self):
+        connection, self._connection = self._connection, None
+        if connection is not None:
+            connection.close()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued message has been handled; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout: Optional[float] = 30.0):
+        """Deliver what is queued, then close the connection and stop the worker"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is None:
+            return
+        self.flush(timeout)
+        self._queue.put(None)
+        thread.join(timeout=5)
+
+    def stats(self) -> Dict[str, int]:
+        """Return delivery counters and queue depth"""
+        return dict(
+            self.counters,
+            queued=self._queue.unfinished_tasks,
+            connected=self._connection is not None,
+        )
+
+
+# One mailer per SMTP account, created on first use
+_mailers: Dict[Tuple, Mailer] = {}
+_mailers_lock = threading.Lock()
+
+
+def get_mailer(host: str, port: int, username: Optional[str], password: Optional[str]) -> Mailer:
+    """Return the process-wide mailer for an SMTP account"""
+    key = (host, port, username, password)
+    with _mailers_lock:
+        mailer = _mailers.get(key)
+        if mailer is None:
+            mailer = Mailer(
+                host, port, username, password,
+                starttls=os.getenv('SMTP_STARTTLS', 'true').lower() != 'false',
+                max_queued=int(os.getenv('MAIL_QUEUE_SIZE', '100')),
+                retries=int(os.getenv('MAIL_RETRIES', '3')),
+                retry_backoff=float(os.getenv('MAIL_RETRY_BACKOFF', '2')),
+                idle_timeout=float(os.getenv('MAIL_IDLE_TIMEOUT', '60')),
+            )
+            _mailers[key] = mailer
+        return mailer
+
+
+def mailer_stats() -> Dict[str, int]:
+    """Return delivery counters summed over every mailer"""
+    with _mailers_lock:
+        mailers = list(_mailers.values())
+    totals = {'mailers': len(mailers), 'queued': 0, 'sent': 0, 'failed': 0, 'retries': 0, 'connections': 0}
+    for mailer in mailers:
+        for key, value in mailer.stats().items():
+            if key in totals:
+                totals[key] += value
+    return totals
+
+
+@atexit.register
+def close_mailers():
+    """Deliver queued messages before the process exits"""
+    with _mailers_lock:
+        mailers = list(_mailers.values())
+        _mailers.clear()
+    for mailer in mailers:
+        mailer.close(timeout=float(os.getenv('MAIL_FLUSH_TIMEOUT', '60')))
@@ -0,0 +1,238 @@
+"""Stage timings, inference call metrics and the Prometheus text export"""
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+PREFIX = 'shorts'
+
+# Seconds; wide enough for both a cached script and a model that is still loading
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _label_key(names: Tuple[str, ...], labels: Dict) -> Tuple[str, ...]:
+    # Strings, so series with a numeric and a textual status still sort together
+    return tuple(str(labels.get(name, '')) for name in names)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            return self._values.get(key, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count per label set"""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # One slot per bucket, then +Inf, sum
+                series = self._series[key] = [0.0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def count(self, **labels) -> int:
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self._series.get(key)
+            return int(series[-2]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                    labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                    lines.append(f'{self.name}_bucket{labels} {_format_value(count)}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {_format_value(series[-1])}')
+                lines.append(f'{self.name}_count{labels} {_format_value(series[-2])}')
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the process's metrics and renders them in the Prometheus text format.
+
+    Besides its own counters and histograms, the registry exports the
+    numeric fields of existing ``stats()`` dicts (job queue, caches, mail)
+    as gauges, read when ``/metrics`` is scraped.
+    """
+
+    def __init__(self):
+        self.stage_seconds = Histogram(
+            f'{PREFIX}_stage_duration_seconds', 'Time spent in each pipeline stage', ('stage', 'outcome'))
+        self.hf_request_seconds = Histogram(
+            f'{PREFIX}_hf_request_duration_seconds', 'Hugging Face inference call latency',
+            ('kind', 'model', 'status'))
+        self.hf_requests = Counter(
+            f'{PREFIX}_hf_requests_total', 'Hugging Face inference calls', ('kind', 'model', 'status'))
+        self.jobs = Counter(f'{PREFIX}_jobs_total', 'Finished generation jobs', ('outcome',))
+        self._metrics = [self.stage_seconds, self.hf_request_seconds, self.hf_requests, self.jobs]
+        self._gauges: List[Tuple[str, str, Callable[[], Optional[Dict]]]] = []
+        self._lock = threading.Lock()
+
+    def register_gauges(self, prefix: str, help_text: str, collect: Callable[[], Optional[Dict]]):
+        """Export the numeric fields of ``collect()`` as ``<prefix>_<field>`` gauges"""
+        with self._lock:
+            self._gauges = [gauge for gauge in self._gauges if gauge[0] != prefix]
+            self._gauges.append((prefix, help_text, collect))
+
+    @contextmanager
+    def span(self, stage: str) -> Iterator[Dict[str, Optional[str]]]:
+        """Time a block as one run of ``stage``, labeled with how it ended.
+
+        A block that reports failure without raising can set the yielded
+        dict's ``outcome`` itself.
+        """
+        started = time.perf_counter()
+        run: Dict[str, Optional[str]] = {'outcome': None}
+        outcome = 'error'
+        try:
+            yield run
+            outcome = run['outcome'] or 'ok'
+        finally:
+            self.stage_seconds.observe(time.perf_counter() - started, stage=stage, outcome=outcome)
+
+    def record_hf_call(self, kind: str, model: str, status, seconds: float):
+        """Count one inference call; ``status`` is the HTTP status, or 'error' when there was none"""
+        status = 'error' if status is None else status
+        self.hf_request_seconds.observe(seconds, kind=kind, model=model, status=status)
+        self.hf_requests.inc(kind=kind, model=model, status=status)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        with self._lock:
+            gauges = list(self._gauges)
+        for prefix, help_text, collect in gauges:
+            try:
+                values = collect() or {}
+            except Exception as e:
+                print(f"⚠️  Could not collect {prefix} metrics: {e}")
+                continue
+            for field, value in values.items():
+                if isinstance(value, bool):
+                    value = int(value)
+                if not isinstance(value, (int, float)):
+                    continue
+                name = f'{PREFIX}_{prefix}_{field}'
+                lines += [f'# HELP {name} {help_text}: {field}', f'# TYPE {name} gauge', f'{name} {_format_value(value)}']
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by every job in the process, created on first use
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics() -> MetricsRegistry:
+    """Return the process-wide metrics registry"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+        return _metrics
+
+
+def span(stage: str):
+    """Time a block as one run of a pipeline stage on the process-wide registry"""
+    return get_metrics().span(stage)
+
+
+def record_hf_call(kind: str, model: str, status, seconds: float):
+    """Count one inference call on the process-wide registry"""
+    get_metrics().record_hf_call(kind, model, status, seconds)
+
+
+def result_outcome(result: Any) -> str:
+    """Label a job from the result dict it returned: ok, error or cancelled"""
+    if not isinstance(result, dict):
+        return 'ok'
+    if result.get('cancelled'):
+        return 'cancelled'
+    return 'ok' if result.get('success', True) else 'error'
+
+
+def timed(stage: str, outcome: Optional[Callable[[Any], str]] = None):
+    """Decorate a function or coroutine function so every call is timed as ``stage``.
+
+    ``outcome`` labels a call from its return value, for functions that
+    catch their errors and report them in the result instead of raising.
+    """
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def wrapper(*args, **kwargs):
+                with span(stage) as run:
+                    result = await fn(*args, **kwargs)
+                    if outcome is not None:
+                        run['outcome'] = outcome(result)
+                    return result
+        else:
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with span(stage) as run:
+                    result = fn(*args, **kwargs)
+                    if outcome is not None:
+                        run['outcome'] = outcome(result)
+                    return result
+        return wrapper
+    return decorate
@@ -0,0 +1,162 @@
+"""Adaptive routing across the Hugging Face image models"""
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class ModelStats:
+    """Live health statistics for a single inference model"""
+
+    def __init__(self):
+        self.latency_ewma = None
+        self.success_rate = 1.0
+        self.attempts = 0
+        self.successes = 0
+        self.cooldown_until = 0.0
+        self.last_status = None
+
+    def to_dict(self, now: float) -> Dict:
+        return {
+            'latency_ewma': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+            'success_rate': round(self.success_rate, 3),
+            'attempts': self.attempts,
+            'successes': self.successes,
+            'cooldown_remaining': round(max(0.0, self.cooldown_until - now), 1),
+            'last_status': self.last_status,
+        }
+
+
+class ModelRouter:
+    """Orders models by expected latency and skips the ones cooling down.
+
+    Stats are keyed by model URL and shared by every job that uses the router,
+    so a 429 or a model load seen by one job steers the next one away.
+    """
+
+    def __init__(self, alpha: float = 0.3, default_latency: float = 20.0,
+                 default_cooldown: float = 15.0, rate_limit_cooldown: float = 30.0):
+        self.alpha = alpha
+        self.default_latency = default_latency
+        self.default_cooldown = default_cooldown
+        self.rate_limit_cooldown = rate_limit_cooldown
+        self._stats: Dict[str, ModelStats] = {}
+        self._lock = threading.Lock()
+
+    def _get(self, model: str) -> ModelStats:
+        stats = self._stats.get(model)
+        if stats is None:
+            stats = self._stats[model] = ModelStats()
+        return stats
+
+    def _expected_cost(self, stats: Optional[ModelStats]) -> float:
+        if stats is None or stats.latency_ewma is None:
+            latency = self.default_latency
+            success_rate = stats.success_rate if stats else 1.0
+        else:
+            latency = stats.latency_ewma
+            success_rate = stats.success_rate
+        return latency / max(success_rate, 0.05)
+
+    def candidates(self, models: List[str], now: Optional[float] = None) -> List[str]:
+        """Return the models not in cooldown, fastest expected first"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            healthy = [
+                model for model in models
+                if model not in self._stats or self._stats[model].cooldown_until <= now
+            ]
+            # sorted() is stable, so untried models keep their configured order
+            return sorted(healthy, key=lambda model: self._expected_cost(self._stats.get(model)))
+
+    def next_available_in(self, models: List[str], now: Optional[float] = None) -> float:
+        """Seconds until the first of the given models leaves cooldown"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            waits = [
+                max(0.0, self._stats[model].cooldown_until - now) if model in self._stats else 0.0
+                for model in models
+            ]
+        return min(waits) if waits else 0.0
+
+    def _observe_latency(self, stats: ModelStats, latency: Optional[float]):
+        if latency is None:
+            return
+        if stats.latency_ewma is None:
+            stats.latency_ewma = latency
+        else:
+            stats.latency_ewma = (1 - self.alpha) * stats.latency_ewma + self.alpha * latency
+
+    def record_success(self, model: str, latency: float, status_code: int = 200):
+        """Record a successful call and its latency"""
+        with self._lock:
+            stats = self._get(model)
+            stats.attempts += 1
+            stats.successes += 1
+            stats.last_status = status_code
+            stats.success_rate = (1 - self.alpha) * stats.success_rate + self.alpha
+            stats.cooldown_until = 0.0
+            self._observe_latency(stats, latency)
+
+    def record_failure(self, model: str, latency: Optional[float] = None,
+                       status_code: Optional[int] = None, cooldown: Optional[float] = None):
+        """Record a failed call; cooldown comes from Retry-After or estimated_time when known"""
+        if cooldown is None:
+            if status_code == 429:
+                cooldown = self.rate_limit_cooldown
+            elif status_code in (404, 410):
+                cooldown = 3600.0
+            elif status_code in (None, 503) or (status_code and status_code >= 500):
+                cooldown = self.default_cooldown
+            else:
+                cooldown = 0.0
+
+        with self._lock:
+            stats = self._get(model)
+            stats.attempts += 1
+            stats.last_status = status_code
+            stats.success_rate = (1 - self.alpha) * stats.success_rate
+            # Only timeouts and connection errors say something about speed
+            if latency is not None and status_code is None:
+                self._observe_latency(stats, latency)
+            if cooldown > 0:
+                stats.cooldown_until = max(stats.cooldown_until, time.monotonic() + cooldown)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Return the current stats of every model seen so far"""
+        now = time.monotonic()
+        with self._lock:
+            return {model.split('/')[-1]: stats.to_dict(now) for model, stats in self._stats.items()}
+
+    def reset(self):
+        """Forget all collected stats"""
+        with self._lock:
+            self._stats.clear()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given in seconds"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+# Shared by every agent in the process, created on first use
+_model_router = None
+_model_router_lock = threading.Lock()
+
+
+def get_model_router() -> ModelRouter:
+    """Return the process-wide model router"""
+    global _model_router
+    with _model_router_lock:
+        if _model_router is None:
+            _model_router = ModelRouter(
+                default_latency=float(os.getenv('MODEL_ROUTER_DEFAULT_LATENCY', '20')),
+                default_cooldown=float(os.getenv('MODEL_ROUTER_COOLDOWN', '15')),
+                rate_limit_cooldown=float(os.getenv('MODEL_ROUTER_RATE_LIMIT_COOLDOWN', '30')),
+            )
+        return _model_router
@@ -0,0 +1,74 @@
+"""Downscaled image renditions that fit an email size budget"""
+import io
+import os
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+FORMATS = {
+    'jpeg': ('JPEG', 'jpeg'),
+    'webp': ('WEBP', 'webp'),
+}
+QUALITY_STEPS = (85, 75, 65, 50, 40)
+MIN_DIMENSION = 256
+
+
+def _encode(image: 'Image.Image', pil_format: str, quality: int) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, quality=quality, optimize=pil_format == 'JPEG')
+    return buffer.getvalue()
+
+
+def make_rendition(path: str, max_bytes: int, max_dimension: int = 1280,
+                   image_format: str = 'jpeg') -> Optional[Tuple[bytes, str]]:
+    """Return ``(data, mime_subtype)`` for an image re-encoded to at most ``max_bytes``.
+
+    The image is first scaled so its longest side is at most
+    ``max_dimension``, then encoded at decreasing quality; if even the
+    lowest quality is too large it is scaled down and tried again.
+    Returns None if the file cannot be read or no rendition fits.
+    """
+    from PIL import Image
+    pil_format, subtype = FORMATS.get(image_format.lower(), FORMATS['jpeg'])
+    try:
+        with Image.open(path) as source:
+            image = source.convert('RGB')
+    except (OSError, ValueError):
+        return None
+
+    image.thumbnail((max_dimension, max_dimension))
+    while True:
+        for quality in QUALITY_STEPS:
+            data = _encode(image, pil_format, quality)
+            if len(data) <= max_bytes:
+                return data, subtype
+        # Encoded size grows with the pixel count, so scale by the square root of the overshoot
+        scale = min(0.9, max(0.5, (max_bytes / len(data)) ** 0.5))
+        width, height = image.size
+        if max(width, height) * scale < MIN_DIMENSION:
+            return None
+        image = image.resize((max(1, int(width * scale)), max(1, int(height * scale))), Image.LANCZOS)
+
+
+def plan_email_images(paths: List[str], budget: int, max_dimension: int = 1280,
+                      image_format: str = 'jpeg') -> List[Tuple[int, bytes, str]]:
+    """Return ``(index, data, mime_subtype)`` renditions whose total size fits ``budget``.
+
+    Indexes start at 1 and match the image's position in ``paths``. Each
+    image gets an equal share of what is left of the budget, so space a
+    small image does not use goes to the ones after it. Missing files and
+    images that cannot fit are left out.
+    """
+    renditions = []
+    remaining = budget
+    existing = [(index, path) for index, path in enumerate(paths, 1) if os.path.exists(path)]
+    for position, (index, path) in enumerate(existing):
+        share = remaining // (len(existing) - position)
+        rendition = make_rendition(path, share, max_dimension, image_format)
+        if rendition is None:
+            print(f"⚠️  Could not fit {path} into {share} bytes, leaving it out of the email")
+            continue
+        renditions.append((index,) + rendition)
+        remaining -= len(rendition[0])
+    return renditions
@@ -0,0 +1,144 @@
+"""Persistent catalog of finished generations"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from script_cache import normalize_topic
+
+
+def content_hash(content: str) -> str:
+    """Return the hex SHA-256 of a script"""
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class ResultCatalog:
+    """Every successful job's result, script and files, kept in SQLite across restarts.
+
+    Rows are keyed by session ID and indexed by normalized topic, creation
+    time and script hash, so a result can be found again after the job
+    store has forgotten it, a repeat topic can be answered with the latest
+    complete result, and a script can be recovered by its hash.
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            session_id TEXT PRIMARY KEY,
+            topic TEXT NOT NULL,
+            topic_key TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            content_hash TEXT NOT NULL,
+            image_count INTEGER NOT NULL,
+            script TEXT NOT NULL,
+            result TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS results_topic ON results (topic_key, created_at);
+        CREATE INDEX IF NOT EXISTS results_created ON results (created_at);
+        CREATE INDEX IF NOT EXISTS results_hash ON results (content_hash);
+    """
+
+    def __init__(self, path: str):
+        self.path = os.path.abspath(path)
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._conn().executescript(self._SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        """Return this thread's connection to the database"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def record(self, session_id: str, result: Dict, content: str):
+        """Add a finished job's result and script"""
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (session_id, result['topic'], normalize_topic(result['topic']), time.time(),
+                 result.get('content_hash') or content_hash(content), len(result.get('image_files') or []),
+                 content, json.dumps(result)))
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        """Return a job's result"""
+        row = self._conn().execute("SELECT result FROM results WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def script(self, digest: str) -> Optional[str]:
+        """Return a recorded script by its hash"""
+        row = self._conn().execute(
+            "SELECT script FROM results WHERE content_hash = ? LIMIT 1", (digest,)).fetchone()
+        return row[0] if row is not None else None
+
+    def find_topic(self, topic: str, max_age: float) -> Optional[Tuple[str, Dict]]:
+        """Return the newest result for a topic that has images and whose files are all still on disk"""
+        rows = self._conn().execute(
+            "SELECT session_id, result FROM results WHERE topic_key = ? AND created_at >= ? AND image_count > 0 "
+            "ORDER BY created_at DESC LIMIT 5",
+            (normalize_topic(topic), time.time() - max_age)).fetchall()
+        for session_id, data in rows:
+            result = json.loads(data)
+            files = [result['content_file']] + result['image_files']
+            if all(os.path.exists(path) for path in files):
+                with self._lock:
+                    self.hits += 1
+                return session_id, result
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def mark_files_removed(self, session_id: str):
+        """Note that a job's files were deleted; its result and script stay, but it is never reused"""
+        conn = self._conn()
+        with conn:
+            row = conn.execute("SELECT result FROM results WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                return
+            result = dict(json.loads(row[0]), image_files=[], files_removed=True)
+            conn.execute("UPDATE results SET image_count = 0, result = ? WHERE session_id = ?",
+                         (json.dumps(result), session_id))
+
+    def delete(self, session_id: str):
+        """Forget a job's result"""
+        conn = self._conn()
+        with conn:
+            conn.execute("DELETE FROM results WHERE session_id = ?", (session_id,))
+
+    def stats(self) -> Dict[str, float]:
+        """Return the entry count, repeat-topic hits and database size"""
+        entries = self._conn().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        db_bytes = sum(os.path.getsize(self.path + suffix) for suffix in ('', '-wal')
+                       if os.path.exists(self.path + suffix))
+        with self._lock:
+            return {
+                'entries': entries,
+                'topic_hits': self.hits,
+                'topic_misses': self.misses,
+                'db_bytes': db_bytes,
+            }
+
+
+# Shared by every request handled by this process, created on first use
+_result_catalog = None
+_result_catalog_lock = threading.Lock()
+
+
+def get_result_catalog() -> Optional[ResultCatalog]:
+    """Return the process-wide result catalog, or None when it is disabled"""
+    global _result_catalog
+    if os.getenv('RESULT_CATALOG_ENABLED', '1').lower() in ('0', 'false', 'no'):
+        return None
+    with _result_catalog_lock:
+        if _result_catalog is None:
+            _result_catalog = ResultCatalog(os.getenv('RESULT_CATALOG_PATH', os.path.join('data', 'results.sqlite3')))
+        return _result_catalog
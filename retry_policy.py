@@ -0,0 +1,76 @@
+"""Backoff between inference attempts, bounded by a per-job deadline"""
+import math
+import random
+import time
+from typing import Optional
+
+# Failures that say nothing about the next model, so it is tried right away:
+# a model that is loading, gone, or that sent something other than an image
+_MOVE_ON_STATUSES = (200, 404, 410, 503)
+
+
+class Deadline:
+    """A point in time a job has to finish by; None means no limit"""
+
+    def __init__(self, seconds: Optional[float] = None):
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        if self.expires_at is None:
+            return math.inf
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float) -> float:
+        """Return ``cap``, shortened to what is left of the deadline"""
+        return min(cap, self.remaining())
+
+
+class RetryPolicy:
+    """Decides how long to wait before the next model, and whether there is time for it.
+
+    Rate limits, timeouts and connection errors usually hit every model
+    alike, so each one in a row doubles the wait (from ``base_delay`` up to
+    ``max_delay``), with up to ``jitter`` of it randomized so concurrent jobs
+    do not retry in lockstep. Other failures move on to the next model at
+    once. An attempt is only started if the job's deadline leaves room for
+    the wait plus ``min_attempt_seconds``, and each request's timeout is cut
+    to what is left of the deadline.
+    """
+
+    def __init__(self, base_delay: float = 0.5, max_delay: float = 8.0, multiplier: float = 2.0,
+                 jitter: float = 0.5, job_seconds: Optional[float] = 300.0,
+                 min_attempt_seconds: float = 5.0, request_timeout: float = 60.0,
+                 rng: Optional[random.Random] = None):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = min(1.0, max(0.0, jitter))
+        self.job_seconds = job_seconds
+        self.min_attempt_seconds = min_attempt_seconds
+        self.request_timeout = request_timeout
+        self._rng = rng or random.Random()
+
+    def deadline(self) -> Deadline:
+        """Start the clock for one job"""
+        return Deadline(self.job_seconds)
+
+    def backs_off(self, status_code: Optional[int]) -> bool:
+        """Whether a failure with this status should slow down the next attempt"""
+        return status_code not in _MOVE_ON_STATUSES
+
+    def delay(self, failures: int) -> float:
+        """Jittered wait after ``failures`` back-off failures in a row"""
+        if failures <= 0:
+            return 0.0
+        raw = min(self.max_delay, self.base_delay * self.multiplier ** (failures - 1))
+        return raw * (1 - self.jitter) + self._rng.uniform(0, raw * self.jitter)
+
+    def has_time(self, deadline: Deadline, delay: float = 0.0) -> bool:
+        """Whether the deadline leaves room to wait ``delay`` and then make an attempt"""
+        return deadline.remaining() >= delay + self.min_attempt_seconds
+
+    def request_timeout_for(self, deadline: Deadline) -> float:
+        return deadline.timeout(self.request_timeout)
@@ -0,0 +1,90 @@
+"""TTL cache for generated scripts and their parsed documents"""
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from content_parser import ScriptDocument
+
+
+def normalize_topic(topic: str) -> str:
+    """Normalize a topic so case and whitespace variants share a cache entry"""
+    return re.sub(r'\s+', ' ', topic).strip().casefold()
+
+
+class ScriptCache:
+    """Bounded, thread-safe topic -> (script, parsed document) cache with a TTL.
+
+    Entries expire ``ttl`` seconds after they were stored; when the cache is
+    full the least recently used entry is dropped.
+    """
+
+    def __init__(self, ttl: float = 3600.0, max_entries: int = 512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, str, ScriptDocument]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, topic: str) -> Optional[Tuple[str, ScriptDocument]]:
+        """Return the cached script and its document for a topic, if still fresh"""
+        key = normalize_topic(topic)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def put(self, topic: str, content: str, document: ScriptDocument):
+        """Store a script and its parsed document"""
+        key = normalize_topic(topic)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, content, document)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters and size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+            }
+
+
+# Shared by every agent in the process, created on first use
+_script_cache = None
+_script_cache_lock = threading.Lock()
+
+
+def get_script_cache() -> Optional[ScriptCache]:
+    """Return the process-wide script cache, or None when caching is disabled"""
+    global _script_cache
+    if os.getenv('SCRIPT_CACHE_ENABLED', '1').lower() in ('0', 'false', 'no'):
+        return None
+    with _script_cache_lock:
+        if _script_cache is None:
+            _script_cache = ScriptCache(
+                ttl=float(os.getenv('SCRIPT_CACHE_TTL', '3600')),
+                max_entries=int(os.getenv('SCRIPT_CACHE_MAX_ENTRIES', '512')),
+            )
+        return _script_cache
@@ -0,0 +1,115 @@
+"""Sharing one run between identical jobs submitted while it is in flight"""
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from script_cache import normalize_topic
+
+
+class SingleFlight:
+    """Lets a job join an identical one that is already running instead of starting its own.
+
+    The first job for a topic leads: it runs, and its session ID names the
+    files. Jobs for the same normalized topic submitted before it finishes
+    follow it and get its progress and result under their own session IDs.
+    Any subscriber can leave; the run is only worth stopping once nobody,
+    the leader included, is still waiting for it.
+    """
+
+    def __init__(self):
+        self.coalesced = 0
+        self._leaders: Dict[str, str] = {}
+        self._flights: Dict[str, Dict] = {}
+        self._leader_of: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def join(self, topic: str, session_id: str, alive: Optional[Callable[[str], bool]] = None) -> Optional[str]:
+        """Follow the running job for ``topic`` and return its session ID, or lead a new run and return None.
+
+        ``alive(leader)`` is asked whether the running job is still worth
+        joining; one that was cancelled or abandoned is replaced by a new run.
+        """
+        key = normalize_topic(topic)
+        while True:
+            with self._lock:
+                leader = self._leaders.get(key)
+                if leader is None:
+                    self._leaders[key] = session_id
+                    self._flights[session_id] = {'key': key, 'followers': [], 'leader_left': None}
+                    return None
+            # Checked outside the lock, since it may read a shared job store
+            usable = alive is None or alive(leader)
+            with self._lock:
+                if self._leaders.get(key) != leader:
+                    continue
+                if not usable:
+                    del self._leaders[key]
+                    continue
+                self._flights[leader]['followers'].append(session_id)
+                self._leader_of[session_id] = leader
+                self.coalesced += 1
+                return leader
+
+    def followers(self, leader: str) -> List[str]:
+        """Return the sessions following a run"""
+        with self._lock:
+            flight = self._flights.get(leader)
+            return list(flight['followers']) if flight is not None else []
+
+    def leader_of(self, session_id: str) -> Optional[str]:
+        """Return the run a session belongs to: the leader's session ID, or None if it is not in a flight"""
+        with self._lock:
+            if session_id in self._flights:
+                return session_id
+            return self._leader_of.get(session_id)
+
+    def leave(self, session_id: str, reason: str = 'Cancelled by user') -> bool:
+        """Stop waiting for a run; True if other sessions still wait for it"""
+        with self._lock:
+            leader = session_id if session_id in self._flights else self._leader_of.pop(session_id, None)
+            if leader is None:
+                return False
+            flight = self._flights[leader]
+            if session_id == leader:
+                flight['leader_left'] = flight['leader_left'] or reason
+            else:
+                flight['followers'].remove(session_id)
+            waiting = bool(flight['followers']) or not flight['leader_left']
+            if not waiting and self._leaders.get(flight['key']) == leader:
+                # The run is about to be cancelled, so the next submission starts afresh
+                del self._leaders[flight['key']]
+            return waiting
+
+    def finish(self, leader: str) -> Tuple[List[str], Optional[str]]:
+        """End a run so new jobs start their own; returns its followers and why the leader left, if it did"""
+        with self._lock:
+            flight = self._flights.pop(leader, None)
+            if flight is None:
+                return [], None
+            if self._leaders.get(flight['key']) == leader:
+                del self._leaders[flight['key']]
+            for follower in flight['followers']:
+                self._leader_of.pop(follower, None)
+            return flight['followers'], flight['leader_left']
+
+    def stats(self) -> Dict[str, int]:
+        """Return the runs in flight, their followers and how many jobs joined a run so far"""
+        with self._lock:
+            return {
+                'in_flight': len(self._flights),
+                'followers': len(self._leader_of),
+                'coalesced': self.coalesced,
+            }
+
+
+# Shared by every request handled by this process, created on first use
+_single_flight = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    """Return the process-wide registry of runs that identical jobs can join"""
+    global _single_flight
+    with _single_flight_lock:
+        if _single_flight is None:
+            _single_flight = SingleFlight()
+        return _single_flight
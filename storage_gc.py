@@ -0,0 +1,227 @@
+"""Quota-driven cleanup of generated job files"""
+import heapq
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# The files a web job writes; the session ID ties them together
+_JOB_FILE_RE = re.compile(
+    r'^(?:content_(?P<content>.+)\.txt|document_(?P<document>.+)\.json'
+    r'|youtube_shorts_image_\d+_(?P<image>.+)\.(?:png|jpe?g|webp))$'
+)
+
+
+class _Job:
+    __slots__ = ('session_id', 'paths', 'bytes', 'last_used')
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.paths: List[str] = []
+        self.bytes = 0
+        self.last_used = 0.0
+
+
+class StorageCollector:
+    """Keeps the files jobs leave in ``root`` under a byte and file-count quota.
+
+    A job's files are removed together, least recently used first
+    (``policy='lru'``, by access or modification time) or oldest first
+    (``policy='age'``), until usage is back under ``low_water`` of both
+    quotas; with ``max_age`` set, older jobs go regardless. Only the top
+    level of ``root`` is scanned, so subdirectories such as the image cache,
+    which keeps its own quota, are never touched, and only files named like
+    job outputs are candidates. Jobs reported by ``live_jobs`` and jobs
+    younger than ``min_age`` are protected. Abandoned download temp files
+    are removed after ``min_age`` too.
+    """
+
+    def __init__(self, root: str, max_bytes: int = 512 * 1024 * 1024, max_files: int = 20000,
+                 policy: str = 'lru', max_age: Optional[float] = None, min_age: float = 600.0,
+                 low_water: float = 0.9, live_jobs: Optional[Callable[[], Iterable[str]]] = None,
+                 on_evict: Optional[Callable[[str], None]] = None):
+        if policy not in ('lru', 'age'):
+            raise ValueError(f"Unknown storage policy: {policy}")
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.policy = policy
+        self.max_age = max_age or None
+        self.min_age = min_age
+        self.low_water = low_water
+        self.live_jobs = live_jobs
+        self.on_evict = on_evict
+        self.runs = 0
+        self.evicted_jobs = 0
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self._usage: Optional[Dict[str, float]] = None
+        self._lock = threading.Lock()
+        self._run_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _scan(self, now: float) -> Tuple[Dict[str, _Job], List[str], int, int]:
+        """Group the job files in ``root`` by session; also return stale temp files and totals"""
+        jobs: Dict[str, _Job] = {}
+        stale: List[str] = []
+        total_bytes = 0
+        total_files = 0
+        try:
+            entries = os.scandir(self.root)
+        except FileNotFoundError:
+            return jobs, stale, 0, 0
+        with entries:
+            for entry in entries:
+                try:
+                    if not entry.is_file(follow_symlinks=False):
+                        continue
+                    stat = entry.stat(follow_symlinks=False)
+                except FileNotFoundError:
+                    continue
+                total_bytes += stat.st_size
+                total_files += 1
+                name = entry.name
+                if name.startswith('.'):
+                    if name.endswith('.tmp') and now - stat.st_mtime > self.min_age:
+                        stale.append(entry.path)
+                    continue
+                match = _JOB_FILE_RE.match(name)
+                if match is None:
+                    continue
+                session_id = match.group('content') or match.group('document') or match.group('image')
+                job = jobs.get(session_id)
+                if job is None:
+                    job = jobs[session_id] = _Job(session_id)
+                job.paths.append(entry.path)
+                job.bytes += stat.st_size
+                used = max(stat.st_atime, stat.st_mtime) if self.policy == 'lru' else stat.st_mtime
+                job.last_used = max(job.last_used, used)
+        return jobs, stale, total_bytes, total_files
+
+    def _remove(self, paths: Iterable[str]) -> Tuple[int, int]:
+        files = removed = 0
+        for path in paths:
+            try:
+                size = os.stat(path).st_size
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            files += 1
+            removed += size
+        return files, removed
+
+    def collect(self) -> Dict[str, float]:
+        """Scan once, delete what the quota and age limits require, and return the usage"""
+        with self._run_lock:
+            started = time.monotonic()
+            now = time.time()
+            jobs, stale, total_bytes, total_files = self._scan(now)
+            protected = set(self.live_jobs() if self.live_jobs is not None else ())
+
+            stale_files, stale_bytes = self._remove(stale)
+            total_files -= stale_files
+            total_bytes -= stale_bytes
+
+            # A heap keeps this O(n + k log n) for k evictions, rather than sorting every job
+            heap = [(job.last_used, job.session_id) for job in jobs.values()
+                    if job.session_id not in protected and now - job.last_used >= self.min_age]
+            heapq.heapify(heap)
+            target_bytes = self.max_bytes * self.low_water
+            target_files = self.max_files * self.low_water
+            over_quota = total_bytes > self.max_bytes or total_files > self.max_files
+            evicted = []
+            while heap:
+                last_used, session_id = heap[0]
+                expired = self.max_age is not None and now - last_used > self.max_age
+                if not expired and not (over_quota and (total_bytes > target_bytes or total_files > target_files)):
+                    break
+                heapq.heappop(heap)
+                files, removed = self._remove(jobs[session_id].paths)
+                total_files -= files
+                total_bytes -= removed
+                evicted.append((session_id, files, removed))
+
+            for session_id, _, _ in evicted:
+                if self.on_evict is not None:
+                    try:
+                        self.on_evict(session_id)
+                    except Exception as e:
+                        print(f"⚠️  Could not forget evicted job {session_id}: {e}")
+            if evicted:
+                print(f"🧹 Removed {len(evicted)} old jobs ({sum(e[2] for e in evicted) / 1e6:.1f} MB) "
+                      f"from {self.root}")
+
+            usage = {
+                'files': total_files,
+                'bytes': total_bytes,
+                'jobs': len(jobs) - len(evicted),
+                'protected_jobs': len(protected & set(jobs)),
+                'scan_seconds': round(time.monotonic() - started, 3),
+            }
+            with self._lock:
+                self.runs += 1
+                self.evicted_jobs += len(evicted)
+                self.evicted_files += sum(e[1] for e in evicted) + stale_files
+                self.evicted_bytes += sum(e[2] for e in evicted) + stale_bytes
+                self._usage = usage
+            return usage
+
+    def start(self, interval: float = 300.0):
+        """Collect every ``interval`` seconds on a background thread; does nothing if already running"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(interval,), name='storage-gc', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, interval: float):
+        while True:
+            try:
+                self.collect()
+            except Exception as e:
+                print(f"⚠️  Storage cleanup failed: {e}")
+            if self._stop.wait(interval):
+                return
+
+    def stats(self) -> Dict[str, float]:
+        """Return the usage found by the last run and what has been removed so far"""
+        with self._lock:
+            usage = dict(self._usage or {})
+            return dict(
+                usage,
+                max_bytes=self.max_bytes,
+                max_files=self.max_files,
+                runs=self.runs,
+                evicted_jobs=self.evicted_jobs,
+                evicted_files=self.evicted_files,
+                evicted_bytes=self.evicted_bytes,
+            )
+
+
+# Shared by every request handled by this process, created on first use
+_collector = None
+_collector_lock = threading.Lock()
+
+
+def get_storage_collector() -> Optional[StorageCollector]:
+    """Return the process-wide collector for ``static/generated``, or None when it is disabled"""
+    global _collector
+    if os.getenv('STORAGE_GC_ENABLED', '1').lower() in ('0', 'false', 'no'):
+        return None
+    with _collector_lock:
+        if _collector is None:
+            _collector = StorageCollector(
+                os.getenv('STORAGE_DIR', os.path.join('static', 'generated')),
+                max_bytes=int(os.getenv('STORAGE_MAX_BYTES', str(512 * 1024 * 1024))),
+                max_files=int(os.getenv('STORAGE_MAX_FILES', '20000')),
+                policy=os.getenv('STORAGE_POLICY', 'lru'),
+                max_age=float(os.getenv('STORAGE_MAX_AGE_SECONDS', '0')),
+                min_age=float(os.getenv('STORAGE_MIN_AGE_SECONDS', '600')),
+            )
+        return _collector
@@ -0,0 +1,265 @@
+"""Local stand-ins for external services used by the tests and benchmarks"""
+import base64
+import io
+import json
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Tuple
+
+from PIL import Image
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Speaks just enough SMTP (EHLO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA) for smtplib"""
+
+    def _reply(self, line: str):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+        self._reply('220 localhost fake SMTP ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').rstrip('\r\n')
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb == 'EHLO':
+                self._reply('250-localhost')
+                self._reply('250-AUTH PLAIN LOGIN')
+                self._reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self._reply('250 localhost')
+            elif verb == 'AUTH':
+                parts = command.split()
+                if parts[1].upper() == 'PLAIN':
+                    token = parts[2] if len(parts) > 2 else None
+                    if token is None:
+                        self._reply('334 ')
+                        token = self.rfile.readline().strip().decode('ascii')
+                    _, username, password = base64.b64decode(token).decode('utf-8').split('\0')
+                else:
+                    self._reply('334 VXNlcm5hbWU6')
+                    username = base64.b64decode(self.rfile.readline().strip()).decode('utf-8')
+                    self._reply('334 UGFzc3dvcmQ6')
+                    password = base64.b64decode(self.rfile.readline().strip()).decode('utf-8')
+                if sink.password is not None and password != sink.password:
+                    self._reply('535 5.7.8 Authentication failed')
+                    continue
+                with sink.lock:
+                    sink.logins.append(username)
+                self._reply('235 2.7.0 Authentication successful')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip().split()[0].strip('<>'), []
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip().strip('<>'))
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line == b'.\r\n':
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                with sink.lock:
+                    if sink.fail_next > 0:
+                        sink.fail_next -= 1
+                        self._reply('451 4.3.0 Try again later')
+                        continue
+                    if sink.drop_next > 0:
+                        sink.drop_next -= 1
+                        return  # Hang up without answering
+                    sink.messages.append({
+                        'sender': sender,
+                        'recipients': recipients,
+                        'data': b''.join(lines),
+                    })
+                self._reply('250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                sender, recipients = None, []
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+
+class _ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    """A local SMTP server that keeps every message it accepts.
+
+    ``fail_next`` answers that many messages with a 451, and ``drop_next``
+    hangs up on that many instead of answering, to exercise retries and
+    reconnects. Use it as a context manager; ``host`` and ``port`` say where
+    it listens.
+    """
+
+    def __init__(self, password: str = None):
+        self.password = password
+        self.lock = threading.Lock()
+        self.messages: List[Dict] = []
+        self.logins: List[str] = []
+        self.connections = 0
+        self.fail_next = 0
+        self.drop_next = 0
+        self._server = _ThreadingTCPServer(('127.0.0.1', 0), _SMTPHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def start(self) -> 'SMTPSink':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'SMTPSink':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def make_png(size: Tuple[int, int] = (256, 448), color: str = 'orange') -> bytes:
+    """Return the bytes of a solid-color PNG"""
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def make_script(topic: str, prompts: int = 3) -> str:
+    """Return a script in the format the agent asks the text model for"""
+    lines = [f'🧠 **VIDEO SCRIPT: Facts About {topic}**', '**HOOK (0-10 seconds):**', f'"Did you know this about {topic}?"']
+    for i in range(1, 6):
+        lines += [f'**FACT {i}:**', f'Fact {i} about {topic}.']
+    lines += ['**OUTRO:**', '"Follow for more!"', '🖼️ **AI IMAGE GENERATION PROMPTS:**']
+    lines += [f'[IMAGE_PROMPT: vertical shot {i} of {topic}, cinematic lighting]' for i in range(1, prompts + 1)]
+    lines += ['🎬 **YOUTUBE SHORTS TITLE:**', f'"{topic} Facts"', '📄 **VIDEO DESCRIPTION:**',
+              f'Five facts about {topic}.', '🏷️ **META TAGS / HASHTAGS:**', '#shorts #facts']
+    return '\n'.join(lines)
+
+
+class _InferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Dict[str, str] = None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        fake = self.server.fake
+        payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        outcome, delay = fake.draw()
+        if outcome == 'small' and 'parameters' in payload:
+            outcome = 'ok'
+        time.sleep(delay)
+        fake.count(outcome)
+
+        if outcome == 'loading':
+            body = json.dumps({'error': 'Model is loading', 'estimated_time': fake.estimated_time})
+            self._send(503, body.encode(), 'application/json')
+        elif outcome == 'rate_limited':
+            self._send(429, b'{"error": "Rate limit reached"}', 'application/json',
+                       {'Retry-After': str(fake.retry_after)})
+        elif 'parameters' in payload:
+            # Only the script call sends generation parameters
+            topic = payload.get('inputs', '').split('about:', 1)[-1].split('\n', 1)[0].strip() or 'topic'
+            body = json.dumps([{'generated_text': make_script(topic, fake.prompts_per_script)}])
+            self._send(200, body.encode('utf-8'), 'application/json')
+        elif outcome == 'small':
+            self._send(200, fake.small_image, 'image/png')
+        else:
+            self._send(200, fake.image, 'image/png')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeInferenceServer:
+    """A local stand-in for the Hugging Face inference API.
+
+    Every POST waits ``latency`` seconds plus up to ``jitter`` more, then is
+    answered, at the given rates, with a 503 carrying ``estimated_time``, a
+    429 with ``Retry-After``, or a ``small`` image below the agent's minimum
+    size. Everything else gets a script (requests with ``parameters``) or a
+    PNG. Outcomes are drawn from a seeded generator so runs are repeatable.
+    Point ``HF_API_BASE`` at ``base_url``.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, loading_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, small_rate: float = 0.0, estimated_time: float = 1.0,
+                 retry_after: int = 1, prompts_per_script: int = 3,
+                 image_size: Tuple[int, int] = (256, 448), seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.loading_rate = loading_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.small_rate = small_rate
+        self.estimated_time = estimated_time
+        self.retry_after = retry_after
+        self.prompts_per_script = prompts_per_script
+        self.image = make_png(image_size)
+        self.small_image = make_png((16, 16))
+        self.lock = threading.Lock()
+        self.responses: Dict[str, int] = {}
+        self._random = random.Random(seed)
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _InferenceHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self.host, self.port = self._server.server_address
+        self.base_url = f"http://{self.host}:{self.port}"
+        self._thread = None
+
+    def draw(self) -> Tuple[str, float]:
+        """Pick the next outcome and its delay"""
+        with self.lock:
+            roll = self._random.random()
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        for outcome, rate in (('loading', self.loading_rate), ('rate_limited', self.rate_limit_rate),
+                              ('small', self.small_rate)):
+            if roll < rate:
+                return outcome, delay
+            roll -= rate
+        return 'ok', delay
+
+    def count(self, outcome: str):
+        with self.lock:
+            self.responses[outcome] = self.responses.get(outcome, 0) + 1
+
+    def start(self) -> 'FakeInferenceServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeInferenceServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,200 @@
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+import threading
+import time
+import io
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import patch
+
+from PIL import Image
+
+from async_agent import AsyncAIContentAgent, AsyncRunner, close_async_session
+from model_router import get_model_router
+
+
+def _png_bytes() -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', (128, 224), 'orange').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+PNG_BYTES = _png_bytes()
+
+
+class _FakeInferenceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if 'loading' in self.path:
+            body = b'{"error": "Model is loading", "estimated_time": 42.0}'
+            self.send_response(503)
+            self.send_header('Content-Type', 'application/json')
+        elif 'oversized' in self.path:
+            # A valid image followed by padding, so only the size limit rejects it
+            body = PNG_BYTES + b'\0' * len(PNG_BYTES)
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+        elif 'corrupt' in self.path:
+            # Right signature, but cut off after the header
+            body = PNG_BYTES[:40]
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+        else:
+            body = PNG_BYTES
+            self.send_response(200)
+            self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AsyncAgentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        get_model_router().reset()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _FakeInferenceHandler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/models"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.agent = AsyncAIContentAgent()
+        self.agent.image_cache = None
+        self.agent.script_cache = None
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+        get_model_router().reset()
+
+    def _run(self, coro):
+        async def runner():
+            try:
+                return await coro
+            finally:
+                await close_async_session()
+        return asyncio.run(runner())
+
+    def test_generate_image_skips_loading_model(self):
+        """Test that a loading model is cooled down and the next model is used"""
+        self.agent.image_models = [f"{self.base_url}/loading", f"{self.base_url}/ready"]
+        filename = os.path.join(self.test_dir, 'image.png')
+
+        async def no_sleep(delay):
+            pass
+
+        with patch('asyncio.sleep', new=no_sleep):
+            self.assertTrue(self._run(self.agent.generate_image('a prompt', filename)))
+
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), PNG_BYTES)
+        self.assertGreater(get_model_router().next_available_in([f"{self.base_url}/loading"]), 40)
+
+    def test_generate_image_rejects_truncated_image(self):
+        """Test that a cut-off image is discarded and the next model fills the destination"""
+        self.agent.image_models = [f"{self.base_url}/corrupt", f"{self.base_url}/ready"]
+        filename = os.path.join(self.test_dir, 'image.png')
+
+        async def no_sleep(delay):
+            pass
+
+        with patch('asyncio.sleep', new=no_sleep):
+            self.assertTrue(self._run(self.agent.generate_image('a prompt', filename)))
+
+        self.assertLess(get_model_router().snapshot()['corrupt']['success_rate'], 1)
+        self.assertEqual(os.listdir(self.test_dir), ['image.png'])
+
+    def test_generate_image_skips_oversized_image(self):
+        """Test that a download over the size limit counts against its model and the next model is used"""
+        self.agent.image_models = [f"{self.base_url}/oversized", f"{self.base_url}/ready"]
+        self.agent.image_max_bytes = len(PNG_BYTES) + 100
+        filename = os.path.join(self.test_dir, 'image.png')
+
+        async def no_sleep(delay):
+            pass
+
+        with patch('asyncio.sleep', new=no_sleep):
+            self.assertTrue(self._run(self.agent.generate_image('a prompt', filename)))
+
+        with open(filename, 'rb') as f:
+            self.assertEqual(f.read(), PNG_BYTES)
+        self.assertLess(get_model_router().snapshot()['oversized']['success_rate'], 1)
+        self.assertEqual(os.listdir(self.test_dir), ['image.png'])
+
+    def test_text_generation_falls_back(self):
+        """Test that a failing text model yields the fallback script"""
+        self.agent.text_model_url = f"{self.base_url}/loading"
+        content = self._run(self.agent.generate_text_content('Volcanoes'))
+        self.assertIn('5 Interesting and Unknown Facts About Volcanoes', content)
+
+    def test_generate_images_concurrently_in_prompt_order(self):
+        """Test that the async image stage overlaps requests and keeps prompt order"""
+        self.agent.image_workers = 4
+        progress_updates = []
+        self.agent.update_progress = lambda progress, status: progress_updates.append(progress)
+
+        async def fake_generate_image(prompt, filename, deadline=None):
+            await asyncio.sleep(0.3 if prompt == 'p1' else 0.1)
+            return prompt != 'p3'
+
+        self.agent.generate_image = fake_generate_image
+
+        start = time.time()
+        files = self._run(self.agent.generate_images(['p1', 'p2', 'p3', 'p4'], ['f1', 'f2', 'f3', 'f4']))
+        self.assertLess(time.time() - start, 0.6)
+        self.assertEqual(files, ['f1', 'f2', 'f4'])
+        self.assertEqual(progress_updates[-1], 80)
+
+
+class AsyncRunnerTestCase(unittest.TestCase):
+
+    def test_many_jobs_share_one_thread(self):
+        """Test that hundreds of in-flight jobs run on a single engine thread"""
+        runner = AsyncRunner()
+        threads_before = threading.active_count()
+
+        async def job(i):
+            await asyncio.sleep(0.2)
+            return i
+
+        start = time.time()
+        futures = [runner.submit(job(i)) for i in range(300)]
+        self.assertLessEqual(threading.active_count(), threads_before + 1)
+        self.assertEqual([f.result(timeout=5) for f in futures], list(range(300)))
+        self.assertLess(time.time() - start, 2)
+        runner.stop()
+
+
+class AsyncEngineWebTestCase(unittest.TestCase):
+
+    def test_generate_runs_on_async_engine(self):
+        """Test that /generate hands jobs to the event loop when the async engine is selected"""
+        import app as web_app
+
+        async def fake_process_topic_web(agent, topic):
+            agent.update_progress(100, f"done {topic}")
+
+        client = web_app.app.test_client()
+        with patch.dict(os.environ, {'GENERATION_ENGINE': 'async'}), \
+                patch.object(web_app.AsyncWebAIAgent, 'process_topic_web', fake_process_topic_web):
+            response = client.post('/generate', json={'topic': 'Async Topic'})
+            self.assertEqual(response.status_code, 200)
+            session_id = response.get_json()['session_id']
+
+            for _ in range(50):
+                status = client.get(f'/status/{session_id}').get_json()
+                if status['progress'] == 100:
+                    break
+                time.sleep(0.05)
+        self.assertEqual(status['status'], 'done Async Topic')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from batch import BatchCheckpoint, BatchRunner, read_topics
+from job_queue import JobQueue
+
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(self.test_dir, 'checkpoint.jsonl')
+        self.queue = JobQueue(workers=4, max_queued=2)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+        self.ran = []
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _job(self, topic):
+        with self.lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+            self.ran.append(topic)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        if topic == 'broken':
+            return {'success': False, 'error': 'Model exploded'}
+        return {'success': True, 'image_files': ['a.png', 'b.png']}
+
+    def _runner(self, items, concurrency=2):
+        return BatchRunner(
+            'nightly', items, self.checkpoint,
+            lambda session_id, topic: lambda: self.queue.run_call(self._job, topic),
+            self.queue, concurrency=concurrency,
+            summary_path=os.path.join(self.test_dir, 'summary.json'),
+        )
+
+    def test_read_topics(self):
+        """Test that JSONL lines may be objects or strings and duplicates run once"""
+        items = read_topics(['{"topic": "Bees"}', '', '"Volcanoes"', '{"topic": " bees "}',
+                             '{"topic": "Bees", "id": "bees-2"}'])
+        self.assertEqual([item['topic'] for item in items], ['Bees', 'Volcanoes', 'Bees'])
+        self.assertEqual(items[2]['id'], 'bees-2')
+        with self.assertRaises(ValueError):
+            read_topics(['{"title": "no topic"}'])
+        with self.assertRaises(ValueError):
+            read_topics(['not json'])
+
+    def test_runs_all_topics_within_concurrency(self):
+        """Test that every topic runs, failures are recorded and concurrency is capped"""
+        items = read_topics([json.dumps(f'Topic {i}') for i in range(20)] + ['"broken"'])
+        summary = self._runner(items, concurrency=3).run()
+
+        self.assertEqual(len(self.ran), 21)
+        self.assertLessEqual(self.peak, 3)
+        self.assertEqual((summary['done'], summary['failed'], summary['pending']), (20, 1, 0))
+        self.assertEqual(summary['images'], 40)
+        self.assertEqual(summary['state'], 'finished')
+        self.assertGreater(summary['topics_per_minute'], 0)
+
+        records = BatchCheckpoint(self.checkpoint).load()
+        self.assertEqual(records['broken']['error'], 'Model exploded')
+        with open(os.path.join(self.test_dir, 'summary.json'), encoding='utf-8') as f:
+            self.assertEqual(json.load(f)['done'], 20)
+
+    def test_resume_skips_finished_topics(self):
+        """Test that a rerun only repeats topics that failed or never finished"""
+        items = read_topics(['"One"', '"Two"', '"broken"', '"Three"'])
+        checkpoint = BatchCheckpoint(self.checkpoint)
+        checkpoint.record({'id': 'one', 'status': 'done', 'images': 2})
+        checkpoint.record({'id': 'broken', 'status': 'failed'})
+        with open(self.checkpoint, 'a', encoding='utf-8') as f:
+            f.write('{"id": "two", "sta')  # Cut short by a crash
+
+        summary = self._runner(items).run()
+
+        self.assertEqual(sorted(self.ran), ['Three', 'Two', 'broken'])
+        self.assertEqual(summary['skipped'], 1)
+        self.assertEqual((summary['done'], summary['failed']), (3, 1))
+
+    def test_cli_batch_mode(self):
+        """Test that the CLI batch mode checkpoints next to the topics file"""
+        import ai_agent
+
+        topics_path = os.path.join(self.test_dir, 'topics.jsonl')
+        with open(topics_path, 'w', encoding='utf-8') as f:
+            f.write('"Bees"\n"Volcanoes"\n')
+
+        agent = ai_agent.AIContentAgent()
+        with patch.object(ai_agent, 'get_job_queue', return_value=self.queue), \
+                patch.object(agent, 'process_topic', self._job):
+            summary = ai_agent.run_batch(agent, topics_path)
+
+        self.assertEqual(summary['done'], 2)
+        self.assertEqual(len(BatchCheckpoint(os.path.join(self.test_dir, 'topics.checkpoint.jsonl')).load()), 2)
+        self.assertTrue(os.path.exists(os.path.join(self.test_dir, 'topics.summary.json')))
+
+    def test_batch_endpoint_runs_and_resumes(self):
+        """Test that /generate/batch runs a JSONL upload and resumes by batch_id"""
+        import app as web_app
+
+        client = web_app.app.test_client()
+        body = '\n'.join(json.dumps({'topic': f'Topic {i}'}) for i in range(5))
+        with patch.dict(os.environ, {'BATCH_DIR': self.test_dir}), \
+                patch.object(web_app, 'get_job_queue', return_value=self.queue), \
+                patch.object(web_app.WebAIAgent, 'process_topic_web',
+                             lambda agent, topic: self._job(topic)):
+            response = client.post('/generate/batch?batch_id=nightly', data=body,
+                                   content_type='application/x-ndjson')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.get_json()['total'], 5)
+
+            for _ in range(200):
+                summary = client.get('/batch/nightly').get_json()
+                if summary['state'] == 'finished':
+                    break
+                time.sleep(0.02)
+            self.assertEqual(summary['done'], 5)
+
+            resumed = client.post('/generate/batch', json={'batch_id': 'nightly'})
+            self.assertEqual(resumed.status_code, 202)
+            for _ in range(200):
+                summary = client.get('/batch/nightly').get_json()
+                if summary['state'] == 'finished':
+                    break
+                time.sleep(0.02)
+            self.assertEqual(summary['skipped'], 5)
+            self.assertEqual(len(self.ran), 5)
+
+            self.assertEqual(client.post('/generate/batch', json={}).status_code, 400)
+            self.assertEqual(client.get('/batch/unknown').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+import json
+import os
+import sys
+from unittest.mock import patch
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from bench_pipeline import compare, percentile, run_benchmark
+from fakes import FakeInferenceServer
+
+
+class FakeInferenceServerTestCase(unittest.TestCase):
+
+    def test_injects_configured_failures(self):
+        """Test that 503 and 429 answers carry the hints the agent reads"""
+        with FakeInferenceServer(loading_rate=0.5, rate_limit_rate=0.5, estimated_time=7) as fake:
+            statuses = set()
+            for _ in range(20):
+                response = requests.post(f'{fake.base_url}/models/org/model', json={'inputs': 'x'})
+                statuses.add(response.status_code)
+                if response.status_code == 503:
+                    self.assertEqual(response.json()['estimated_time'], 7)
+                else:
+                    self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(statuses, {503, 429})
+
+    def test_text_and_image_responses(self):
+        """Test that script calls get a parsable script and image calls get a PNG"""
+        with FakeInferenceServer(prompts_per_script=2) as fake:
+            text = requests.post(f'{fake.base_url}/models/text', json={
+                'inputs': 'Create comprehensive content about: Mars\n', 'parameters': {}})
+            image = requests.post(f'{fake.base_url}/models/image', json={'inputs': 'a rocket'})
+
+        script = text.json()[0]['generated_text']
+        self.assertIn('Facts About Mars', script)
+        self.assertEqual(script.count('[IMAGE_PROMPT:'), 2)
+        self.assertTrue(image.content.startswith(b'\x89PNG'))
+
+    def test_agent_uses_api_base(self):
+        """Test that HF_API_BASE redirects every model URL"""
+        from ai_agent import AIContentAgent
+        with patch.dict(os.environ, {'HF_API_BASE': 'http://127.0.0.1:9/'}):
+            agent = AIContentAgent()
+        self.assertTrue(agent.text_model_url.startswith('http://127.0.0.1:9/models/'))
+        self.assertTrue(all(url.startswith('http://127.0.0.1:9/models/') for url in agent.image_models))
+
+
+class PipelineBenchmarkTestCase(unittest.TestCase):
+
+    def test_every_mode_completes(self):
+        """Test that a small run drives each entry point and reports every stage"""
+        with FakeInferenceServer() as fake, patch.dict(os.environ, {'HF_RATE_LIMIT': '0'}):
+            results = run_benchmark(['cli', 'web', 'http'], [2], 2, fake)
+
+        by_mode = {result['mode']: result for result in results}
+        for mode in ('cli', 'web', 'http'):
+            self.assertEqual(by_mode[mode]['succeeded'], 2)
+            self.assertGreater(by_mode[mode]['jobs_per_minute'], 0)
+            self.assertEqual(by_mode[mode]['stages']['job']['count'], 2)
+        self.assertEqual(by_mode['cli']['stages']['email_delivery']['count'], 2)
+        self.assertIn('save', by_mode['web']['stages'])
+        self.assertIn('download', by_mode['http']['stages'])
+        json.dumps(results)
+
+    def test_compare_flags_regressions(self):
+        """Test that throughput drops and p95 rises beyond the tolerance are reported"""
+        baseline = [{'mode': 'web', 'concurrency': 1, 'jobs_per_minute': 100,
+                     'stages': {'job': {'p95_ms': 100}}}]
+        slower = [{'mode': 'web', 'concurrency': 1, 'jobs_per_minute': 70,
+                   'stages': {'job': {'p95_ms': 130}}}]
+        self.assertEqual(len(compare(slower, baseline, 0.2)), 2)
+        self.assertEqual(compare(slower, baseline, 0.5), [])
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles"""
+        samples = list(range(1, 101))
+        self.assertEqual(percentile(samples, 50), 50)
+        self.assertEqual(percentile(samples, 99), 99)
+        self.assertEqual(percentile([3.0], 95), 3.0)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
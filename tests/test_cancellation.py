@@ -0,0 +1,177 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from app import app, AsyncWebAIAgent, WebAIAgent
+from async_agent import AsyncRunner
+from cancellation import CancelToken, JobCancelled
+from fakes import FakeInferenceServer
+from job_store import JobStore, get_job_store
+from model_router import get_model_router
+
+
+class CancelTokenTestCase(unittest.TestCase):
+
+    def test_cancel_runs_callbacks_once(self):
+        """Test that callbacks run on the first cancel only and late ones run at once"""
+        token = CancelToken()
+        calls = []
+        token.on_cancel(lambda: calls.append('early'))
+        unregister = token.on_cancel(lambda: calls.append('removed'))
+        unregister()
+
+        self.assertTrue(token.cancel('stop'))
+        self.assertFalse(token.cancel('again'))
+        token.on_cancel(lambda: calls.append('late'))
+        self.assertEqual(calls, ['early', 'late'])
+        self.assertEqual(token.reason, 'stop')
+        with self.assertRaises(JobCancelled):
+            token.raise_if_cancelled()
+
+    def test_wait_wakes_on_cancel(self):
+        """Test that a backoff wait ends as soon as the token is cancelled"""
+        token = CancelToken()
+        threading.Timer(0.1, token.cancel).start()
+        started = time.monotonic()
+        self.assertTrue(token.wait(10))
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertFalse(CancelToken().wait(0.01))
+
+    def test_check_cancels_token(self):
+        """Test that an external flag cancels the token when it is checked"""
+        flag = []
+        token = CancelToken(lambda: flag[0] if flag else None, poll_interval=0.01)
+        self.assertFalse(token.cancelled)
+        flag.append('flagged')
+        self.assertTrue(token.wait(1))
+        self.assertEqual(token.reason, 'flagged')
+
+
+class JobStoreCancelTestCase(unittest.TestCase):
+
+    def test_cancel_reaches_token(self):
+        """Test that cancelling a running job cancels its token, but not a finished one"""
+        store = JobStore()
+        store.create('a')
+        token = store.cancel_token('a')
+        self.assertTrue(store.cancel('a', 'User left'))
+        self.assertFalse(store.cancel('a'))
+        self.assertEqual(token.reason, 'User left')
+
+        store.create('b')
+        store.set_result('b', {'success': True})
+        self.assertFalse(store.cancel('b'))
+        self.assertFalse(store.cancel('missing'))
+        self.assertEqual(store.stats()['cancellations'], 1)
+
+    def test_unpolled_jobs_are_abandoned(self):
+        """Test that a watched job nobody polls is cancelled, while unwatched ones keep running"""
+        store = JobStore(abandon_after=0.05)
+        store.create('watched')
+        store.seen('watched')
+        store.create('batch_item')
+        watched, unwatched = store.cancel_token('watched'), store.cancel_token('batch_item')
+
+        self.assertFalse(watched.cancelled)
+        time.sleep(0.1)
+        self.assertTrue(watched.cancelled)
+        self.assertIn('Abandoned', watched.reason)
+        self.assertFalse(unwatched.cancelled)
+
+        self.assertFalse(JobStore(abandon_after=0).abandon_after)
+
+
+class CancelEndpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        get_model_router().reset()
+        self.client = app.test_client()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+        get_model_router().reset()
+
+    def test_cancel_endpoint(self):
+        """Test the responses for unknown, running and finished jobs"""
+        store = get_job_store()
+        session_id = store.new_id()
+        store.create(session_id, topic='Cancel')
+        self.assertEqual(self.client.post('/cancel/unknown').status_code, 404)
+        self.assertEqual(self.client.post(f'/cancel/{session_id}').status_code, 202)
+
+        WebAIAgent(session_id).process_topic_web('Cancel')
+        response = self.client.get(f'/result/{session_id}')
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(response.get_json()['cancelled'])
+        self.assertEqual(self.client.post(f'/cancel/{session_id}').status_code, 409)
+        store.delete(session_id)
+
+    def test_cancelled_job_skips_images(self):
+        """Test that a job cancelled while its script is generated makes no image calls"""
+        with FakeInferenceServer(latency=0.5, prompts_per_script=3) as fake, \
+                patch.dict(os.environ, {'HF_API_BASE': fake.base_url, 'HUGGING_FACE_TOKEN': 'test'}):
+            store = get_job_store()
+            session_id = store.new_id()
+            store.create(session_id, topic='Slow')
+            agent = WebAIAgent(session_id)
+            agent.image_cache = None
+            agent.script_cache = None
+            threading.Timer(0.2, store.cancel, (session_id,)).start()
+
+            result = agent.process_topic_web('Slow')
+            self.assertTrue(result['cancelled'])
+            self.assertEqual(sum(fake.responses.values()), 1)
+            self.assertFalse(os.path.exists('static/generated'))
+            store.delete(session_id)
+
+    def test_thread_job_aborts_request_waiting_for_model(self):
+        """Test that cancelling interrupts a blocking request before the model answers, without blaming it"""
+        with FakeInferenceServer(latency=5) as fake, \
+                patch.dict(os.environ, {'HF_API_BASE': fake.base_url, 'HUGGING_FACE_TOKEN': 'test'}):
+            agent = WebAIAgent('gen_abort')
+            agent.image_cache = None
+            agent.cancel_token = CancelToken()
+            threading.Timer(0.3, agent.cancel_token.cancel).start()
+
+            started = time.monotonic()
+            self.assertFalse(agent.generate_image('A slow prompt', 'static/generated/abort.png'))
+            self.assertLess(time.monotonic() - started, 2)
+            snapshot = get_model_router().snapshot()
+            self.assertFalse(any(stats['attempts'] for stats in snapshot.values()), snapshot)
+
+    def test_async_job_aborts_in_flight_request(self):
+        """Test that cancelling an async job interrupts the request it is waiting on"""
+        runner = AsyncRunner()
+        with FakeInferenceServer(latency=5) as fake, \
+                patch.dict(os.environ, {'HF_API_BASE': fake.base_url, 'HUGGING_FACE_TOKEN': 'test'}):
+            store = get_job_store()
+            session_id = store.new_id()
+            store.create(session_id, topic='Stuck')
+            agent = AsyncWebAIAgent(session_id)
+            agent.image_cache = None
+            agent.script_cache = None
+            future = runner.submit(agent.process_topic_web('Stuck'))
+            time.sleep(0.3)
+
+            started = time.monotonic()
+            store.cancel(session_id)
+            try:
+                future.result(timeout=3)
+            except Exception:
+                pass
+            self.assertLess(time.monotonic() - started, 2)
+            self.assertTrue(store.get_result(session_id)['cancelled'])
+            store.delete(session_id)
+        runner.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
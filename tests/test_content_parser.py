@@ -0,0 +1,125 @@
+import unittest
+import io
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest.mock import patch
+
+from ai_agent import AIContentAgent
+from app import app, WebAIAgent
+from content_parser import ScriptDocument, as_document, parse_script
+from job_store import get_job_store
+
+
+class ContentParserTestCase(unittest.TestCase):
+
+    def setUp(self):
+        with patch.dict(os.environ, {'HUGGING_FACE_TOKEN': 'test_token'}):
+            self.agent = AIContentAgent()
+        self.content = self.agent.generate_fallback_content('Black Holes')
+
+    def test_fallback_script_parts(self):
+        """Test that every part of the fallback script lands in its field"""
+        document = parse_script(self.content)
+
+        self.assertTrue(document.hook.startswith('You think you know Black Holes?'))
+        self.assertEqual(len(document.facts), 5)
+        self.assertTrue(document.facts[0].startswith('Did you know that Black Holes'))
+        self.assertTrue(document.outro.startswith('Which fact shocked you the most?'))
+        self.assertEqual(len(document.image_prompts), 7)
+        self.assertEqual(document.title, '5 SHOCKING BLACK HOLES Facts That Will Blow Your Mind! 🤯')
+        self.assertIn('Follow for more mind-blowing facts', document.description)
+        self.assertEqual(document.hashtags[:2], ('#shorts', '#blackholesfacts'))
+
+    def test_script_text_drops_prompts_and_later_sections(self):
+        """Test that the display script stops at the title and has no image prompts"""
+        document = parse_script(self.content)
+
+        self.assertIn('**FACT 3:**', document.script)
+        self.assertNotIn('IMAGE_PROMPT', document.script)
+        self.assertNotIn('YOUTUBE SHORTS TITLE', document.script)
+        self.assertNotIn('#shorts', document.script)
+
+    def test_prompts_match_legacy_extraction(self):
+        """Test that prompts are found anywhere, case-insensitively, in order"""
+        content = "Intro [image_prompt: first]\n🎬 Title\n\"T\"\n[IMAGE_PROMPT:second] and [IMAGE_PROMPT: third]"
+        self.assertEqual(parse_script(content).image_prompts, ('first', 'second', 'third'))
+        self.assertEqual(self.agent.extract_image_prompts(content), ['first', 'second', 'third'])
+
+    def test_heading_text_on_same_line(self):
+        """Test that text after a heading's colon belongs to that part"""
+        document = parse_script("**HOOK:** Look up!\n**FACT 1:** Stars burn.\nThey also die.\n**OUTRO:** Bye")
+
+        self.assertEqual(document.hook, 'Look up!')
+        self.assertEqual(document.facts, ('Stars burn.\nThey also die.',))
+        self.assertEqual(document.outro, 'Bye')
+
+    def test_unstructured_text(self):
+        """Test that free text without markers only fills the script"""
+        document = parse_script('Just a paragraph.\n\nAnother one.')
+
+        self.assertEqual(document.script, 'Just a paragraph.\nAnother one.')
+        self.assertEqual((document.hook, document.facts, document.title), ('', (), ''))
+        self.assertEqual(parse_script(''), ScriptDocument())
+
+    def test_as_document_reuses_parsed_documents(self):
+        """Test that an already parsed document is passed through, not parsed again"""
+        document = parse_script(self.content)
+        with patch('content_parser.parse_script') as mock_parse:
+            self.assertIs(as_document(document), document)
+            mock_parse.assert_not_called()
+
+    def test_to_dict_is_json_serializable(self):
+        """Test that the document round-trips through JSON"""
+        data = json.loads(json.dumps(parse_script(self.content).to_dict()))
+        self.assertEqual(len(data['facts']), 5)
+        self.assertEqual(data['hashtags'][0], '#shorts')
+
+    def test_html_uses_parsed_sections(self):
+        """Test that the email HTML shows the document's sections"""
+        html = self.agent.create_html_content('Black Holes', parse_script(self.content), [])
+
+        self.assertIn('5 SHOCKING BLACK HOLES Facts', html)
+        self.assertIn('#blackholesfacts', html)
+        self.assertNotIn('IMAGE_PROMPT', html)
+
+
+class ResultDocumentTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        os.makedirs('static/generated')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_result_and_download_include_document(self):
+        """Test that the stored document is served by /result and packed into the ZIP"""
+        store = get_job_store()
+        session_id = store.new_id()
+        store.create(session_id, topic='Space')
+        content = 'Intro\n🎬 TITLE\n"Space!"\n🏷️ HASHTAGS\n#space'
+
+        agent = WebAIAgent(session_id)
+        agent._store_result('Space', content, parse_script(content), [])
+
+        client = app.test_client()
+        data = client.get(f'/result/{session_id}').get_json()
+        self.assertEqual(data['document']['title'], 'Space!')
+        self.assertEqual(data['document']['hashtags'], ['#space'])
+
+        response = client.get(f'/download/{session_id}')
+        with zipfile.ZipFile(io.BytesIO(response.data)) as zf:
+            self.assertEqual(zf.namelist(), ['Space_content.txt', 'Space_metadata.json'])
+            self.assertEqual(json.loads(zf.read('Space_metadata.json'))['title'], 'Space!')
+
+        store.delete(session_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import unittest
+import asyncio
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import MagicMock, patch
+
+import hf_client
+from hf_client import TokenBucket
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        body = b'[{"generated_text": "ok"}]'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HFClientTestCase(unittest.TestCase):
+
+    def setUp(self):
+        hf_client.reset_http_session()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _KeepAliveHandler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/models/test"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        hf_client.reset_http_session()
+
+    def test_session_is_shared(self):
+        """Test that every caller gets the same pooled session"""
+        self.assertIs(hf_client.get_http_session(), hf_client.get_http_session())
+
+    def test_connections_are_reused(self):
+        """Test that sequential calls reuse one keep-alive connection"""
+        session = hf_client.get_http_session()
+        for _ in range(3):
+            response = session.post(self.url, json={'inputs': 'x'}, timeout=5)
+            self.assertEqual(response.status_code, 200)
+
+        stats = hf_client.get_connection_stats()
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['new_connections'], 1)
+        self.assertEqual(stats['reused_connections'], 2)
+        self.assertAlmostEqual(stats['reuse_ratio'], 0.667)
+
+    def test_headers_built_once_per_token(self):
+        """Test that authorization headers are cached per token"""
+        headers = hf_client.get_hf_headers('hf_test')
+        self.assertEqual(headers['Authorization'], 'Bearer hf_test')
+        self.assertIs(headers, hf_client.get_hf_headers('hf_test'))
+
+
+
+class TokenBucketTestCase(unittest.TestCase):
+
+    def setUp(self):
+        hf_client.reset_rate_limits()
+
+    def tearDown(self):
+        hf_client.reset_rate_limits()
+
+    def test_burst_then_paced(self):
+        """Test that calls past the burst are spaced at the configured rate"""
+        bucket = TokenBucket(rate=10, burst=2)
+        waits = [bucket.reserve() for _ in range(4)]
+
+        self.assertEqual(waits[:2], [0.0, 0.0])
+        self.assertAlmostEqual(waits[2], 0.1, delta=0.02)
+        self.assertAlmostEqual(waits[3], 0.2, delta=0.02)
+
+    def test_max_wait_leaves_token(self):
+        """Test that a caller unwilling to wait does not take a place in line"""
+        bucket = TokenBucket(rate=1, burst=1)
+        self.assertEqual(bucket.reserve(max_wait=0.01), 0.0)
+        self.assertIsNone(bucket.reserve(max_wait=0.5))
+        self.assertAlmostEqual(bucket.reserve(max_wait=2), 1.0, delta=0.05)
+
+    def test_no_budget_takes_no_token(self):
+        """Test that a caller with no time left is refused even when a token is free"""
+        bucket = TokenBucket(rate=1, burst=1)
+        self.assertIsNone(bucket.reserve(max_wait=0))
+        self.assertIsNone(bucket.reserve(max_wait=-3))
+        self.assertEqual(bucket.tokens, 1)
+        self.assertEqual(bucket.reserve(max_wait=1), 0.0)
+
+    def test_rate_limit_slows_down_and_recovers(self):
+        """Test that a 429 halves the rate and honors Retry-After, and successes win it back"""
+        bucket = TokenBucket(rate=4, burst=4, recovery=0.25)
+        bucket.record_rate_limited(retry_after=3)
+
+        self.assertEqual(bucket.rate, 2)
+        self.assertGreaterEqual(bucket.reserve(), 2.9)
+        bucket.record_success()
+        bucket.record_success()
+        bucket.record_success()
+        self.assertEqual(bucket.rate, 4)
+
+    def test_rate_never_drops_below_minimum(self):
+        """Test that repeated 429s stop at the minimum rate"""
+        bucket = TokenBucket(rate=1, burst=1, min_rate=0.2)
+        for _ in range(10):
+            bucket.record_rate_limited()
+        self.assertEqual(bucket.rate, 0.2)
+
+    def test_buckets_per_token_and_model(self):
+        """Test that buckets are shared per token and model, and can be turned off"""
+        with patch.dict(os.environ, {'HF_RATE_LIMIT': '2', 'HF_RATE_BURST': '1'}):
+            bucket = hf_client.get_token_bucket('token-a', 'https://x/models/m1')
+            self.assertIs(hf_client.get_token_bucket('token-a', 'https://x/models/m1'), bucket)
+            self.assertIsNot(hf_client.get_token_bucket('token-b', 'https://x/models/m1'), bucket)
+            self.assertIsNot(hf_client.get_token_bucket('token-a', 'https://x/models/m2'), bucket)
+            self.assertEqual(bucket.max_rate, 2)
+            self.assertIn('m1@', next(iter(hf_client.rate_limit_stats())))
+        with patch.dict(os.environ, {'HF_RATE_LIMIT': '0'}):
+            self.assertIsNone(hf_client.get_token_bucket('token-a', 'https://x/models/m1'))
+
+    def test_acquire_sync_and_async(self):
+        """Test that both acquire paths sleep for their turn and give up past max_wait"""
+        with patch.dict(os.environ, {'HF_RATE_LIMIT': '20', 'HF_RATE_BURST': '1'}):
+            started = time.monotonic()
+            self.assertTrue(hf_client.acquire_hf_slot('t', 'm'))
+            self.assertTrue(hf_client.acquire_hf_slot('t', 'm'))
+            self.assertGreaterEqual(time.monotonic() - started, 0.04)
+            self.assertTrue(asyncio.run(hf_client.acquire_hf_slot_async('t', 'm')))
+            hf_client.record_hf_response('t', 'm', 429, retry_after=60)
+            self.assertFalse(hf_client.acquire_hf_slot('t', 'm', max_wait=1))
+            self.assertFalse(asyncio.run(hf_client.acquire_hf_slot_async('t', 'm', max_wait=1)))
+
+    @patch('requests.Session.post')
+    def test_agent_skips_model_over_budget(self, mock_post):
+        """Test that a model whose bucket is held back is skipped without a request"""
+        from ai_agent import AIContentAgent
+        from model_router import get_model_router
+
+        get_model_router().reset()
+        with patch.dict(os.environ, {'HUGGING_FACE_TOKEN': 'budget-token', 'HF_RATE_MAX_WAIT': '1'}):
+            agent = AIContentAgent()
+            agent.image_cache = None
+            agent.image_models = ['https://x/models/held', 'https://x/models/free']
+            hf_client.record_hf_response('budget-token', 'https://x/models/held', 429, retry_after=60)
+            mock_post.return_value = MagicMock(status_code=500, headers={})
+            mock_post.return_value.json.return_value = {}
+            with patch('time.sleep'):
+                agent.generate_image('a rocket', 'unused.png')
+
+        called = [call.args[0] for call in mock_post.call_args_list]
+        self.assertEqual(called, ['https://x/models/free'])
+        get_model_router().reset()
+
+    @patch('requests.Session.post')
+    def test_agent_without_time_left_makes_no_request(self, mock_post):
+        """Test that an attempt whose deadline leaves no time for a request is skipped"""
+        from ai_agent import AIContentAgent
+        from retry_policy import Deadline
+
+        with patch.dict(os.environ, {'HUGGING_FACE_TOKEN': 'late-token'}):
+            agent = AIContentAgent()
+            agent.image_cache = None
+            # As if the time ran out between the deadline check and the attempt
+            with patch.object(agent.retry_policy, 'has_time', return_value=True):
+                self.assertFalse(agent.generate_image('a rocket', 'unused.png', Deadline(0)))
+        mock_post.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
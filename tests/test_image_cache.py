@@ -0,0 +1,114 @@
+import unittest
+import io
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch, MagicMock
+
+from PIL import Image
+
+from image_cache import ImageCache, normalize_prompt
+from model_router import get_model_router
+
+MODEL_A = "https://api-inference.huggingface.co/models/org/model-a"
+MODEL_B = "https://api-inference.huggingface.co/models/org/model-b"
+
+
+class ImageCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache = ImageCache(os.path.join(self.test_dir, 'cache'), max_bytes=3000)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _write(self, name, size):
+        path = os.path.join(self.test_dir, name)
+        with open(path, 'wb') as f:
+            f.write(os.urandom(size))
+        return path
+
+    def test_prompt_normalization(self):
+        """Test that case and whitespace variants share a key"""
+        self.assertEqual(normalize_prompt('  A  Cat\n on a Mat '), 'a cat on a mat')
+        self.assertEqual(ImageCache.make_key('A cat', MODEL_A), ImageCache.make_key('a   CAT', MODEL_A))
+        self.assertNotEqual(ImageCache.make_key('A cat', MODEL_A), ImageCache.make_key('A cat', MODEL_B))
+
+    def test_store_and_fetch(self):
+        """Test that a stored image is returned for any listed model"""
+        source = self._write('source.png', 1200)
+        self.cache.store('A cat', MODEL_B, source)
+
+        destination = os.path.join(self.test_dir, 'out.png')
+        self.assertEqual(self.cache.fetch('a cat', [MODEL_A, MODEL_B], destination), MODEL_B)
+        with open(source, 'rb') as a, open(destination, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+        self.assertIsNone(self.cache.fetch('a dog', [MODEL_A, MODEL_B], destination))
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['entries'], 1)
+        self.assertEqual(stats['bytes'], 1200)
+
+    def test_lru_eviction(self):
+        """Test that the least recently used entries are evicted over quota"""
+        for i, prompt in enumerate(['one', 'two']):
+            self.cache.store(prompt, MODEL_A, self._write(f'{prompt}.png', 1200))
+            os.utime(self.cache._path(ImageCache.make_key(prompt, MODEL_A)), (1000 + i, 1000 + i))
+
+        # Touch 'one' so 'two' becomes the oldest entry
+        self.cache.fetch('one', [MODEL_A], os.path.join(self.test_dir, 'hit.png'))
+        self.cache.store('three', MODEL_A, self._write('three.png', 1200))
+
+        destination = os.path.join(self.test_dir, 'out.png')
+        self.assertIsNone(self.cache.fetch('two', [MODEL_A], destination))
+        self.assertEqual(self.cache.fetch('one', [MODEL_A], destination), MODEL_A)
+        self.assertEqual(self.cache.fetch('three', [MODEL_A], destination), MODEL_A)
+        self.assertLessEqual(self.cache.stats()['bytes'], 3000)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+
+class AgentImageCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        get_model_router().reset()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+        get_model_router().reset()
+
+    @patch('requests.Session.post')
+    def test_repeat_prompt_skips_api(self, mock_post):
+        """Test that a repeated prompt is served from the cache"""
+        from ai_agent import AIContentAgent
+
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.headers = {'content-type': 'image/png'}
+        png = io.BytesIO()
+        Image.new('RGB', (128, 224), 'navy').save(png, 'PNG')
+        mock_response.iter_content.return_value = [png.getvalue()]
+        mock_post.return_value = mock_response
+
+        agent = AIContentAgent()
+        agent.image_models = [MODEL_A]
+        agent.image_cache = ImageCache(os.path.join(self.test_dir, 'cache'))
+
+        first = os.path.join(self.test_dir, 'first.png')
+        second = os.path.join(self.test_dir, 'second.png')
+        self.assertTrue(agent.generate_image('A cat', first))
+        started = time.monotonic()
+        self.assertTrue(agent.generate_image('a cat ', second))
+        self.assertLess(time.monotonic() - started, 0.5)
+
+        self.assertEqual(mock_post.call_count, 1)
+        with open(first, 'rb') as a, open(second, 'rb') as b:
+            self.assertEqual(a.read(), b.read())
+
+
+if __name__ == '__main__':
+    unittest.main()
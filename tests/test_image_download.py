@@ -0,0 +1,73 @@
+import unittest
+import io
+import os
+import shutil
+import tempfile
+
+from PIL import Image
+
+from image_download import AtomicImageWriter, ImageTooLargeError, sniff_image_format, validate_image
+
+
+def _image_bytes(image_format: str, size=(128, 224)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'teal').save(buffer, image_format)
+    return buffer.getvalue()
+
+
+class ImageDownloadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.dest = os.path.join(self.test_dir, 'image.png')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _download(self, data: bytes, chunk_size: int = 1000, **kwargs):
+        with AtomicImageWriter(self.dest, **kwargs) as writer:
+            for start in range(0, len(data), chunk_size):
+                writer.write(data[start:start + chunk_size])
+            return writer.commit()
+
+    def test_sniff_signatures(self):
+        """Test that PNG, JPEG and WebP are told apart by their first bytes"""
+        for image_format in ('PNG', 'JPEG', 'WEBP'):
+            self.assertEqual(sniff_image_format(_image_bytes(image_format)[:16]), image_format)
+        self.assertIsNone(sniff_image_format(b'{"error": "loading"}'))
+
+    def test_valid_images_are_published(self):
+        """Test that complete images of each format are moved into place"""
+        for image_format in ('PNG', 'JPEG', 'WEBP'):
+            data = _image_bytes(image_format)
+            self.assertEqual(self._download(data), (image_format, 128, 224))
+            with open(self.dest, 'rb') as f:
+                self.assertEqual(f.read(), data)
+        self.assertEqual(os.listdir(self.test_dir), ['image.png'])
+
+    def test_invalid_downloads_leave_destination_untouched(self):
+        """Test that truncated, tiny or non-image bodies never reach the destination"""
+        with open(self.dest, 'wb') as f:
+            f.write(b'previous')
+
+        self.assertIsNone(self._download(_image_bytes('PNG')[:60]))
+        self.assertIsNone(self._download(_image_bytes('PNG', (32, 32))))
+        self.assertIsNone(self._download(b'<html>Service unavailable</html>' * 100))
+
+        with open(self.dest, 'rb') as f:
+            self.assertEqual(f.read(), b'previous')
+        self.assertEqual(os.listdir(self.test_dir), ['image.png'])
+
+    def test_size_limit(self):
+        """Test that a download past the size limit is aborted and cleaned up"""
+        with self.assertRaises(ImageTooLargeError):
+            self._download(b'\x89PNG\r\n\x1a\n' + b'\x00' * 5000, max_bytes=4096)
+        self.assertEqual(os.listdir(self.test_dir), [])
+
+    def test_validate_image_on_missing_file(self):
+        """Test that a missing file is simply not an image"""
+        self.assertIsNone(validate_image(os.path.join(self.test_dir, 'missing.png')))
+
+
+if __name__ == '__main__':
+    unittest.main()
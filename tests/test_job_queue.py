@@ -0,0 +1,86 @@
+import unittest
+import json
+import threading
+import time
+from unittest.mock import patch
+
+from job_queue import JobQueue, QueueFullError
+
+
+class JobQueueTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.started = []
+
+    def tearDown(self):
+        self.release.set()
+
+    def _blocking_job(self, name):
+        self.started.append(name)
+        self.release.wait(5)
+
+    def test_positions_and_fifo_start(self):
+        """Test that jobs beyond the worker count wait in FIFO order"""
+        queue = JobQueue(workers=1, max_queued=2)
+        self.assertEqual(queue.submit_call('a', self._blocking_job, 'a'), 0)
+        self.assertEqual(queue.submit_call('b', self._blocking_job, 'b'), 1)
+        self.assertEqual(queue.submit_call('c', self._blocking_job, 'c'), 2)
+        self.assertEqual(queue.position('a'), 0)
+        self.assertEqual(queue.position('c'), 2)
+        self.assertIsNone(queue.position('unknown'))
+
+        self.release.set()
+        for _ in range(100):
+            if queue.stats()['completed'] == 3:
+                break
+            time.sleep(0.02)
+        self.assertEqual(self.started, ['a', 'b', 'c'])
+        self.assertEqual(queue.stats()['active'], 0)
+
+    def test_full_queue_rejects(self):
+        """Test that a full queue raises with a retry estimate"""
+        queue = JobQueue(workers=1, max_queued=1)
+        queue.submit_call('a', self._blocking_job, 'a')
+        queue.submit_call('b', self._blocking_job, 'b')
+        with self.assertRaises(QueueFullError) as ctx:
+            queue.submit_call('c', self._blocking_job, 'c')
+        self.assertGreaterEqual(ctx.exception.retry_after, 1)
+        self.assertEqual(queue.stats()['rejected'], 1)
+
+    def test_blocking_submit_waits_for_room(self):
+        """Test that a blocking submit waits for a free slot instead of raising"""
+        queue = JobQueue(workers=1, max_queued=1)
+        queue.submit_call('a', self._blocking_job, 'a')
+        queue.submit_call('b', self._blocking_job, 'b')
+        with self.assertRaises(QueueFullError):
+            queue.submit('c', lambda: queue.run_call(self._blocking_job, 'c'), block=True, timeout=0.05)
+
+        threading.Timer(0.05, self.release.set).start()
+        position = queue.submit('d', lambda: queue.run_call(self._blocking_job, 'd'), block=True, timeout=5)
+        self.assertIn(position, (0, 1))
+
+    def test_generate_returns_429_when_full(self):
+        """Test that /generate answers 429 with Retry-After once the queue is full"""
+        import app as web_app
+
+        queue = JobQueue(workers=1, max_queued=1)
+        client = web_app.app.test_client()
+        with patch.object(web_app, 'get_job_queue', return_value=queue), \
+                patch.object(web_app.WebAIAgent, 'process_topic_web',
+                             lambda agent, topic: self._blocking_job(topic)):
+            first = client.post('/generate', json={'topic': 'one'})
+            second = client.post('/generate', json={'topic': 'two'})
+            third = client.post('/generate', json={'topic': 'three'})
+
+            self.assertEqual(first.status_code, 200)
+            self.assertEqual(json.loads(second.data)['queue_position'], 1)
+            self.assertEqual(third.status_code, 429)
+            self.assertIn('Retry-After', third.headers)
+
+            status = client.get(f"/status/{json.loads(second.data)['session_id']}").get_json()
+            self.assertEqual(status['queue_position'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
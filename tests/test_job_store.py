@@ -0,0 +1,333 @@
+import unittest
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from job_store import JobStore, SQLiteJobStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class LateWritesTestMixin:
+    """Run by both backends, which must agree on writes for jobs they no longer hold"""
+
+    def _late_store(self, ttl: float):
+        raise NotImplementedError
+
+    def test_late_writes_do_not_revive_deleted_jobs(self):
+        """Test that progress or a result arriving after a job was deleted or expired is dropped"""
+        store = self._late_store(ttl=0.05)
+        flush = getattr(store, 'flush', lambda: None)
+        store.create('deleted')
+        store.set_status('deleted', 50, 'Working')
+        store.delete('deleted')
+        flush()
+        store.set_status('deleted', 60, 'Still working')
+        store.set_result('deleted', {'success': False})
+
+        store.create('expired')
+        store.set_status('expired', 50, 'Working')
+        time.sleep(0.1)
+        store.stats()
+        flush()
+        store.set_status('expired', 60, 'Still working')
+        store.set_result('expired', {'success': True})
+        flush()
+        self.assertEqual(store.stats()['entries'], 0)
+        self.assertNotIn('deleted', store)
+        self.assertIsNone(store.get_status('expired'))
+        self.assertIsNone(store.get_result('deleted'))
+
+
+class JobStoreTestCase(LateWritesTestMixin, unittest.TestCase):
+
+    def _late_store(self, ttl: float) -> JobStore:
+        return JobStore(ttl=ttl)
+
+    def test_ids_are_unique(self):
+        """Test that IDs issued in the same second never collide"""
+        ids = {JobStore.new_id() for _ in range(1000)}
+        self.assertEqual(len(ids), 1000)
+
+    def test_status_and_result_round_trip(self):
+        """Test that status and result updates are returned as copies"""
+        store = JobStore()
+        store.create('job', 'Queued...', topic='Bees')
+        store.set_status('job', 40, 'Working...')
+        status = store.get_status('job')
+        self.assertEqual((status['progress'], status['status']), (40, 'Working...'))
+
+        store.set_result('job', {'success': True, 'image_files': ['a.png']})
+        result = store.get_result('job')
+        result['image_files'] = []
+        self.assertEqual(store.get_result('job')['image_files'], ['a.png'])
+        self.assertIsNone(store.get_result('missing'))
+
+    def test_entries_expire_after_ttl(self):
+        """Test that idle entries are evicted once their TTL passes"""
+        store = JobStore(ttl=60)
+        with patch('time.monotonic', return_value=1000.0):
+            store.create('old')
+        with patch('time.monotonic', return_value=1050.0):
+            store.create('new')
+        with patch('time.monotonic', return_value=1070.0):
+            store.create('newest')
+        self.assertNotIn('old', store)
+        self.assertIn('new', store)
+
+    def test_max_entries_evicts_finished_jobs_first(self):
+        """Test that the size bound drops finished jobs before running ones"""
+        store = JobStore(max_entries=2)
+        store.create('running')
+        store.create('finished')
+        store.set_result('finished', {'success': True})
+        store.create('another')
+
+        self.assertIn('running', store)
+        self.assertNotIn('finished', store)
+        self.assertIn('another', store)
+        self.assertEqual(store.stats()['evictions'], 1)
+
+    def test_memory_stays_bounded(self):
+        """Test that the footprint stops growing once the store is full"""
+        store = JobStore(max_entries=100)
+        for i in range(100):
+            store.create(f'job{i}')
+            store.set_result(f'job{i}', {'success': True, 'topic': 'x' * 100})
+        full = store.memory_usage()
+        for i in range(100, 1000):
+            store.create(f'job{i}')
+            store.set_result(f'job{i}', {'success': True, 'topic': 'x' * 100})
+        self.assertEqual(store.stats()['entries'], 100)
+        self.assertLess(store.memory_usage(), full * 1.1)
+
+    def test_results_do_not_hold_script_text(self):
+        """Test that /result reads the script from the content file"""
+        import os
+        import tempfile
+        import app as web_app
+
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+            f.write('Script from disk')
+        store = JobStore()
+        store.create('job')
+        store.set_result('job', {
+            'success': True,
+            'topic': 'Disk',
+            'image_files': [],
+            'content_file': f.name,
+        })
+
+        client = web_app.app.test_client()
+        with patch.object(web_app, 'get_job_store', return_value=store):
+            response = client.get('/result/job')
+        os.unlink(f.name)
+
+        self.assertEqual(json.loads(response.data)['content'], 'Script from disk')
+        self.assertNotIn('content', store.get_result('job'))
+
+    def test_wait_for_change_wakes_on_update(self):
+        """Test that a waiting reader is woken by an update instead of its timeout"""
+        store = JobStore()
+        store.create('job')
+        version = store.wait_for_change('job', -1, 0)['version']
+
+        timer = threading.Timer(0.05, store.set_status, ('job', 50, 'Halfway'))
+        timer.start()
+        started = time.monotonic()
+        snapshot = store.wait_for_change('job', version, 5)
+        timer.join()
+
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertGreater(snapshot['version'], version)
+        self.assertEqual(snapshot['status']['status'], 'Halfway')
+
+        unchanged = store.wait_for_change('job', snapshot['version'], 0.01)
+        self.assertEqual(unchanged['version'], snapshot['version'])
+        store.delete('job')
+        self.assertIsNone(store.wait_for_change('job', 0, 0.01))
+
+    def test_events_stream_progress_and_result(self):
+        """Test that /events pushes each progress change and then the result"""
+        import os
+        import tempfile
+        import app as web_app
+
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+            f.write('Streamed script')
+        store = JobStore()
+        store.create('job')
+
+        def run_job():
+            for progress in (20, 60):
+                time.sleep(0.05)
+                store.set_status('job', progress, f'Step {progress}')
+            store.set_result('job', {
+                'success': True,
+                'topic': 'Stream',
+                'image_files': ['static/generated/a.png'],
+                'content_file': f.name,
+            })
+
+        client = web_app.app.test_client()
+        with patch.object(web_app, 'get_job_store', return_value=store):
+            worker = threading.Thread(target=run_job)
+            worker.start()
+            response = client.get('/events/job')
+            body = response.get_data(as_text=True)
+            worker.join()
+            missing = client.get('/events/unknown')
+        os.unlink(f.name)
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        events = [block.split('\n') for block in body.strip().split('\n\n')]
+        names = [lines[0] for lines in events]
+        self.assertEqual(names[-1], 'event: result')
+        self.assertIn('Step 20', body)
+        self.assertIn('Step 60', body)
+        result = json.loads(events[-1][1][len('data: '):])
+        self.assertEqual(result['content'], 'Streamed script')
+        self.assertEqual(result['image_files'], ['generated/a.png'])
+        self.assertEqual(missing.status_code, 404)
+
+    def test_long_streams_end_with_reconnect(self):
+        """Test that a stream stops after SSE_MAX_SECONDS and resumes from the version it reached"""
+        import app as web_app
+
+        store = JobStore()
+        store.create('job')
+        store.set_status('job', 30, 'Working')
+        client = web_app.app.test_client()
+        with patch.object(web_app, 'get_job_store', return_value=store), \
+                patch.dict(os.environ, {'SSE_MAX_SECONDS': '0.2', 'SSE_KEEPALIVE_SECONDS': '0.05'}):
+            first = client.get('/events/job').get_data(as_text=True)
+            events = [block.split('\n') for block in first.strip().split('\n\n') if block.startswith('event')]
+            self.assertIn('Working', first)
+            self.assertEqual(events[-1][0], 'event: reconnect')
+            since = json.loads(events[-1][1][len('data: '):])['since']
+
+            resumed = client.get(f'/events/job?since={since}').get_data(as_text=True)
+        self.assertNotIn('event: progress', resumed)
+        self.assertIn('event: reconnect', resumed)
+
+
+    def test_open_streams_are_capped(self):
+        """Test that /events refuses streams past its limit until one closes"""
+        import app as web_app
+
+        store = JobStore()
+        store.create('job')
+        slots = threading.BoundedSemaphore(1)
+        client = web_app.app.test_client()
+        with patch.object(web_app, 'get_job_store', return_value=store), \
+                patch.object(web_app, 'get_stream_slots', return_value=slots), \
+                patch.dict(os.environ, {'SSE_MAX_SECONDS': '0.1'}):
+            first = client.get('/events/job', buffered=False)
+            self.assertEqual(first.status_code, 200)
+            refused = client.get('/events/job')
+            self.assertEqual(refused.status_code, 503)
+            first.close()
+            again = client.get('/events/job')
+            self.assertEqual(again.status_code, 200)
+            self.assertIn('event: reconnect', again.get_data(as_text=True))
+            again.close()
+        self.assertTrue(slots.acquire(blocking=False))
+
+class SQLiteJobStoreTestCase(LateWritesTestMixin, unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.test_dir, 'jobs.sqlite3')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _store(self, **options) -> SQLiteJobStore:
+        return SQLiteJobStore(self.path, flush_interval=0.05, **options)
+
+    def _late_store(self, ttl: float) -> SQLiteJobStore:
+        return SQLiteJobStore(self.path, flush_interval=10, ttl=ttl)
+
+    def test_workers_share_status_and_results(self):
+        """Test that one worker's job is visible to another once progress is flushed"""
+        worker, other = self._store(), self._store()
+        worker.create('job', 'Queued...', topic='Bees')
+        self.assertIn('job', other)
+        self.assertEqual(other.get_status('job')['status'], 'Queued...')
+
+        worker.set_status('job', 40, 'Working...')
+        self.assertEqual(worker.get_status('job')['progress'], 40)
+        worker.flush()
+        self.assertEqual(other.get_status('job')['progress'], 40)
+
+        worker.set_status('job', 100, 'Done')
+        worker.set_result('job', {'success': True, 'image_files': ['a.png']})
+        self.assertEqual(other.get_result('job')['image_files'], ['a.png'])
+        self.assertEqual(other.get_status('job')['status'], 'Done')
+        self.assertIsNone(other.get_result('missing'))
+
+    def test_progress_writes_are_batched(self):
+        """Test that many progress updates turn into a few flushes"""
+        store = SQLiteJobStore(self.path, flush_interval=10)
+        store.create('job')
+        for progress in range(100):
+            store.set_status('job', progress, f'Step {progress}')
+        self.assertEqual(store.stats()['pending_writes'], 1)
+        store.flush()
+        self.assertEqual(store.stats()['flushes'], 1)
+        self.assertEqual(self._store().get_status('job')['progress'], 99)
+
+    def test_max_entries_evicts_finished_jobs_first(self):
+        """Test that the size bound drops finished jobs before running ones"""
+        store = self._store(max_entries=2)
+        store.create('running')
+        store.create('finished')
+        store.set_result('finished', {'success': True})
+        store.create('another')
+        self.assertIn('running', store)
+        self.assertNotIn('finished', store)
+        self.assertEqual(store.stats()['entries'], 2)
+
+    def test_wait_for_change_sees_other_workers(self):
+        """Test that a reader in one worker is woken by a result written by another"""
+        reader, writer = self._store(), self._store()
+        writer.create('job')
+        version = reader.wait_for_change('job', -1, 0)['version']
+        timer = threading.Timer(0.05, writer.set_result, ('job', {'success': True}))
+        timer.start()
+        snapshot = reader.wait_for_change('job', version, 5)
+        timer.join()
+        self.assertEqual(snapshot['result'], {'success': True})
+        writer.delete('job')
+        self.assertIsNone(reader.wait_for_change('job', 0, 0.01))
+
+    def test_cancel_reaches_job_in_other_worker(self):
+        """Test that a cancel handled by one worker stops the job running in another"""
+        worker, other = self._store(), self._store()
+        worker.create('job')
+        token = worker.cancel_token('job')
+        self.assertTrue(other.cancel('job'))
+        self.assertFalse(other.cancel('job'))
+        self.assertTrue(token.wait(5))
+        self.assertEqual(token.reason, 'Cancelled by user')
+
+    def test_separate_processes_share_jobs(self):
+        """Test that a job written by another process can be polled here"""
+        script = (
+            "import sys; from job_store import SQLiteJobStore; "
+            "store = SQLiteJobStore(sys.argv[1]); store.create('job', topic='Mars'); "
+            "store.set_status('job', 50, 'Halfway'); store.flush()"
+        )
+        subprocess.run([sys.executable, '-c', script, self.path], cwd=ROOT, check=True,
+                       capture_output=True, timeout=60)
+        self.assertEqual(self._store().get_status('job')['status'], 'Halfway')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import smtplib
+import time
+from email.mime.text import MIMEText
+from unittest.mock import patch
+
+from fakes import SMTPSink
+from mailer import Mailer
+
+
+def _message(subject: str) -> MIMEText:
+    msg = MIMEText('Body of ' + subject)
+    msg['Subject'] = subject
+    return msg
+
+
+class MailerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sink = SMTPSink(password='secret').start()
+
+    def tearDown(self):
+        self.sink.stop()
+
+    def _mailer(self, **kwargs) -> Mailer:
+        options = dict(starttls=False, retry_backoff=0.01)
+        options.update(kwargs)
+        mailer = Mailer(self.sink.host, self.sink.port, 'sender@example.com', 'secret', **options)
+        self.addCleanup(mailer.close)
+        return mailer
+
+    def test_connection_is_reused(self):
+        """Test that several messages share one authenticated connection"""
+        mailer = self._mailer()
+        futures = [mailer.send('sender@example.com', ['a@example.com', 'b@example.com'], _message(f'Topic {i}'))
+                   for i in range(5)]
+        for future in futures:
+            self.assertTrue(future.result(timeout=5))
+
+        self.assertEqual(len(self.sink.messages), 5)
+        self.assertEqual(self.sink.connections, 1)
+        self.assertEqual(self.sink.logins, ['sender@example.com'])
+        self.assertEqual(self.sink.messages[0]['recipients'], ['a@example.com', 'b@example.com'])
+        self.assertIn(b'Subject: Topic 0', self.sink.messages[0]['data'])
+
+    def test_reconnects_after_disconnect(self):
+        """Test that a dropped connection is replaced and the message resent"""
+        mailer = self._mailer()
+        mailer.send('sender@example.com', ['a@example.com'], _message('first')).result(timeout=5)
+        self.sink.drop_next = 1
+        self.assertTrue(mailer.send('sender@example.com', ['a@example.com'], _message('second')).result(timeout=5))
+
+        self.assertEqual([b'Subject: second' in m['data'] for m in self.sink.messages], [False, True])
+        self.assertEqual(self.sink.connections, 2)
+        self.assertEqual(mailer.stats()['retries'], 1)
+
+    def test_transient_errors_are_retried(self):
+        """Test that 4xx replies are retried and give up after the retry budget"""
+        mailer = self._mailer(retries=2)
+        self.sink.fail_next = 2
+        self.assertTrue(mailer.send('sender@example.com', ['a@example.com'], _message('later')).result(timeout=5))
+
+        self.sink.fail_next = 3
+        with self.assertRaises(smtplib.SMTPDataError):
+            mailer.send('sender@example.com', ['a@example.com'], _message('never')).result(timeout=5)
+        self.assertEqual(mailer.stats()['failed'], 1)
+
+    def test_authentication_errors_are_not_retried(self):
+        """Test that a rejected login fails the message at once"""
+        mailer = Mailer(self.sink.host, self.sink.port, 'sender@example.com', 'wrong',
+                        starttls=False, retry_backoff=0.01)
+        self.addCleanup(mailer.close)
+        with self.assertRaises(smtplib.SMTPAuthenticationError):
+            mailer.send('sender@example.com', ['a@example.com'], _message('nope')).result(timeout=5)
+        self.assertEqual(mailer.stats()['retries'], 0)
+
+    def test_message_is_streamed_from_its_spool(self):
+        """Test that a large message is sent in chunks, with lines starting with a dot escaped"""
+        lines = ['.leading dot', '..two dots', '.', 'plain line'] + [f'line {i:05d}' for i in range(20000)]
+        mailer = self._mailer()
+        sent = []
+        original_send = smtplib.SMTP.send
+
+        def send(connection, data):
+            sent.append(len(data))
+            return original_send(connection, data)
+
+        with patch.object(smtplib.SMTP, 'send', send):
+            message = MIMEText('\n'.join(lines))
+            self.assertTrue(mailer.send('sender@example.com', ['a@example.com'], message).result(timeout=5))
+
+        body = self.sink.messages[0]['data'].split(b'\r\n\r\n', 1)[1]
+        self.assertEqual(body.decode('ascii').split('\r\n')[:-1], lines)
+        data_chunks = [size for size in sent if size > 1024]
+        self.assertGreater(len(data_chunks), 1)
+        self.assertLess(max(data_chunks), 128 * 1024)
+
+    def test_send_email_does_not_wait_for_delivery(self):
+        """Test that the agent returns while a slow server is still receiving"""
+        import ai_agent
+
+        agent = ai_agent.AIContentAgent()
+        agent.recipient_emails = ['a@example.com']
+        agent.sender_email = 'sender@example.com'
+        mailer = self._mailer()
+
+        original_connect = mailer._connect
+
+        def slow_connect():
+            time.sleep(0.5)
+            return original_connect()
+
+        with patch.object(mailer, '_connect', slow_connect), \
+                patch.object(ai_agent, 'get_mailer', return_value=mailer):
+            started = time.monotonic()
+            future = agent.send_email('Bees', 'Bee facts', [])
+            self.assertLess(time.monotonic() - started, 0.4)
+            self.assertTrue(future.result(timeout=5))
+        self.assertEqual(len(self.sink.messages), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
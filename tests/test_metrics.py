@@ -0,0 +1,123 @@
+import unittest
+import asyncio
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from app import app, WebAIAgent
+from fakes import FakeInferenceServer
+from job_store import get_job_store
+from metrics import Counter, Histogram, MetricsRegistry, get_metrics, result_outcome, timed
+from model_router import get_model_router
+
+
+class MetricsRegistryTestCase(unittest.TestCase):
+
+    def test_histogram_buckets_are_cumulative(self):
+        """Test that an observation counts in every bucket at or above it"""
+        histogram = Histogram('latency_seconds', 'Latency', ('model',), buckets=(0.1, 1.0))
+        histogram.observe(0.05, model='a')
+        histogram.observe(0.5, model='a')
+        histogram.observe(5, model='a')
+        lines = histogram.render()
+
+        self.assertIn('latency_seconds_bucket{model="a",le="0.1"} 1', lines)
+        self.assertIn('latency_seconds_bucket{model="a",le="1"} 2', lines)
+        self.assertIn('latency_seconds_bucket{model="a",le="+Inf"} 3', lines)
+        self.assertIn('latency_seconds_sum{model="a"} 5.55', lines)
+        self.assertIn('latency_seconds_count{model="a"} 3', lines)
+
+    def test_counter_labels_are_escaped(self):
+        """Test that label values cannot break the exposition format"""
+        counter = Counter('calls_total', 'Calls', ('model', 'status'))
+        counter.inc(model='a"b', status=200)
+        counter.inc(model='a"b', status='error')
+        self.assertIn('calls_total{model="a\\"b",status="200"} 1', counter.render())
+        self.assertEqual(counter.value(model='a"b', status='error'), 1)
+
+    def test_span_records_outcome(self):
+        """Test that a span is labeled ok or error depending on how the block ended"""
+        registry = MetricsRegistry()
+        with registry.span('script'):
+            pass
+        with self.assertRaises(ValueError):
+            with registry.span('script'):
+                raise ValueError('boom')
+        self.assertEqual(registry.stage_seconds.count(stage='script', outcome='ok'), 1)
+        self.assertEqual(registry.stage_seconds.count(stage='script', outcome='error'), 1)
+
+    def test_timed_wraps_coroutines(self):
+        """Test that the decorator times coroutine functions across their awaits"""
+        @timed('unit_test_async')
+        async def work():
+            await asyncio.sleep(0)
+            return 42
+
+        self.assertEqual(asyncio.run(work()), 42)
+        self.assertEqual(get_metrics().stage_seconds.count(stage='unit_test_async', outcome='ok'), 1)
+
+    def test_timed_labels_calls_from_their_result(self):
+        """Test that a job reporting failure or cancellation in its result is not counted as ok"""
+        @timed('unit_test_result', outcome=result_outcome)
+        def job(result):
+            return result
+
+        for result in ({'success': True}, {'success': False, 'error': 'boom'},
+                       {'success': False, 'cancelled': True}):
+            job(result)
+        for outcome in ('ok', 'error', 'cancelled'):
+            self.assertEqual(get_metrics().stage_seconds.count(stage='unit_test_result', outcome=outcome), 1)
+
+    def test_gauges_skip_non_numeric_fields(self):
+        """Test that stats dicts are exported as gauges, skipping text and None"""
+        registry = MetricsRegistry()
+        registry.register_gauges('queue', 'Queue', lambda: {'depth': 3, 'connected': True, 'name': 'x', 'avg': None})
+        text = registry.render()
+        self.assertIn('shorts_queue_depth 3\n', text)
+        self.assertIn('shorts_queue_connected 1\n', text)
+        self.assertNotIn('shorts_queue_name', text)
+        self.assertNotIn('shorts_queue_avg', text)
+
+
+class MetricsEndpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        get_model_router().reset()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+        get_model_router().reset()
+
+    def test_job_stages_and_calls_are_exported(self):
+        """Test that a web job shows up as stage spans and tagged inference calls"""
+        with FakeInferenceServer(prompts_per_script=1) as fake, \
+                patch.dict(os.environ, {'HF_API_BASE': fake.base_url, 'HUGGING_FACE_TOKEN': 'test'}):
+            store = get_job_store()
+            session_id = store.new_id()
+            store.create(session_id, topic='Metrics')
+            agent = WebAIAgent(session_id)
+            agent.image_cache = None
+            agent.script_cache = None
+            self.assertTrue(agent.process_topic_web('Metrics')['success'])
+            store.delete(session_id)
+
+        response = app.test_client().get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        text = response.get_data(as_text=True)
+        for stage in ('job', 'script', 'images', 'save'):
+            self.assertIn(f'shorts_stage_duration_seconds_count{{stage="{stage}",outcome="ok"}}', text)
+        self.assertIn('shorts_hf_requests_total{kind="text",model="DialoGPT-medium",status="200"}', text)
+        self.assertIn('shorts_hf_requests_total{kind="image",model="FLUX.1-schnell",status="200"}', text)
+        self.assertIn('shorts_jobs_total{outcome="success"}', text)
+        self.assertIn('shorts_job_queue_queued ', text)
+        self.assertIn('shorts_job_store_running ', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import time
+from unittest.mock import patch, MagicMock
+
+from model_router import ModelRouter, parse_retry_after, get_model_router
+
+MODEL_A = "https://api-inference.huggingface.co/models/org/model-a"
+MODEL_B = "https://api-inference.huggingface.co/models/org/model-b"
+MODEL_C = "https://api-inference.huggingface.co/models/org/model-c"
+
+
+class ModelRouterTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.router = ModelRouter(default_latency=20.0, default_cooldown=15.0, rate_limit_cooldown=30.0)
+
+    def test_untried_models_keep_configured_order(self):
+        """Test that models without stats are tried in the configured order"""
+        self.assertEqual(self.router.candidates([MODEL_A, MODEL_B, MODEL_C]), [MODEL_A, MODEL_B, MODEL_C])
+
+    def test_fastest_model_first(self):
+        """Test that the model with the lowest latency EWMA is tried first"""
+        self.router.record_success(MODEL_A, 12.0)
+        self.router.record_success(MODEL_B, 3.0)
+        self.assertEqual(self.router.candidates([MODEL_A, MODEL_B]), [MODEL_B, MODEL_A])
+
+    def test_rate_limited_model_is_skipped(self):
+        """Test that a 429 puts the model in cooldown"""
+        self.router.record_failure(MODEL_A, 0.1, 429)
+        self.assertEqual(self.router.candidates([MODEL_A, MODEL_B]), [MODEL_B])
+        self.assertGreater(self.router.next_available_in([MODEL_A]), 25)
+
+    def test_estimated_time_sets_cooldown(self):
+        """Test that the API's estimated_time decides how long a loading model is skipped"""
+        self.router.record_failure(MODEL_A, 0.1, 503, cooldown=2.0)
+        now = time.monotonic()
+        self.assertEqual(self.router.candidates([MODEL_A], now=now), [])
+        self.assertEqual(self.router.candidates([MODEL_A], now=now + 3), [MODEL_A])
+
+    def test_failures_lower_priority(self):
+        """Test that an unreliable model ranks behind a reliable one"""
+        self.router.record_success(MODEL_A, 5.0)
+        self.router.record_success(MODEL_B, 5.0)
+        self.router.record_failure(MODEL_A, 0.1, 400)
+        self.assertEqual(self.router.candidates([MODEL_A, MODEL_B]), [MODEL_B, MODEL_A])
+
+    def test_parse_retry_after(self):
+        """Test Retry-After parsing"""
+        self.assertEqual(parse_retry_after('12'), 12.0)
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after('soon'))
+
+
+class AgentRoutingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        get_model_router().reset()
+
+    def tearDown(self):
+        get_model_router().reset()
+
+    @patch('requests.Session.post')
+    def test_agent_skips_models_in_cooldown(self, mock_post):
+        """Test that one job's 429 steers the next job to another model"""
+        from ai_agent import AIContentAgent
+
+        rate_limited = MagicMock(status_code=429, headers={'retry-after': '60'})
+        mock_post.return_value = rate_limited
+
+        agent = AIContentAgent()
+        agent.image_models = [MODEL_A, MODEL_B]
+        with patch('time.sleep'):
+            self.assertFalse(agent.generate_image('prompt', '/nonexistent/out.png'))
+        self.assertEqual(mock_post.call_count, 2)
+
+        # Both models are now cooling down and shared with a fresh agent
+        mock_post.reset_mock()
+        other_agent = AIContentAgent()
+        other_agent.image_models = [MODEL_A, MODEL_B]
+        self.assertFalse(other_agent.generate_image('prompt', '/nonexistent/out.png'))
+        mock_post.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
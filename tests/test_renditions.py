@@ -0,0 +1,90 @@
+import unittest
+import email
+import io
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from PIL import Image
+
+from fakes import SMTPSink
+from mailer import Mailer
+from renditions import make_rendition, plan_email_images
+
+
+class RenditionsTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _noisy_png(self, name: str, size=(1080, 1920)) -> str:
+        """A PNG that compresses badly, like a detailed generated image"""
+        path = os.path.join(self.test_dir, name)
+        Image.frombytes('RGB', size, os.urandom(size[0] * size[1] * 3)).save(path, 'PNG')
+        return path
+
+    def test_rendition_fits_budget_and_dimension(self):
+        """Test that a large PNG is re-encoded as a smaller JPEG"""
+        path = self._noisy_png('big.png')
+        data, subtype = make_rendition(path, 100 * 1024, max_dimension=640)
+
+        self.assertEqual(subtype, 'jpeg')
+        self.assertLessEqual(len(data), 100 * 1024)
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertEqual(image.format, 'JPEG')
+            self.assertLessEqual(max(image.size), 640)
+
+    def test_webp_rendition(self):
+        """Test that WebP can be chosen instead of JPEG"""
+        data, subtype = make_rendition(self._noisy_png('small.png', (400, 700)), 100 * 1024, image_format='webp')
+        self.assertEqual(subtype, 'webp')
+        with Image.open(io.BytesIO(data)) as image:
+            self.assertEqual(image.format, 'WEBP')
+
+    def test_plan_stays_under_total_budget(self):
+        """Test that all renditions together fit the budget and unusable files are skipped"""
+        paths = [self._noisy_png(f'image_{i}.png', (600, 1000)) for i in range(3)]
+        broken = os.path.join(self.test_dir, 'broken.png')
+        with open(broken, 'wb') as f:
+            f.write(b'not an image')
+        paths.insert(1, broken)
+        paths.append(os.path.join(self.test_dir, 'missing.png'))
+
+        renditions = plan_email_images(paths, 300 * 1024)
+
+        self.assertEqual([index for index, _, _ in renditions], [1, 3, 4])
+        self.assertLessEqual(sum(len(data) for _, data, _ in renditions), 300 * 1024)
+
+    def test_send_email_attaches_renditions(self):
+        """Test that the delivered email carries downscaled images matching the HTML"""
+        import ai_agent
+
+        paths = [self._noisy_png(f'image_{i}.png', (600, 1000)) for i in range(1, 4)]
+        agent = ai_agent.AIContentAgent()
+        agent.recipient_emails = ['a@example.com']
+        agent.sender_email = 'sender@example.com'
+        agent.email_image_budget = 300 * 1024
+
+        with SMTPSink() as sink:
+            mailer = Mailer(sink.host, sink.port, None, None, starttls=False)
+            self.addCleanup(mailer.close)
+            with patch.object(ai_agent, 'get_mailer', return_value=mailer):
+                agent.send_email('Bees', 'Bee facts', paths).result(timeout=10)
+            raw = sink.messages[0]['data']
+
+        self.assertLess(len(raw), 300 * 1024 * 1.4 + 20 * 1024)  # base64 adds a third
+        message = email.message_from_bytes(raw)
+        images = [part for part in message.walk() if part.get_content_maintype() == 'image']
+        html = next(part for part in message.walk() if part.get_content_type() == 'text/html').get_payload(decode=True)
+        self.assertEqual([part.get_content_type() for part in images], ['image/jpeg'] * 3)
+        for i, part in enumerate(images, 1):
+            self.assertEqual(part['Content-ID'], f'<image{i}>')
+            self.assertIn(f'cid:image{i}'.encode(), html)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from unittest.mock import patch
+
+import app as web_app
+from job_store import get_job_store
+from result_catalog import ResultCatalog, content_hash
+from storage_gc import StorageCollector
+
+
+class ResultCatalogTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        self.path = os.path.join(self.test_dir, 'data', 'results.sqlite3')
+        self.catalog = ResultCatalog(self.path)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _write_result(self, session_id: str, topic: str, images: int = 1) -> dict:
+        os.makedirs('static/generated', exist_ok=True)
+        content = f'Script about {topic}'
+        content_file = f'static/generated/content_{session_id}.txt'
+        with open(content_file, 'w', encoding='utf-8') as f:
+            f.write(content)
+        image_files = []
+        for i in range(1, images + 1):
+            image_files.append(f'static/generated/youtube_shorts_image_{i}_{session_id}.png')
+            with open(image_files[-1], 'wb') as f:
+                f.write(b'\x89PNG image')
+        result = {
+            'topic': topic,
+            'image_files': image_files,
+            'content_file': content_file,
+            'content_hash': content_hash(content),
+            'success': True,
+        }
+        self.catalog.record(session_id, result, content)
+        return result
+
+    def test_results_survive_restart(self):
+        """Test that a new catalog on the same file finds earlier results and scripts"""
+        result = self._write_result('gen_a', 'Volcanoes')
+        reopened = ResultCatalog(self.path)
+        self.assertEqual(reopened.get('gen_a'), result)
+        self.assertEqual(reopened.script(result['content_hash']), 'Script about Volcanoes')
+        self.assertIsNone(reopened.get('gen_missing'))
+        self.assertEqual(reopened.stats()['entries'], 1)
+
+    def test_find_topic_returns_newest_complete_result(self):
+        """Test that repeat topics match case-insensitively and skip incomplete or stale results"""
+        self._write_result('gen_old', 'Deep Sea')
+        self._write_result('gen_new', 'Deep Sea')
+        self._write_result('gen_empty', 'Deep Sea', images=0)
+        self.assertEqual(self.catalog.find_topic('  deep   SEA ', 3600)[0], 'gen_new')
+
+        os.remove('static/generated/youtube_shorts_image_1_gen_new.png')
+        self.assertEqual(self.catalog.find_topic('Deep Sea', 3600)[0], 'gen_old')
+        with patch('time.time', return_value=10 ** 10):
+            self.assertIsNone(self.catalog.find_topic('Deep Sea', 3600))
+        self.assertIsNone(self.catalog.find_topic('Shallow Sea', 3600))
+
+    def test_endpoints_fall_back_to_catalog(self):
+        """Test that /status, /result and /download still answer after the job store forgot the job"""
+        result = self._write_result('gen_restarted', 'Comets')
+        os.remove(result['content_file'])
+        client = web_app.app.test_client()
+        with patch.object(web_app, 'get_result_catalog', return_value=self.catalog):
+            status = client.get('/status/gen_restarted').get_json()
+            response = client.get('/result/gen_restarted')
+            download = client.get('/download/gen_restarted')
+
+        self.assertEqual(status['progress'], 100)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['content'], 'Script about Comets')
+        self.assertEqual(download.status_code, 200)
+        names = zipfile.ZipFile(io.BytesIO(download.data)).namelist()
+        self.assertIn('Comets_image_1.png', names)
+
+    def test_collected_jobs_keep_their_script(self):
+        """Test that a job whose files were collected still shows its script but is no longer reused"""
+        self._write_result('gen_collected', 'Auroras')
+        collector = StorageCollector('static/generated', max_bytes=1, min_age=0, on_evict=web_app.forget_files)
+        client = web_app.app.test_client()
+        with patch.object(web_app, 'get_result_catalog', return_value=self.catalog):
+            collector.collect()
+            response = client.get('/result/gen_collected')
+            download = client.get('/download/gen_collected')
+
+        self.assertEqual(os.listdir('static/generated'), [])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['content'], 'Script about Auroras')
+        self.assertEqual(response.get_json()['image_files'], [])
+        self.assertEqual(download.status_code, 410)
+        self.assertIsNone(self.catalog.find_topic('Auroras', 3600))
+
+    def test_generate_reuses_recent_topic(self):
+        """Test that a repeat topic is answered from the catalog unless fresh content is asked for"""
+        self._write_result('gen_first', 'Black Holes')
+        client = web_app.app.test_client()
+        with patch.object(web_app, 'get_result_catalog', return_value=self.catalog), \
+                patch.dict(os.environ, {'RESULT_REUSE_SECONDS': '3600'}):
+            reused = client.post('/generate', json={'topic': 'black holes'}).get_json()
+            fresh = client.post('/generate', json={'topic': 'Black Holes', 'fresh': True}).get_json()
+        client.post(f"/cancel/{fresh['session_id']}")
+
+        self.assertEqual(reused['reused_from'], 'gen_first')
+        self.assertEqual(get_job_store().get_status(reused['session_id'])['progress'], 100)
+        self.assertEqual(client.get(f"/result/{reused['session_id']}").get_json()['topic'], 'Black Holes')
+        self.assertNotIn('reused_from', fresh)
+        get_job_store().delete(reused['session_id'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,128 @@
+import unittest
+import os
+import random
+import time
+from unittest.mock import MagicMock, patch
+
+from model_router import get_model_router
+from cancellation import CancelToken
+from retry_policy import Deadline, RetryPolicy
+
+MODELS = [f'https://example.invalid/models/org/model-{i}' for i in range(4)]
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+
+    def test_delay_grows_and_is_capped(self):
+        """Test that consecutive failures double the wait up to the cap"""
+        policy = RetryPolicy(base_delay=0.5, max_delay=4, jitter=0)
+        self.assertEqual([policy.delay(n) for n in range(6)], [0, 0.5, 1, 2, 4, 4])
+
+    def test_jitter_stays_in_bounds(self):
+        """Test that jitter only ever shortens the wait, by at most its fraction"""
+        policy = RetryPolicy(base_delay=1, max_delay=8, jitter=0.5, rng=random.Random(7))
+        delays = [policy.delay(3) for _ in range(200)]
+        self.assertTrue(all(2 <= delay <= 4 for delay in delays))
+        self.assertGreater(len(set(delays)), 100)
+
+    def test_only_rate_limits_and_errors_back_off(self):
+        """Test that loading or missing models move on without waiting"""
+        policy = RetryPolicy()
+        for status in (429, 500, 502, None):
+            self.assertTrue(policy.backs_off(status), status)
+        for status in (200, 404, 503):
+            self.assertFalse(policy.backs_off(status), status)
+
+    def test_deadline_bounds_waits_and_timeouts(self):
+        """Test that the deadline decides whether another attempt fits and caps its timeout"""
+        policy = RetryPolicy(min_attempt_seconds=5, request_timeout=60)
+        deadline = Deadline(20)
+        self.assertTrue(policy.has_time(deadline, 10))
+        self.assertFalse(policy.has_time(deadline, 16))
+        self.assertLessEqual(policy.request_timeout_for(deadline), 20)
+        self.assertEqual(policy.request_timeout_for(Deadline()), 60)
+        self.assertTrue(Deadline(0).expired())
+
+
+class AgentRetryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        get_model_router().reset()
+        # Keep the request pacer's own sleeps out of the counts below
+        self.env = patch.dict(os.environ, {'HF_RATE_LIMIT': '0'})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        get_model_router().reset()
+
+    def _agent(self, **policy):
+        from ai_agent import AIContentAgent
+        agent = AIContentAgent()
+        agent.image_cache = None
+        agent.image_models = list(MODELS)
+        agent.retry_policy = RetryPolicy(jitter=0, **policy)
+        return agent
+
+    @patch('requests.Session.post')
+    def test_loading_models_are_skipped_without_sleeping(self, mock_post):
+        """Test that 503s fall through every model with no backoff"""
+        mock_post.return_value = MagicMock(status_code=503, headers={})
+        mock_post.return_value.json.return_value = {'error': 'Model loading'}
+        agent = self._agent()
+
+        with patch.object(CancelToken, 'wait', return_value=False) as sleep:
+            self.assertFalse(agent.generate_image('prompt', '/nonexistent/out.png'))
+        self.assertEqual(mock_post.call_count, len(MODELS))
+        sleep.assert_not_called()
+
+    @patch('requests.Session.post')
+    def test_rate_limits_back_off_exponentially(self, mock_post):
+        """Test that repeated 429s wait longer before each next model"""
+        mock_post.return_value = MagicMock(status_code=429, headers={})
+        agent = self._agent(base_delay=1, max_delay=8)
+
+        with patch.object(CancelToken, 'wait', return_value=False) as sleep:
+            self.assertFalse(agent.generate_image('prompt', '/nonexistent/out.png'))
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [1, 2, 4])
+
+    @patch('requests.Session.post')
+    def test_gives_up_when_deadline_is_spent(self, mock_post):
+        """Test that no further model is tried once the wait would overrun the job deadline"""
+        mock_post.return_value = MagicMock(status_code=429, headers={})
+        agent = self._agent(base_delay=6, max_delay=8, min_attempt_seconds=5)
+
+        with patch.object(CancelToken, 'wait', return_value=False) as sleep:
+            self.assertFalse(agent.generate_image('prompt', '/nonexistent/out.png', Deadline(10)))
+        self.assertEqual(mock_post.call_count, 1)
+        sleep.assert_not_called()
+
+        mock_post.reset_mock()
+        self.assertFalse(agent.generate_image('prompt', '/nonexistent/out.png', Deadline(1)))
+        mock_post.assert_not_called()
+
+    @patch('requests.Session.post')
+    def test_request_timeout_follows_deadline(self, mock_post):
+        """Test that a request never waits past the job's deadline"""
+        mock_post.return_value = MagicMock(status_code=404, headers={})
+        agent = self._agent(request_timeout=60)
+
+        agent.generate_image('prompt', '/nonexistent/out.png', Deadline(30))
+        self.assertLessEqual(mock_post.call_args.kwargs['timeout'], 30)
+
+    @patch('requests.Session.post')
+    def test_no_wait_after_success(self, mock_post):
+        """Test that a success after a rate limit returns right away"""
+        image = MagicMock(status_code=200, headers={'content-type': 'image/png'})
+        mock_post.side_effect = [MagicMock(status_code=429, headers={}), image]
+        agent = self._agent(base_delay=1)
+
+        with patch.object(CancelToken, 'wait', return_value=False) as sleep, patch.object(agent, '_download_image', return_value=True):
+            started = time.monotonic()
+            self.assertTrue(agent.generate_image('prompt', '/nonexistent/out.png'))
+        self.assertEqual(sleep.call_count, 1)
+        self.assertLess(time.monotonic() - started, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
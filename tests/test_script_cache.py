@@ -0,0 +1,69 @@
+import unittest
+from unittest.mock import patch, MagicMock
+
+from content_parser import ScriptDocument
+from script_cache import ScriptCache, normalize_topic
+
+
+class ScriptCacheTestCase(unittest.TestCase):
+
+    def test_topic_variants_share_entry(self):
+        """Test that case and whitespace variants of a topic hit the same entry"""
+        cache = ScriptCache()
+        document = ScriptDocument(image_prompts=('prompt 1',))
+        cache.put('Black  Holes', 'script', document)
+
+        self.assertEqual(normalize_topic('  black holes\n'), 'black holes')
+        self.assertEqual(cache.get('black holes'), ('script', document))
+        self.assertEqual(cache.get(' BLACK HOLES '), ('script', document))
+        self.assertEqual(cache.stats()['hits'], 2)
+
+    def test_entries_expire(self):
+        """Test that entries are dropped after the TTL"""
+        cache = ScriptCache(ttl=10)
+        with patch('time.monotonic', return_value=100.0):
+            cache.put('topic', 'script', ScriptDocument())
+        with patch('time.monotonic', return_value=105.0):
+            self.assertIsNotNone(cache.get('topic'))
+        with patch('time.monotonic', return_value=111.0):
+            self.assertIsNone(cache.get('topic'))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_size_bound_evicts_least_recently_used(self):
+        """Test that the cache never grows past max_entries"""
+        cache = ScriptCache(max_entries=2)
+        cache.put('a', 'script a', ScriptDocument())
+        cache.put('b', 'script b', ScriptDocument())
+        cache.get('a')
+        cache.put('c', 'script c', ScriptDocument())
+
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNotNone(cache.get('c'))
+
+    @patch('requests.Session.post')
+    def test_agent_reuses_cached_script(self, mock_post):
+        """Test that a repeat topic skips the text model and the prompt parsing"""
+        from ai_agent import AIContentAgent
+
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = [{'generated_text': 'Script [IMAGE_PROMPT: a rocket]'}]
+        mock_post.return_value = mock_response
+
+        agent = AIContentAgent()
+        agent.script_cache = ScriptCache()
+
+        content, document = agent.get_script('Space')
+        self.assertEqual(content, 'Script [IMAGE_PROMPT: a rocket]')
+        self.assertEqual(document.image_prompts, ('a rocket',))
+        with patch('ai_agent.parse_script') as mock_parse:
+            content, cached = agent.get_script('space ')
+            mock_parse.assert_not_called()
+
+        self.assertIs(cached, document)
+        self.assertEqual(mock_post.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,199 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import Future
+from unittest.mock import patch
+
+import app as web_app
+from fakes import FakeInferenceServer
+from job_queue import JobQueue
+from job_store import get_job_store
+from model_router import get_model_router
+from single_flight import SingleFlight
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def test_identical_topics_share_a_run(self):
+        """Test that case and spacing variants follow the first job until it finishes"""
+        flights = SingleFlight()
+        self.assertIsNone(flights.join('Ocean Tides', 'a'))
+        self.assertEqual(flights.join('  ocean   TIDES', 'b'), 'a')
+        self.assertIsNone(flights.join('Moon Phases', 'c'))
+        self.assertEqual(flights.followers('a'), ['b'])
+        self.assertEqual(flights.leader_of('b'), 'a')
+        self.assertEqual(flights.leader_of('a'), 'a')
+        self.assertEqual(flights.stats(), {'in_flight': 2, 'followers': 1, 'coalesced': 1})
+
+        self.assertEqual(flights.finish('a'), (['b'], None))
+        self.assertIsNone(flights.leader_of('b'))
+        self.assertIsNone(flights.join('Ocean Tides', 'd'))
+
+    def test_run_is_kept_while_anyone_waits(self):
+        """Test that leaving only reports an unwanted run once the leader and every follower left"""
+        flights = SingleFlight()
+        flights.join('Comets', 'a')
+        flights.join('Comets', 'b')
+        self.assertTrue(flights.leave('a', 'Page closed'))
+        self.assertFalse(flights.leave('b'))
+        self.assertFalse(flights.leave('unknown'))
+        self.assertEqual(flights.finish('a'), ([], 'Page closed'))
+
+    def test_dead_runs_are_not_joined(self):
+        """Test that a run nobody waits for, or one that was cancelled, is replaced by the next job"""
+        flights = SingleFlight()
+        flights.join('Comets', 'a')
+        self.assertFalse(flights.leave('a'))
+        self.assertIsNone(flights.join('Comets', 'b'))
+        self.assertEqual(flights.finish('a'), ([], 'Cancelled by user'))
+        self.assertEqual(flights.join('Comets', 'c'), 'b')
+
+        self.assertIsNone(flights.join('Comets', 'd', alive=lambda leader: leader != 'b'))
+        self.assertEqual(flights.join('Comets', 'e', alive=lambda leader: True), 'd')
+        self.assertEqual(flights.finish('b'), (['c'], None))
+        self.assertEqual(flights.leader_of('e'), 'd')
+
+
+class CoalescedGenerateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        get_model_router().reset()
+        self.flights = SingleFlight()
+        self.client = web_app.app.test_client()
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+        get_model_router().reset()
+
+    def _generate(self, topic: str, **options):
+        return self.client.post('/generate', json=dict(options, topic=topic)).get_json()
+
+    def _wait_for_result(self, session_id: str, timeout: float = 20) -> dict:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            result = get_job_store().get_result(session_id)
+            if result is not None:
+                return result
+            time.sleep(0.05)
+        self.fail(f'{session_id} did not finish')
+
+    def test_followers_get_the_leaders_result(self):
+        """Test that identical submissions make one set of API calls and all get the result"""
+        with FakeInferenceServer(latency=0.2, prompts_per_script=2) as fake, \
+                patch.object(web_app, 'get_single_flight', return_value=self.flights), \
+                patch.dict(os.environ, {'HF_API_BASE': fake.base_url, 'HUGGING_FACE_TOKEN': 'test',
+                                        'IMAGE_CACHE_ENABLED': '0', 'SCRIPT_CACHE_ENABLED': '0',
+                                        'RESULT_CATALOG_ENABLED': '0', 'STORAGE_GC_ENABLED': '0'}):
+            leader = self._generate('Coral Reefs')
+            follower = self._generate('coral  reefs')
+            separate = self._generate('Coral Reefs', coalesce=False)
+            self.assertEqual(follower['coalesced_into'], leader['session_id'])
+            self.assertNotIn('coalesced_into', separate)
+
+            results = [self._wait_for_result(job['session_id']) for job in (leader, follower, separate)]
+            self.assertTrue(all(result['success'] for result in results))
+            self.assertEqual(results[0]['image_files'], results[1]['image_files'])
+            self.assertNotEqual(results[0]['image_files'], results[2]['image_files'])
+            # One script and two images per run, for two runs
+            self.assertEqual(sum(fake.responses.values()), 6)
+            status = self.client.get(f"/status/{follower['session_id']}").get_json()
+            self.assertEqual(status['progress'], 100)
+
+        for job in (leader, follower, separate):
+            get_job_store().delete(job['session_id'])
+
+    def test_follower_cancel_leaves_run_running(self):
+        """Test that a follower that cancels stops waiting while the leader's run carries on"""
+        store = get_job_store()
+        queue = JobQueue(workers=1, max_queued=5)
+        with patch.object(web_app, 'get_single_flight', return_value=self.flights), \
+                patch.object(web_app, 'get_job_queue', return_value=queue), \
+                patch.object(web_app, 'start_generation', return_value=lambda: Future()), \
+                patch.dict(os.environ, {'STORAGE_GC_ENABLED': '0'}):
+            running = self._generate('Volcanoes')['session_id']
+            leader = self._generate('Glaciers')['session_id']
+            joined = self._generate('Glaciers')
+            follower = joined['session_id']
+            self.assertEqual(joined['queue_position'], 1)
+            self.assertEqual(self.client.get(f'/status/{follower}').get_json()['queue_position'], 1)
+
+            self.assertEqual(self.client.post(f'/cancel/{follower}').status_code, 202)
+            self.assertTrue(store.get_result(follower)['cancelled'])
+            self.assertEqual(self.client.post(f'/cancel/{follower}').status_code, 409)
+            self.assertIsNone(store.cancelled(leader))
+
+            # The run stops only once the leader and the last follower have both left
+            second = self._generate('Glaciers')['session_id']
+            self.assertEqual(self.client.post(f'/cancel/{leader}').status_code, 202)
+            self.assertIsNone(store.cancelled(leader))
+            self.assertEqual(self.client.post(f'/cancel/{second}').status_code, 202)
+            self.assertEqual(store.cancelled(leader), 'Cancelled by user')
+
+        for session_id in (running, leader, follower, second):
+            store.delete(session_id)
+
+    def test_resubmit_after_cancel_starts_a_new_run(self):
+        """Test that a topic submitted again after its queued run was cancelled or abandoned is not joined"""
+        store = get_job_store()
+        queue = JobQueue(workers=1, max_queued=5)
+        with patch.object(web_app, 'get_single_flight', return_value=self.flights), \
+                patch.object(web_app, 'get_job_queue', return_value=queue), \
+                patch.object(web_app, 'start_generation', return_value=lambda: Future()), \
+                patch.dict(os.environ, {'STORAGE_GC_ENABLED': '0'}):
+            running = self._generate('Volcanoes')['session_id']
+            cancelled = self._generate('Deserts')['session_id']
+            self.assertEqual(self.client.post(f'/cancel/{cancelled}').status_code, 202)
+            retried = self._generate('Deserts')
+            self.assertNotIn('coalesced_into', retried)
+
+            # Abandonment only sets the job store's flag
+            store.cancel(retried['session_id'], 'Abandoned: not polled for 120s')
+            third = self._generate('deserts')
+            self.assertNotIn('coalesced_into', third)
+            follower = self._generate('Deserts')
+            self.assertEqual(follower['coalesced_into'], third['session_id'])
+
+        for session_id in (running, cancelled, retried['session_id'], third['session_id'], follower['session_id']):
+            store.delete(session_id)
+
+    def test_run_that_fails_to_start_releases_its_topic(self):
+        """Test that a queued leader whose launch fails publishes an error to its followers"""
+        store = get_job_store()
+        queue = JobQueue(workers=1, max_queued=5)
+        blocker = Future()
+
+        def start_generation(session_id, topic):
+            def launch():
+                if topic == 'Volcanoes':
+                    return blocker
+                raise RuntimeError('engine unavailable')
+            return launch
+
+        with patch.object(web_app, 'get_single_flight', return_value=self.flights), \
+                patch.object(web_app, 'get_job_queue', return_value=queue), \
+                patch.object(web_app, 'start_generation', start_generation), \
+                patch.dict(os.environ, {'STORAGE_GC_ENABLED': '0'}):
+            running = self._generate('Volcanoes')['session_id']
+            leader = self._generate('Rivers')['session_id']
+            follower = self._generate('Rivers')['session_id']
+            blocker.set_result(None)
+
+            for session_id in (leader, follower):
+                result = store.get_result(session_id)
+                self.assertFalse(result['success'])
+                self.assertIn('engine unavailable', result['error'])
+            self.assertIsNone(self.flights.leader_of(leader))
+            self.assertEqual(queue.stats()['active'], 0)
+
+        for session_id in (running, leader, follower):
+            store.delete(session_id)
+
+
+if __name__ == '__main__':
+    unittest.main()
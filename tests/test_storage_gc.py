@@ -0,0 +1,155 @@
+import unittest
+import os
+import shutil
+import tempfile
+import time
+from unittest.mock import patch
+
+import app as web_app
+from storage_gc import StorageCollector
+
+
+class StorageCollectorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def _write_job(self, session_id: str, age: float, images: int = 2, size: int = 100, used: float = None):
+        """Write a job's script, document and images, last modified ``age`` seconds ago"""
+        names = [f'content_{session_id}.txt', f'document_{session_id}.json']
+        names += [f'youtube_shorts_image_{i}_{session_id}.png' for i in range(1, images + 1)]
+        modified = time.time() - age
+        accessed = time.time() - (used if used is not None else age)
+        for name in names:
+            path = os.path.join(self.root, name)
+            with open(path, 'wb') as f:
+                f.write(b'x' * size)
+            os.utime(path, (accessed, modified))
+        return names
+
+    def _remaining(self):
+        return sorted(os.listdir(self.root))
+
+    def test_quota_evicts_least_recently_used_jobs(self):
+        """Test that whole jobs go, least recently used first, until usage is under the low-water mark"""
+        self._write_job('gen_old', 5000, used=100)
+        self._write_job('gen_mid', 4000)
+        self._write_job('gen_new', 3000)
+        evicted = []
+        collector = StorageCollector(self.root, max_bytes=1000, min_age=60, on_evict=evicted.append)
+
+        usage = collector.collect()
+        self.assertEqual(evicted, ['gen_mid'])
+        self.assertFalse(any('gen_mid' in name for name in self._remaining()))
+        self.assertEqual(usage['files'], 8)
+        self.assertEqual(usage['bytes'], 800)
+        self.assertEqual(usage['jobs'], 2)
+
+    def test_age_policy_and_max_age(self):
+        """Test that the age policy ignores access times and that expired jobs go even under quota"""
+        self._write_job('gen_old', 5000, used=100)
+        self._write_job('gen_mid', 4000)
+        self._write_job('gen_new', 300)
+        collector = StorageCollector(self.root, max_bytes=1000, min_age=60, policy='age')
+        collector.collect()
+        self.assertFalse(any('gen_old' in name for name in self._remaining()))
+
+        collector = StorageCollector(self.root, max_age=1000, min_age=60)
+        collector.collect()
+        self.assertEqual(self._remaining(), [name for name in self._remaining() if 'gen_new' in name])
+        self.assertEqual(len(self._remaining()), 4)
+        with self.assertRaises(ValueError):
+            StorageCollector(self.root, policy='random')
+
+    def test_protected_files_are_kept(self):
+        """Test that running, young and unknown files and subdirectories survive an empty quota"""
+        self._write_job('gen_running', 5000)
+        self._write_job('gen_young', 10)
+        self._write_job('gen_done', 5000)
+        with open(os.path.join(self.root, 'image.txt'), 'w') as f:
+            f.write('placeholder')
+        os.makedirs(os.path.join(self.root, 'cache', 'ab'))
+        with open(os.path.join(self.root, 'cache', 'ab', 'abcd.img'), 'wb') as f:
+            f.write(b'cached')
+        stale = os.path.join(self.root, '.download.tmp')
+        fresh = os.path.join(self.root, '.other.tmp')
+        for path in (stale, fresh):
+            with open(path, 'wb') as f:
+                f.write(b'partial')
+        os.utime(stale, (time.time() - 5000, time.time() - 5000))
+
+        collector = StorageCollector(self.root, max_bytes=1, max_files=1, min_age=60,
+                                     live_jobs=lambda: ['gen_running'])
+        usage = collector.collect()
+        remaining = self._remaining()
+        self.assertFalse(any('gen_done' in name for name in remaining))
+        self.assertEqual(len([name for name in remaining if 'gen_running' in name]), 4)
+        self.assertEqual(len([name for name in remaining if 'gen_young' in name]), 4)
+        self.assertIn('image.txt', remaining)
+        self.assertIn('.other.tmp', remaining)
+        self.assertNotIn('.download.tmp', remaining)
+        self.assertTrue(os.path.exists(os.path.join(self.root, 'cache', 'ab', 'abcd.img')))
+        self.assertEqual(usage['protected_jobs'], 1)
+
+        stats = collector.stats()
+        self.assertEqual(stats['runs'], 1)
+        self.assertEqual(stats['evicted_jobs'], 1)
+        self.assertEqual(stats['evicted_files'], 5)
+        self.assertEqual(stats['files'], len(remaining) - 1)
+
+    def test_missing_directory(self):
+        """Test that a collector for a directory that does not exist yet reports empty usage"""
+        collector = StorageCollector(os.path.join(self.root, 'missing'))
+        self.assertEqual(collector.collect()['files'], 0)
+
+    def test_background_thread_collects(self):
+        """Test that start() runs a collection at once and keeps a single thread"""
+        collector = StorageCollector(self.root)
+        collector.start(interval=60)
+        collector.start(interval=60)
+        deadline = time.monotonic() + 5
+        while collector.stats()['runs'] == 0 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        collector.stop()
+        self.assertEqual(collector.stats()['runs'], 1)
+
+
+class StorageEndpointTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.test_dir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def test_download_of_collected_job_is_gone(self):
+        """Test that downloading a job whose files were collected answers 410"""
+        result = {
+            'topic': 'Tides',
+            'image_files': [],
+            'content_file': 'static/generated/content_gen_collected.txt',
+            'success': True,
+        }
+        client = web_app.app.test_client()
+        with patch.object(web_app, 'find_result', return_value=result):
+            response = client.get('/download/gen_collected')
+        self.assertEqual(response.status_code, 410)
+
+    def test_health_reports_storage(self):
+        """Test that /health reports the collector's usage and quota"""
+        collector = StorageCollector('static/generated', max_bytes=1000)
+        collector.collect()
+        with patch.object(web_app, 'get_storage_collector', return_value=collector):
+            storage = web_app.app.test_client().get('/health').get_json()['storage']
+        self.assertEqual(storage['max_bytes'], 1000)
+        self.assertEqual(storage['runs'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
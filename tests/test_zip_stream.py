@@ -0,0 +1,93 @@
+import unittest
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+from app import app
+from job_store import get_job_store
+from zip_stream import ZipStream
+
+
+class ZipStreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir, ignore_errors=True)
+
+    def _write(self, name: str, data: bytes) -> str:
+        path = os.path.join(self.test_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_archive_is_valid_and_entries_are_stored(self):
+        """Test that the streamed archive unpacks and nothing is recompressed"""
+        script = self._write('content.txt', 'Facts about bees 🐝\n'.encode('utf-8') * 50)
+        image = self._write('image.png', os.urandom(200 * 1024))
+        archive = ZipStream([(script, 'Bees_content.txt'), (image, 'Bees_image_1.png')])
+
+        data = b''.join(archive)
+
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), ['Bees_content.txt', 'Bees_image_1.png'])
+            self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist()))
+            with open(image, 'rb') as f:
+                self.assertEqual(zf.read('Bees_image_1.png'), f.read())
+
+    def test_content_length_matches_body(self):
+        """Test that the precomputed size equals the streamed size"""
+        files = [(self._write(f'image_{i}.png', os.urandom(size)), f'Ünïcode topic_image_{i}.png')
+                 for i, size in enumerate([0, 1, 70000, 300000], 1)]
+        archive = ZipStream(files)
+        self.assertEqual(archive.content_length(), len(b''.join(archive)))
+
+    def test_missing_files_are_skipped(self):
+        """Test that files deleted before the download are left out"""
+        image = self._write('image.png', b'x' * 10)
+        archive = ZipStream([(image, 'a.png'), (os.path.join(self.test_dir, 'gone.png'), 'b.png')])
+        data = b''.join(archive)
+        self.assertEqual(archive.content_length(), len(data))
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            self.assertEqual(zf.namelist(), ['a.png'])
+
+    def test_chunks_stay_bounded(self):
+        """Test that large files are sent in chunks rather than whole"""
+        image = self._write('big.png', os.urandom(3 * 1024 * 1024))
+        chunk_size = 32 * 1024
+        largest = max(len(chunk) for chunk in ZipStream([(image, 'big.png')], chunk_size=chunk_size))
+        self.assertLessEqual(largest, chunk_size + 1024)
+
+    def test_download_endpoint_streams_archive(self):
+        """Test that /download returns a complete ZIP with a matching Content-Length"""
+        script = self._write('content.txt', b'Script')
+        image = self._write('image.png', os.urandom(5000))
+        store = get_job_store()
+        session_id = store.new_id()
+        store.create(session_id, topic='Café')
+        store.set_result(session_id, {
+            'topic': 'Café',
+            'content_file': script,
+            'image_files': [image],
+            'success': True,
+        })
+
+        client = app.test_client()
+        response = client.get(f'/download/{session_id}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/zip')
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertIn("filename*=UTF-8''Caf%C3%A9_youtube_shorts_", response.headers['Content-Disposition'])
+        with zipfile.ZipFile(io.BytesIO(response.data)) as zf:
+            self.assertEqual(zf.namelist(), ['Café_content.txt', 'Café_image_1.png'])
+            self.assertEqual(zf.read('Café_content.txt'), b'Script')
+
+        store.delete(session_id)
+
+
+if __name__ == '__main__':
+    unittest.main()